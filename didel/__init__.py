@@ -1,11 +1,31 @@
 # -*- coding: UTF-8 -*-
 
+import sys
+
 __version__ = '0.1.2'
 
-# Shortcuts
-from didel.courses import Course, CourseAssignment, CourseAssignments
-from didel.session import Session
-from didel.student import Student
+# Shortcuts. They're lazily imported on Python 3.7+ (PEP 562) so that importing
+# didel, e.g. in the CLI, doesn't load BeautifulSoup, lxml and requests.
+_SHORTCUTS = {
+    'Course': 'didel.courses',
+    'CourseAssignment': 'didel.courses',
+    'CourseAssignments': 'didel.courses',
+    'Session': 'didel.session',
+    'Student': 'didel.student',
+}
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _SHORTCUTS:
+            raise AttributeError("module 'didel' has no attribute '%s'" % name)
+        module = __import__(_SHORTCUTS[name], fromlist=[name])
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+else:
+    from didel.courses import Course, CourseAssignment, CourseAssignments
+    from didel.session import Session
+    from didel.student import Student
 
-# silent Pyflakes
-Course, CourseAssignment, CourseAssignments, Session, Student
+    # silent Pyflakes
+    Course, CourseAssignment, CourseAssignments, Session, Student
@@ -0,0 +1,176 @@
+# -*- coding: UTF-8 -*-
+
+"""
+asyncio support. This module requires Python 3.5+.
+
+Usage: ::
+
+    async def main():
+        async with AsyncSession() as session:
+            student = await session.student(username, password)
+            courses = await student.aresource('courses', session)
+            await agather(session, courses)
+            for course in courses:
+                print(course.title)
+
+HTTP requests are made with a ``didel.session.Session`` in a bounded pool of
+threads, so the event loop is never blocked and entities fetched with an
+``AsyncSession`` can still be used with the blocking API afterwards.
+
+Many sessions, e.g. one per account, can share one pool of threads so that
+the number of threads doesn't grow with the number of sessions: ::
+
+    executor = ThreadPoolExecutor(16)
+    sessions = [AsyncSession(4, executor=executor) for _ in accounts]
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from didel.session import Session
+
+
+class AsyncSession(object):
+    """
+    An asyncio counterpart of ``didel.session.Session``. At most
+    ``max_requests`` requests are made at the same time.
+
+    By default each session has its own pool of ``max_requests`` threads.
+    If an ``executor`` is given, it's used instead, and it can be shared by
+    many sessions; it's not shut down when the session is closed.
+    """
+
+    def __init__(self, max_requests=8, session=None, executor=None):
+        self.session = session or Session()
+        self.max_requests = max_requests
+        self._shared_executor = executor is not None
+        self._executor = executor or ThreadPoolExecutor(max_requests)
+        # the limit of a session which shares its executor, by event loop
+        self._slots = (None, None)
+
+
+    def get_url(self, url):
+        """
+        Get the final URL for a given one. See ``Session.get_url``.
+        """
+        return self.session.get_url(url)
+
+
+    async def run(self, fun, *args, **kwargs):
+        """
+        Call ``fun(*args, **kwargs)`` in the session's threads pool and return
+        its result.
+        """
+        loop = asyncio.get_event_loop()
+        call = partial(fun, *args, **kwargs)
+        if not self._shared_executor:
+            return await loop.run_in_executor(self._executor, call)
+        if self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.max_requests))
+        async with self._slots[1]:
+            return await loop.run_in_executor(self._executor, call)
+
+
+    async def request(self, method, url, *args, **kwargs):
+        return await self.run(self.session.request, method,
+                self.get_url(url), *args, **kwargs)
+
+
+    async def get(self, url, *args, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return await self.request('GET', url, *args, **kwargs)
+
+
+    async def post(self, url, *args, **kwargs):
+        return await self.request('POST', url, *args, **kwargs)
+
+
+    async def login(self, username, passwd):
+        """
+        Authenticate an user. See ``Session.login``.
+        """
+        params = self.session.login_params()
+        url = self.session.login_url
+        resp = await self.get(url, params=params)
+        data = self.session.login_data(resp.text, username, passwd)
+        if data is None:
+            return False
+        resp = await self.post(url, params=params, data=data)
+        return self.session.is_logged_in(resp)
+
+
+    async def student(self, username, password, autofetch=True):
+        """
+        Return a logged ``Student`` which uses this session.
+        """
+        # imported here to avoid a circular import
+        from didel.student import Student
+        student = Student(username, password, autofetch=False,
+                session=self.session, login=False)
+        student.logged = await self.login(username, password)
+        if autofetch:
+            await student.afetch(self)
+        return student
+
+
+    async def fetch_entity(self, entity):
+        """
+        Fetch a ``DidelEntity``. This is the implementation of
+        ``DidelEntity.afetch``.
+        """
+        if not entity.is_fetchable():
+            return False
+        resp = await self.get(entity.url())
+        # parse the page outside of the event loop
+        return await self.run(entity.load, resp, self.session)
+
+
+    async def fetch_resource(self, entity, name):
+        """
+        Fetch and return a subresource of an entity. This is the
+        implementation of ``DidelEntity.aresource``.
+        """
+        res = entity.get_resource(name)
+        await self.fetch_entity(res)
+        setattr(entity, name, res)
+        return res
+
+
+    async def crawl(self, folder):
+        """
+        Fetch a ``CourseDocuments`` folder and all its subfolders. This is the
+        asynchronous version of ``CourseDocuments.crawl``.
+        """
+        await self.fetch_entity(folder)
+        await asyncio.gather(*[self.crawl(f) for f in folder.folders])
+
+
+    async def gather(self, entities):
+        """
+        Fetch all the given entities at once and return the list of the
+        results of their fetch.
+        """
+        return await asyncio.gather(*[self.fetch_entity(e) for e in entities])
+
+
+    def close(self):
+        if not self._shared_executor:
+            self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *args):
+        self.close()
+
+
+async def agather(session, entities):
+    """
+    Fetch all the given entities at once with an ``AsyncSession``. Entities
+    which are already populated are not fetched again.
+    """
+    return await session.gather(entities)
@@ -5,7 +5,8 @@ try:
 except ImportError:  # Python 3
     from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
+from didel.parsers import get_parser
+from didel.tracing import span
 
 ROOT_URL = 'http://didel.script.univ-paris-diderot.fr'
 
@@ -24,6 +25,8 @@ class DidelEntity(object):
 
     Usage: ::
 
+        TITLE = Query('h1', './/h1')
+
         class MyEntity(DidelEntity):
 
             def __init__(self, someArg):
@@ -31,8 +34,10 @@ class DidelEntity(object):
                 super(MyEntity, self).__init__()
 
             def populate(self, soup, session, **kw):
-                # populate the object with ``soup``
-                self.title = soup.select('h1')[0].get_text()
+                # populate the object with ``soup``, parsed by the session's
+                # parser backend
+                p = get_parser(session)
+                self.title = p.text(p.select(soup, TITLE)[0])
 
     The entity can then be populated: ::
 
@@ -60,20 +65,44 @@ class DidelEntity(object):
         It sets ``self.session`` to the given session and ``self._populated``
         to ``True``.
         """
-        if not hasattr(self, 'populate') or self.is_populated():
+        if not self.is_fetchable():
             return False
+        resp = session.get(self.url())
+        return self.load(resp, session)
 
-        if not hasattr(self, 'path'):
-            return False
-        url = self.url()
-        resp = session.get(url)
+
+    def afetch(self, session):
+        """
+        Asynchronous version of ``fetch``, to be used with a
+        ``didel.aio.AsyncSession``. It returns a coroutine.
+        """
+        return session.fetch_entity(self)
+
+
+    def is_fetchable(self):
+        """
+        Test if the element can be fetched, i.e. it has a ``path`` and a
+        ``populate`` method and hasn't been populated yet.
+        """
+        return hasattr(self, 'populate') and hasattr(self, 'path') \
+                and not self.is_populated()
+
+
+    def load(self, resp, session):
+        """
+        Populate the element from a response to a request on its URL. This is
+        the second half of ``fetch``.
+        """
         if not resp.ok:
             return False
 
-        soup = BeautifulSoup(resp.text, 'lxml')
+        parser = get_parser(session)
+        with span('parse', 'parse', url=resp.url, backend=parser.name):
+            soup = parser.parse_response(resp)
 
         setattr(self, 'session', session)
-        self.populate(soup, session)
+        with span('populate %s' % self.__class__.__name__, 'populate'):
+            self.populate(soup, session)
         setattr(self, '_populated', True)
         return True
 
@@ -101,9 +130,9 @@ class DidelEntity(object):
         self._resources[name] = value
 
 
-    def __getattr__(self, name):
+    def get_resource(self, name):
         """
-        Lazily populate subresources when they're acceded
+        Return a subresource without populating it
         """
         if name not in self._resources:
             raise AttributeError("'%s' has no attribute '%s'" % (self, name))
@@ -111,7 +140,27 @@ class DidelEntity(object):
         if not self.is_populated():
             raise DidelError('%s is not populated' % repr(self))
 
-        res = self._resources[name]
+        return self._resources[name]
+
+
+    def aresource(self, name, session):
+        """
+        Asynchronous version of the lazy subresources access, to be used with
+        a ``didel.aio.AsyncSession``. It returns a coroutine: ::
+
+            assignments = await course.aresource('assignments', session)
+        """
+        return session.fetch_resource(self, name)
+
+
+    def __getattr__(self, name):
+        """
+        Lazily populate subresources when they're acceded
+        """
+        # _resources doesn't exist yet if __init__ wasn't called
+        if name == '_resources':
+            raise AttributeError(name)
+        res = self.get_resource(name)
         res.fetch(self.session)
         setattr(self, name, res)
         return res
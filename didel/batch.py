@@ -0,0 +1,166 @@
+# -*- coding: UTF-8 -*-
+
+"""
+Batch operations. Several accounts can be synchronized at once: each
+account is pulled in its own process, with its own session, cookies and
+cache, and the requests of all the processes can share a global limit.
+
+The accounts are read from an INI file with one section per account: ::
+
+    [alice]
+    username = alice
+    password = s3cr3t
+    path = mirrors/alice
+
+Several submissions can be made at once from a CSV file with a
+``course,index,title,file`` row per submission: ::
+
+    course,index,title,file
+    PF2,1,TP 1 - solution,solutions/tp1.tar.gz
+"""
+
+try:
+    from ConfigParser import Error as ConfigParserError, SafeConfigParser
+    from StringIO import StringIO
+except ImportError:  # Python 3
+    from configparser import Error as ConfigParserError, SafeConfigParser
+    from io import StringIO
+
+from os.path import abspath, dirname, join
+from time import time
+import csv
+import sys
+
+from didel.config import DidelConfig
+
+# The keys of an account's section in an accounts file
+ACCOUNT_KEYS = ('username', 'password', 'path')
+
+# These config keys are not given to the accounts: each one has its own
+# folder, and its own cache next to it. 'Courses.path' is the old name of
+# 'courses.syncpath'; it would make ``pull`` migrate and save the account's
+# config, credentials included.
+PRIVATE_KEYS = ('cache.path', 'courses.syncpath', 'Courses.path')
+
+# The shared request slots of the current worker process
+_slots = None
+
+
+def read_accounts(filename):
+    """
+    Read an accounts file and return a list of ``dict``\\ s with the name of
+    each account and its ``username``, ``password`` and ``path``. Relative
+    paths are relative to the file's directory. Values are not
+    interpolated, so that passwords can contain ``%``. Raise ``ValueError``
+    if the file is invalid or a key is missing.
+    """
+    parser = SafeConfigParser()
+    with open(filename) as f:
+        read_file = getattr(parser, 'read_file', None) or parser.readfp
+        try:
+            read_file(f)
+        except ConfigParserError as e:
+            raise ValueError(str(e))
+    accounts = []
+    for name in parser.sections():
+        account = {'name': name}
+        for key in ACCOUNT_KEYS:
+            if not parser.has_option(name, key):
+                raise ValueError("Account '%s' has no '%s'" % (name, key))
+            account[key] = parser.get(name, key, raw=True)
+        account['path'] = abspath(join(dirname(filename), account['path']))
+        accounts.append(account)
+    return accounts
+
+
+def read_submissions(filename):
+    """
+    Read a submissions CSV file and return a list of ``dict``\\ s with the
+    ``line`` of each row, its ``course``, ``index`` (starting at 1),
+    ``title`` and ``file``. Relative paths are relative to the file's
+    directory. Empty lines, lines starting with ``#`` and a header row are
+    ignored. Raise ``ValueError`` if a row is invalid.
+    """
+    submissions = []
+    with open(filename) as f:
+        for line, row in enumerate(csv.reader(f, skipinitialspace=True), 1):
+            row = [col.strip() for col in row]
+            if not any(row) or row[0].startswith('#'):
+                continue
+            if line == 1 and row[:2] == ['course', 'index']:
+                continue
+            if len(row) != 4 or not row[1].isdigit() or int(row[1]) < 1:
+                raise ValueError("Invalid row at line %d: %s"
+                        % (line, ','.join(row)))
+            submissions.append({
+                'line': line,
+                'course': row[0],
+                'index': int(row[1]),
+                'title': row[2],
+                'file': abspath(join(dirname(filename), row[3])),
+            })
+    return submissions
+
+
+def init_worker(slots):
+    """
+    Initialize a worker process with the request slots shared by all the
+    processes, a ``multiprocessing.BoundedSemaphore``
+    """
+    global _slots
+    _slots = slots
+
+
+def pull_account(args):
+    """
+    Pull the documents of an account with ``didel pull``, in its folder.
+    ``args`` is an ``(account, settings, options)`` tuple, so that it can be
+    used with ``multiprocessing.Pool.imap_unordered``: ``settings`` are the
+    config items used for every account, and ``options`` the global options
+    of the command line. The account's cookies and cache are stored in its
+    folder, and its credentials are never saved.
+
+    Return a ``dict`` with the ``name`` of the account, whether it succeeded
+    (``ok``), its ``output`` and the ``time`` it took, as well as the
+    number of downloaded ``files``, their ``bytes`` and the ``requests``
+    made.
+    """
+    from didel.cli import DidelCli
+    from didel.fileutils import mkdir_p
+
+    account, settings, options = args
+    mkdir_p(account['path'])
+    config = DidelConfig(join(account['path'], '.didel.conf'))
+    for key, value in settings:
+        # the values are interpolated already
+        config.set(key, value.replace('%', '%%'))
+    config.set_secret('username', account['username'])
+    config.set_secret('password', account['password'])
+    cli = DidelCli(['didel'], config)
+    cli.options.update(options)
+    cli.slots = _slots
+
+    stdout, sys.stdout = sys.stdout, StringIO()
+    start = time()
+    try:
+        ok = cli.action_pull(account['path']) is not False
+    except Exception as e:
+        print("Error: %s" % e)
+        ok = False
+    finally:
+        if cli.session is not None:
+            cli.session.save_cookies()
+            cli.session.close()
+        sys.stdout, output = stdout, sys.stdout.getvalue()
+
+    result = {
+        'name': account['name'],
+        'ok': ok,
+        'output': output,
+        'time': time() - start,
+        'files': 0,
+        'bytes': 0,
+        'requests': 0,
+    }
+    result.update(cli.stats)
+    return result
@@ -3,32 +3,111 @@
 from __future__ import print_function
 
 import inspect
+import sys
+import threading
 from getpass import getpass
-from os.path import expanduser, abspath
+from os.path import expanduser, abspath, isdir, relpath, join
 from sys import argv, exit
+from time import time
 
 from didel import __version__
 from didel.config import DidelConfig
-from didel.student import Student
+from didel.fileutils import human_size, mkdir_p
 from didel.exceptions import DidelLoginRequired, DidelServerError
+from didel.workers import WorkerPool
+
+# The modules which depend on requests, BeautifulSoup or lxml are imported only
+# when needed, so that the subcommands that don't use the network (config:*,
+# courses:alias, etc) start quickly.
 
 HELP_FLAGS = ('-h', '-help', '--help')
 
+# Options given before the subcommand, with their default values
+GLOBAL_OPTIONS = {
+    'no_cache': False,
+    'trace': None,
+    'profile': False,
+}
+
+# Number of functions printed by '--profile'
+PROFILE_LINES = 25
+
+# inspect.getargspec was removed in Python 3.11
+getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+
 
 class DidelCli(object):
 
-    def __init__(self, argv):
+    def __init__(self, argv, config=None):
         self.argv = argv
         self.exe = self.argv.pop(0)
-        self.config = DidelConfig.get_default()
+        self.config = config or DidelConfig.get_default()
+        self.options = dict(GLOBAL_OPTIONS)
+        self.session = None
+        # request slots shared with other processes, see didel.batch
+        self.slots = None
+        # stats of the last pull
+        self.stats = {}
+
+
+    def get_session(self):
+        """
+        Return a new session, which reuses the cookies saved by the previous
+        commands. Unless the '--no-cache' option was given, its pages are
+        cached in the 'cache.path' directory (default: ~/.didel.cache), up to
+        'cache.max_size' megabytes (default: 50). Pages are parsed with the
+        'session.parser' backend, 'bs4' (the default) or 'lxml'.
+
+        The 'session.root_url' and 'session.login_url' keys can be used to
+        pull from another server than DidEL, e.g. a mirror.
+
+        Failed requests (except POSTs) are retried up to 'session.retries'
+        times (default: 3), waiting 'session.backoff' seconds (default: 0.5)
+        then twice as long before each new attempt. After
+        'session.circuit_threshold' server errors in a row (default: 10, 0
+        to disable) requests fail immediately for
+        'session.circuit_cooldown' seconds (default: 30).
+        """
+        from didel.httpcache import HTTPCache
+        from didel.retry import CircuitBreaker, RetryPolicy
+        from didel.session import Session
+
+        cache = None
+        if not self.options['no_cache']:
+            path = self.config.get('cache.path', self.config.cache_dir)
+            max_size = self.int_option(None, 'cache.max_size', 50)
+            cache = HTTPCache(join(expanduser(path), 'http'),
+                    max_size * 1024 * 1024)
+        retry = RetryPolicy(self.int_option(None, 'session.retries', 3),
+                float(self.config.get('session.backoff', 0.5)))
+        breaker = None
+        threshold = self.int_option(None, 'session.circuit_threshold', 10)
+        if threshold > 0:
+            breaker = CircuitBreaker(threshold,
+                    self.int_option(None, 'session.circuit_cooldown', 30))
+        self.session = Session(cache=cache,
+                cookies_file=self.config.cookies_file,
+                parser=self.config.get('session.parser'),
+                root_url=self.config.get('session.root_url'),
+                login_url=self.config.get('session.login_url'),
+                retry=retry, breaker=breaker)
+        if self.slots is not None:
+            self.session.set_max_requests(
+                    self.int_option(None, 'session.max_requests', 8),
+                    self.slots)
+        return self.session
+
 
     def get_student(self, fetchInfos=False):
+        from didel.student import Student
+
         username, passwd = self.config.get_credentials()
         if username is None or passwd is None:
             print("Configure your login credentials with" \
                   " '%s login:init <username>'" % self.exe)
             return None
-        return Student(username, passwd, autofetch=fetchInfos)
+        return Student(username, passwd, autofetch=fetchInfos,
+                session=self.get_session())
 
 
     def get_course(self, code, student=None):
@@ -43,6 +122,17 @@ class DidelCli(object):
         return student.get_course(code)
 
 
+    def int_option(self, value, key, default):
+        """
+        Return an integer option's value: ``value`` if it was given on the
+        command line, the config value for ``key`` if it exists, or
+        ``default``.
+        """
+        if value is None:
+            value = self.config.get(key, default)
+        return int(value)
+
+
     def migrate_config(self):
         """
         Migrate old config options
@@ -70,17 +160,46 @@ class DidelCli(object):
 
     def print_help(self):
         name_offset = len('action_')
-        print("\nUsage:\n\t%s <subcommand> args..." % self.exe)
+        print("\nUsage:\n\t%s [options] <subcommand> args..." % self.exe)
+        print("\nOptions:\n")
+        print("  --no-cache      don't use nor update the pages cache")
+        print("  --trace <file>  save a trace of the requests, parses,"
+              " downloads and\n                  writes in <file> (Chrome"
+              " trace event format)")
+        print("  --profile       print the hot spots of the subcommand")
         print("\nAvailable subcommands:\n")
         for mth in dir(self):
             if not mth.startswith('action_'):
                 continue
             cmd = getattr(self, mth)
             doc = cmd.__doc__
-            name = mth[name_offset:].replace('_', ':')
+            # e.g. 'assignments:submit-batch'
+            name = mth[name_offset:].replace('_', ':', 1).replace('_', '-')
             print("%s\n%s" % (name, doc.strip('\n')))
 
 
+    def print_usage(self, action, spec, options):
+        """
+        Print the usage of a subcommand, given the ``spec`` of its method and
+        its ``options`` as given to ``parse_options``, and return ``False``
+        """
+        args = []
+        for arg in spec.args[1:]:
+            if isinstance(options.get(arg), bool):
+                args.append('[--%s]' % arg.replace('_', '-'))
+                continue
+            fmt = '<%s>'
+            if arg in options:
+                fmt = '[%s]' % fmt
+            args.append(fmt % arg)
+
+        if spec.varargs:
+            args.append('[<%s...>]' % spec.varargs)
+
+        print("Usage:\n\t%s %s %s" % (self.exe, action, ' '.join(args)))
+        return False
+
+
     def print_action_help(self, action, params, docstring=''):
         """
         Print an help text for a subcommand
@@ -154,6 +273,45 @@ class DidelCli(object):
         print(course.about)
 
 
+    def action_courses_list(self, json=False):
+        """
+        List the courses you're enrolled in, with their code, title and
+        teacher. Options:
+            --json  print a JSON object per course instead of a table
+        The courses are fetched in parallel, up to 'session.max_requests' at
+        a time (default: 8).
+        """
+        from json import dumps
+
+        student = self.get_student(fetchInfos=True)
+        if not student:
+            return False
+        max_requests = self.int_option(None, "session.max_requests", 8)
+        student.session.set_max_requests(max_requests, self.slots)
+        courses = student.courses.fetch_courses(student.session, max_requests)
+        rows = []
+        for course in courses:
+            row = {
+                'code': course.ref,
+                'title': getattr(course, 'title', None),
+                'teacher': getattr(course, 'teacher', None),
+            }
+            if json:
+                print(dumps(row, sort_keys=True))
+            else:
+                rows.append(row)
+        if json or not rows:
+            return
+
+        headers = {'code': 'Code', 'title': 'Title', 'teacher': 'Teacher'}
+        columns = ('code', 'title', 'teacher')
+        widths = dict((col, max(len(r[col] or '') for r in rows + [headers]))
+                for col in columns)
+        fmt = '  '.join('%%-%ds' % widths[col] for col in columns)
+        for row in [headers] + rows:
+            print((fmt % tuple(row[col] or '' for col in columns)).rstrip())
+
+
     def action_courses_enroll(self, code, key=None):
         """
         Enroll in a course.
@@ -197,13 +355,74 @@ class DidelCli(object):
         List a course's assignments
         """
         course = self.get_course(course_code)
-        for i in range(len(course.assignments)):
-            # 'for ag in course.assignments' isn't supported for now
-            asg = course.assignments[i]
-            idx = i + 1  # start indexes at 1
+        # assignments are fetched in parallel ahead of the loop
+        for idx, asg in enumerate(course.assignments, 1):
             print("%d) %s (%s)" % (idx, asg.title, asg.end))
 
 
+    def action_assignments_upcoming(self, refresh=False):
+        """
+        List the assignments of all your courses which are not over yet,
+        sorted by deadline. Options:
+            --refresh  fetch the assignments even if they're cached
+        The assignments are cached for 'assignments.cache_ttl' seconds
+        (default: 600) unless the '--no-cache' option is given, and fetched
+        in parallel, up to 'session.max_requests' at a time (default: 8). It
+        fails rather than showing an incomplete list if a page can't be
+        fetched.
+        """
+        from didel.ttlcache import TTLCache
+
+        cache = key = None
+        username = self.config.get_credentials()[0]
+        if not self.options['no_cache'] and username:
+            path = self.config.get('cache.path', self.config.cache_dir)
+            cache = TTLCache(join(expanduser(path), 'data'),
+                    self.int_option(None, 'assignments.cache_ttl', 600))
+            key = 'assignments:%s:%s' % (
+                    self.config.get('session.root_url', ''), username)
+        rows = None
+        if cache is not None and not refresh:
+            rows = cache.get(key)
+        if rows is None:
+            rows = self.fetch_assignments()
+            if rows is None:
+                return False
+            if cache is not None:
+                cache.set(key, rows)
+
+        now = time()
+        rows = [r for r in rows if r['deadline'] is None or
+                r['deadline'] >= now]
+        # unknown deadlines last
+        rows.sort(key=lambda r: (r['deadline'] is None, r['deadline'] or 0,
+            r['course'], r['title']))
+        for row in rows:
+            print("%-16s  %-10s  %s" % (row['end'] or '?', row['course'],
+                row['title']))
+
+
+    def fetch_assignments(self):
+        """
+        Fetch the assignments of all the student's courses, and return them
+        as a list of ``dict``\ s, or ``None`` if the student can't log in.
+        Raise a ``DidelServerError`` if a page can't be fetched.
+        """
+        student = self.get_student(fetchInfos=True)
+        if not student:
+            return None
+        max_requests = self.int_option(None, "session.max_requests", 8)
+        student.session.set_max_requests(max_requests, self.slots)
+        return [{
+            'course': a.course_code,
+            'title': a.title,
+            'begin': a.begin,
+            'end': a.end,
+            'deadline': a.deadline,
+        } for a in student.courses.fetch_assignments(student.session,
+            max_requests)]
+
+
     def action_assignments_show(self, course_code, index):
         """
         Show a course's assignment. The index can be obtained with
@@ -221,46 +440,598 @@ class DidelCli(object):
         print("Work Type: %s" % a.work_type)
 
 
-    def action_assignments_submit(self, course_code, index, title, filename):
+    def action_assignments_submit(self, course_code, index, title, filename,
+            progress=False):
         """
         Submit an assigment. 'title' is its title (e.g. "TP 1"), and 'filename'
-        is the file that should be attached to it.
+        is the file that should be attached to it. Options:
+            --progress  show the progress of the upload
         """
         index = int(index)
-        s = self.get_student()
+        # the submission needs the name and id of the student
+        s = self.get_student(fetchInfos=True)
         if not s:
             return False
         course = self.get_course(course_code, s)
         a = course.assignments[index - 1]  # indexes start at 1
+        callback = self.print_progress if progress else None
         with open(expanduser(filename), 'rb') as f:
-            return a.submit(s, title, f)
+            ok = a.submit(s, title, f, progress=callback)
+        if progress:
+            print()
+        if not ok:
+            print("The submission couldn't be confirmed")
+        return ok
+
+
+    def action_assignments_submit_batch(self, manifest, jobs=None):
+        """
+        Submit several assignments. <manifest> is a CSV file with a row per
+        submission:
+            course,index,title,file
+            PF2,1,TP 1 - solution,solutions/tp1.tar.gz
+        The submissions which were already made, i.e. with the same title,
+        are skipped, so the command can be run again after a failure. So are
+        the rows which repeat a previous one.
+        Options:
+            --jobs N  upload up to N files in parallel
+                      (config: 'assignments.jobs', default: 2)
+        """
+        from didel.batch import read_submissions
+        from didel.courses import CourseAssignments
+
+        try:
+            rows = read_submissions(manifest)
+        except (IOError, ValueError) as e:
+            print("Can't read the submissions: %s" % e)
+            return False
+        jobs = self.int_option(jobs, 'assignments.jobs', 2)
+        # the submissions need the name and id of the student
+        s = self.get_student(fetchInfos=True)
+        if not s:
+            return False
+        max_requests = self.int_option(None, "session.max_requests", 8)
+        s.session.set_max_requests(max_requests, self.slots)
+
+        # each course's list is fetched once, then only the assignments
+        # which are submitted to
+        courses = {}
+        for row in rows:
+            row['course'] = self.config.get('alias.%s' % row['course'],
+                    row['course'])
+            courses.setdefault(row['course'], set()).add(row['index'])
+        assignments = {}
+        # the errors of the courses and assignments which couldn't be fetched
+        errors = {}
+
+        def fetch(entity):
+            resp = s.session.get(entity.url())
+            s.session.check_response(resp)
+            entity.load(resp, s.session)
+
+        def fetch_list(code):
+            course_assignments = CourseAssignments(code)
+            try:
+                fetch(course_assignments)
+            except Exception as e:
+                errors[code] = "error: %s" % e
+                return
+            for index in courses[code]:
+                if index <= len(course_assignments):
+                    a = list.__getitem__(course_assignments, index - 1)
+                    pool.submit(fetch_assignment, code, index, a)
+
+        def fetch_assignment(code, index, a):
+            try:
+                fetch(a)
+            except Exception as e:
+                errors[(code, index)] = "error: %s" % e
+                return
+            assignments[(code, index)] = a
+
+        pool = WorkerPool(max_requests)
+        for code in courses:
+            pool.submit(fetch_list, code)
+        try:
+            pool.join()
+        except Exception as e:
+            print("Can't fetch the assignments: %s" % e)
+            return False
+
+        results = {}
+
+        def submit(row):
+            key = (row['course'], row['index'])
+            a = assignments.get(key)
+            if a is None:
+                results[row['line']] = errors.get(key) or \
+                        errors.get(row['course']) or \
+                        "error: no such assignment"
+            elif a.is_submitted(s, row['title']):
+                results[row['line']] = "already submitted"
+            else:
+                with open(row['file'], 'rb') as f:
+                    ok = a.submit(s, row['title'], f)
+                results[row['line']] = "submitted" if ok else \
+                        "error: the submission couldn't be confirmed"
+
+        def run(row):
+            try:
+                submit(row)
+            except Exception as e:
+                results[row['line']] = "error: %s" % e
+
+        # a repeated row would be submitted twice, at the same time
+        first_rows = {}
+        pool = WorkerPool(jobs)
+        for row in rows:
+            key = (row['course'], row['index'], row['title'])
+            if key in first_rows:
+                results[row['line']] = "skipped: same as line %d" \
+                        % first_rows[key]
+                continue
+            first_rows[key] = row['line']
+            pool.submit(run, row)
+        pool.join()
+
+        failed = 0
+        for row in rows:
+            result = results[row['line']]
+            if result.startswith('error'):
+                failed += 1
+            print("%s #%d %s: %s" % (row['course'], row['index'],
+                row['title'], result))
+        print("%d submission(s), %d failed" % (len(rows), failed))
+        if failed:
+            return False
 
 
-    def action_pull(self, path=None):
+    def print_progress(self, done, total):
+        """
+        Print the progress of an upload on a single line, each time it
+        gains at least one percent
         """
-        Pull all documents from each followed course in a folder.
+        percent = 100 * done // total if total else 100
+        if percent == getattr(self, '_progress', None):
+            return
+        self._progress = percent
+        print("\rUploading: %3d%% (%s / %s)" % (percent, human_size(done),
+            human_size(total)), end='')
+        sys.stdout.flush()
+
+
+    def action_pull(self, path=None, concurrency=None, jobs=None,
+            max_requests=None, rebuild_manifest=False, segments=None,
+            watch=False, plan=False, store=False):
         """
+        Pull all documents from each followed course in a folder. Options:
+            --jobs N            pull up to N courses in parallel
+                                (config: 'courses.jobs', default: 4)
+            --concurrency N     fetch up to N folders of a course in parallel
+                                (config: 'courses.concurrency', default: 4)
+            --max-requests N    make at most N requests at the same time
+                                (config: 'session.max_requests', default: 8)
+            --rebuild-manifest  forget the index of the pulled documents and
+                                rebuild it from the files in the folder
+            --segments N        download large files in N parallel parts
+                                (config: 'download.segments', default: 4)
+            --watch             keep running and pull each course again
+                                periodically, until SIGTERM or Ctrl-C
+            --plan              don't download anything, print what would be
+                                downloaded as JSON instead
+            --store             store each distinct file once, and link the
+                                documents to it (config: 'store.path')
+        Files are large if they have at least 'download.segment_threshold'
+        megabytes (default: 8). Interrupted downloads are kept in '.part'
+        files and resumed by the next pull.
+
+        The listings of the folders are kept in the manifest, and a folder
+        isn't listed again while its date and size stay the same, except on
+        the day of its date. Each one is still listed again at least once
+        every 'courses.relist_every' pulls (default: 10).
+
+        With --watch, a course is pulled again 'watch.min_interval' seconds
+        (default: 120) after something changed in it; each pull without
+        changes doubles this interval, up to 'watch.max_interval' seconds
+        (default: 3600).
+
+        With --plan, each document is listed with its status ("new",
+        "updated" or "unchanged") and the size of the ones which would be
+        downloaded, with the totals of each course and of all courses.
+
+        With --store, or if 'store.path' is set, the files are stored once by
+        content in 'store.path' (default: '.didel-objects' in the folder) and
+        hardlinked at their place in the courses, and a document which is
+        already in the store is linked instead of being downloaded again.
+        The store must be on the same filesystem as the folder, otherwise
+        the files are copied. Several folders can share a store.
+        """
+        from didel.manifest import SyncManifest
+        from didel.objectstore import ObjectStore
+
         self.migrate_config()
         student = self.get_student(fetchInfos=True)
         if not student:
             return False
         if path is None:
             path = self.config.get("courses.syncpath", ".")
+        concurrency = self.int_option(concurrency, "courses.concurrency", 4)
+        jobs = self.int_option(jobs, "courses.jobs", 4)
+        max_requests = self.int_option(max_requests,
+                "session.max_requests", 8)
+        segments = self.int_option(segments, "download.segments", 4)
+        threshold = self.int_option(None, "download.segment_threshold", 8)
+        relist_every = self.int_option(None, "courses.relist_every", 10)
         path = abspath(path)
+        store_path = self.config.get("store.path")
+        if store or store_path:
+            store_path = abspath(expanduser(store_path or
+                join(path, ".didel-objects")))
+        student.session.set_max_requests(max_requests, self.slots)
+        if plan:
+            # a rebuilt manifest would start from the files in the folder
+            use_manifest = not rebuild_manifest and isdir(path)
+            # the plan may record what it finds, but only in memory
+            manifest = SyncManifest(path, relist_every, readonly=True) \
+                    if use_manifest else None
+            use_store = store_path and isdir(store_path)
+            store = ObjectStore(store_path) if use_store else None
+            try:
+                return self.print_plan(student, path, concurrency, jobs,
+                        manifest, store)
+            finally:
+                if manifest is not None:
+                    manifest.close()
+
+        mkdir_p(path)
+        store = ObjectStore(store_path) if store_path else None
+        manifest = SyncManifest(path, relist_every)
+        if rebuild_manifest:
+            manifest.clear()
         print("Pull documents to %s..." % path)
+
+        # each course is printed at once when it's done to avoid mixing the
+        # output of several courses
+        output_lock = threading.Lock()
+        failed = []
+        downloaded = []
+
+        def pull(course):
+            try:
+                docs = course.synchronize_docs(path, student.session,
+                        concurrency, manifest, segments,
+                        threshold * 1024 * 1024, store)
+            except Exception as e:
+                with output_lock:
+                    failed.append(course.ref)
+                    print("%s: error: %s" % (course.ref, e))
+                return
+            if watch and not docs:
+                return docs
+            with output_lock:
+                downloaded.extend(docs)
+                print(course.ref)
+                for doc in docs:
+                    if doc.linked:
+                        print("  %s (linked)" % relpath(doc.path, path))
+                        continue
+                    speed = doc.downloaded_size / max(doc.download_time, 1e-3)
+                    print("  %s (%s, %s/s%s)" % (relpath(doc.path, path),
+                        human_size(doc.downloaded_size), human_size(speed),
+                        ", resumed" if doc.resumed else ""))
+            return docs
+
+        try:
+            if watch:
+                self.watch_courses(student.courses, pull, jobs,
+                        manifest.commit)
+            else:
+                pool = WorkerPool(jobs)
+                for course in student.courses:
+                    pool.submit(pull, course)
+                pool.join()
+        finally:
+            manifest.close()
+
+        session = student.session
+        self.stats = {
+            'files': len(downloaded),
+            'bytes': sum(doc.downloaded_size for doc in downloaded),
+            'requests': session.request_count,
+        }
+        if session.retry_count:
+            print("Retried requests: %d" % session.retry_count)
+        if session.breaker is not None and session.breaker.trips:
+            print("Stopped after too many server errors %d time(s)"
+                    % session.breaker.trips)
+        if failed and not watch:
+            print("Failed courses: %s" % ', '.join(sorted(failed)))
+            return False
+
+
+    def print_plan(self, student, path, concurrency, jobs, manifest,
+            store=None):
+        """
+        Print what ``pull`` would do in ``path`` as JSON, without downloading
+        anything. Return ``False`` if a course failed.
+        """
+        from json import dumps
+
+        keys = ('new', 'updated', 'unchanged')
+        plans = []
+        lock = threading.Lock()
+
+        def totals(files):
+            t = dict((k, 0) for k in keys)
+            t['bytes'] = 0
+            t['stored'] = 0
+            t['unknown_sizes'] = 0
+            for f in files:
+                t[f['status']] += 1
+                if f['status'] == 'unchanged':
+                    continue
+                if f.get('stored'):
+                    t['stored'] += 1
+                if f['bytes'] is None:
+                    t['unknown_sizes'] += 1
+                else:
+                    t['bytes'] += f['bytes']
+            return t
+
+        def plan(course):
+            try:
+                files = course.plan_docs(path, student.session, concurrency,
+                        manifest, store)
+                course_plan = {'course': course.ref, 'files': files,
+                        'totals': totals(files)}
+            except Exception as e:
+                course_plan = {'course': course.ref, 'error': str(e)}
+            with lock:
+                plans.append(course_plan)
+
+        pool = WorkerPool(jobs)
         for course in student.courses:
-            print(course.ref)
-            course.synchronize_docs(path, student.session)
+            pool.submit(plan, course)
+        pool.join()
+
+        plans.sort(key=lambda p: p['course'])
+        files = [f for p in plans for f in p.get('files', ())]
+        failed = [p['course'] for p in plans if 'error' in p]
+        print(dumps({
+            'path': path,
+            'courses': plans,
+            'totals': totals(files),
+            'failed': failed,
+        }, indent=2, sort_keys=True))
+        if failed:
+            return False
+
+
+    def watch_courses(self, courses, pull, jobs, after_round=None):
+        """
+        Call ``pull(course)`` on each course on an adaptive interval until
+        the process gets SIGTERM or SIGINT, and ``after_round()`` after each
+        round of pulls. The current round of pulls is completed before
+        returning, unless a second signal is received.
+        """
+        import signal
+        from didel.watch import AdaptiveSchedule, watch
+
+        min_interval = float(self.config.get('watch.min_interval', 120))
+        max_interval = float(self.config.get('watch.max_interval', 3600))
+        courses = dict((course.ref, course) for course in courses)
+        schedule = AdaptiveSchedule(sorted(courses), min_interval,
+                max_interval)
+        stop = threading.Event()
+
+        def on_signal(signum, frame):
+            print("Stopping after the current pulls, press Ctrl-C again "
+                  "to abort...")
+            stop.set()
+            # a second signal aborts the current pulls
+            for sig, handler in handlers:
+                signal.signal(sig, handler)
+
+        handlers = [(sig, signal.signal(sig, on_signal))
+                    for sig in (signal.SIGTERM, signal.SIGINT)]
+        print("Watching %d course(s), press Ctrl-C to stop" % len(courses))
+        try:
+            watch(schedule, lambda ref: pull(courses[ref]), stop, jobs,
+                    after_round=after_round)
+        finally:
+            for sig, handler in handlers:
+                signal.signal(sig, handler)
 
 
     # TODO use --save instead
-    def action_pull_save(self, path):
+    def action_pull_save(self, path, concurrency=None, jobs=None,
+            max_requests=None, rebuild_manifest=False, segments=None,
+            watch=False, store=False):
         """
         Same as ``didel pull``, but save the path in the config for later
         usage.
         """
         self.config.set("courses.syncpath", abspath(path), True)
-        self.action_pull(path)
+        return self.action_pull(path, concurrency, jobs, max_requests,
+                rebuild_manifest, segments, watch, store=store)
+
+
+    def action_batch_pull(self, accounts, processes=None,
+            max_connections=None):
+        """
+        Pull the documents of several accounts in parallel, each one in its
+        own process. <accounts> is a file with a section per account:
+            [alice]
+            username = alice
+            password = s3cr3t
+            path = mirrors/alice
+        Options:
+            --processes N        pull up to N accounts at the same time
+                                 (config: 'batch.processes', default: 4)
+            --max-connections N  make at most N requests at the same time,
+                                 across all accounts (config:
+                                 'batch.max_connections', default: 16)
+        The other settings are read from the config as for 'pull'. Each
+        account's cookies, cache and manifest are kept in its folder. The
+        output of an account is printed at once when it's done.
+        """
+        import multiprocessing
+        from didel.batch import init_worker, pull_account, read_accounts, \
+                PRIVATE_KEYS
+
+        try:
+            accounts = read_accounts(accounts)
+        except (IOError, ValueError) as e:
+            print("Can't read the accounts: %s" % e)
+            return False
+        self.migrate_config()
+        processes = self.int_option(processes, 'batch.processes', 4)
+        max_connections = self.int_option(max_connections,
+                'batch.max_connections', 16)
+        settings = [(k, v) for k, v in self.config.items()
+                    if k not in PRIVATE_KEYS]
+        # each account can use all the shared slots
+        settings.append(('session.max_requests', str(max_connections)))
+        options = {'no_cache': self.options['no_cache']}
+
+        slots = multiprocessing.BoundedSemaphore(max_connections)
+        pool = multiprocessing.Pool(max(1, min(processes, len(accounts))),
+                init_worker, (slots,))
+        start = time()
+        results = []
+        try:
+            for result in pool.imap_unordered(pull_account,
+                    [(a, settings, options) for a in accounts]):
+                results.append(result)
+                print("== %s: %s, %d file(s), %s in %.1fs" % (
+                    result['name'], "ok" if result['ok'] else "failed",
+                    result['files'], human_size(result['bytes']),
+                    result['time']))
+                print(result['output'])
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        elapsed = max(time() - start, 1e-3)
+
+        size = sum(r['bytes'] for r in results)
+        requests = sum(r['requests'] for r in results)
+        print("Pulled %d account(s) in %.1fs: %d file(s), %s (%s/s), "
+              "%d requests (%.1f/s)" % (len(results), elapsed,
+                  sum(r['files'] for r in results), human_size(size),
+                  human_size(size / elapsed), requests, requests / elapsed))
+        failed = [r['name'] for r in results if not r['ok']]
+        if failed:
+            print("Failed accounts: %s" % ', '.join(sorted(failed)))
+            return False
+
+
+    def parse_options(self, argv, options, names=()):
+        """
+        Extract ``--name value``, ``--name=value`` and ``--flag`` options from
+        ``argv``. ``options`` maps the name of each optional argument of an
+        action to its default value; those with a boolean default are flags
+        which don't take any value. Dashes in names are replaced with
+        underscores. ``names`` are the names of the positional arguments, in
+        order: an argument can't be given both by position and as an option.
+
+        Return a pair of positional arguments and a ``dict`` of options, or
+        ``None`` if an option is invalid.
+        """
+        args, kwargs = [], {}
+        argv = list(argv)
+        while argv:
+            arg = argv.pop(0)
+            if arg == '--':
+                args.extend(argv)
+                break
+            if not arg.startswith('--') or arg in HELP_FLAGS:
+                args.append(arg)
+                continue
+            name, eq, value = arg[2:].partition('=')
+            key = name.replace('-', '_')
+            if key not in options:
+                print("Unrecognized option '--%s'" % name)
+                return None
+            if isinstance(options[key], bool):
+                kwargs[key] = True
+                continue
+            if not eq:
+                if not argv:
+                    print("Option '--%s' requires a value" % name)
+                    return None
+                value = argv.pop(0)
+            kwargs[key] = value
+        for name in names[:len(args)]:
+            if name in kwargs:
+                print("Argument '%s' given twice" % name)
+                return None
+        return args, kwargs
+
+
+    def parse_global_options(self, argv):
+        """
+        Consume the global options at the beginning of ``argv`` and save them
+        in ``self.options``. Return ``False`` if one of them is invalid.
+        """
+        while argv and argv[0].startswith('--'):
+            name, eq, _ = argv[0][2:].partition('=')
+            key = name.replace('-', '_')
+            if key not in self.options:
+                break
+            n = 1 if eq or isinstance(self.options[key], bool) else 2
+            parsed = self.parse_options(argv[:n], self.options)
+            if parsed is None:
+                return False
+            self.options.update(parsed[1])
+            del argv[:n]
+        return True
+
+
+    def call_action(self, fun, args, kwargs):
+        """
+        Call an action. With the '--trace' option, the spans recorded while
+        it runs are saved in the given file, which can be opened in
+        chrome://tracing or https://ui.perfetto.dev. With '--profile', the
+        action and the threads it starts run under cProfile, and their merged
+        hot spots are printed when it ends.
+        """
+        tracer = profiler = None
+        if self.options['trace']:
+            from didel import tracing
+            tracer = tracing.enable()
+        if self.options['profile']:
+            from didel.tracing import ThreadsProfile
+            profiler = ThreadsProfile()
+            profiler.enable()
+        try:
+            return fun(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.print_profile(profiler)
+            if tracer is not None:
+                tracing.disable()
+                self.save_trace(tracer, self.options['trace'])
+
+
+    def print_profile(self, profiler):
+        print("\nHot spots (by cumulative time):")
+        stats = profiler.stats()
+        stats.strip_dirs().sort_stats('cumulative').print_stats(PROFILE_LINES)
+
+
+    def save_trace(self, tracer, path):
+        try:
+            tracer.save(path)
+        except (IOError, OSError) as e:
+            print("Can't save the trace in %s: %s" % (path, e))
+            return
+        print("\nTrace saved in %s (%d spans)" % (path, len(tracer.events)))
+        for cat, count, total in tracer.summary():
+            print("  %-10s %6d  %8.3fs" % (cat, count, total))
 
 
     def run(self):
@@ -270,6 +1041,8 @@ class DidelCli(object):
         """
         # We're using a custom parser here to handle subcommands.
         argv = self.argv
+        if not self.parse_global_options(argv):
+            return False
         argc = len(argv)
         if argc == 0:
             return self.print_help()
@@ -283,10 +1056,11 @@ class DidelCli(object):
 
         # Subcommands are defined as below:
         #   def action_some_keyword(self, ...)
-        # defines an action 'some:keyword'. We might need to use classes for
+        # defines an action 'some:keyword', which can also be called as
+        # 'some-keyword'. We might need to use classes for
         # subcommands like Thor (Ruby gem), but it'd be too much overhead for
         # now.
-        name = 'action_%s' % action.replace(':', '_')
+        name = 'action_%s' % action.replace(':', '_').replace('-', '_')
         if not hasattr(self, name):
             print("Unrecognized action '%s'" % action)
             return self.print_help()
@@ -294,29 +1068,30 @@ class DidelCli(object):
         fun = getattr(self, name)
 
         # dynamically check if enough arguments were given on the command line
-        spec = inspect.getargspec(fun)
+        spec = getargspec(fun)
         # skip 'self'
         spec_args = (spec.args or ())[1:]
         spec_defaults = spec.defaults or ()
         defaults_len = len(spec_defaults)
         required_len = len(spec_args) - defaults_len
 
-        if argc < required_len or (argc > 0 and argv[0] in HELP_FLAGS):
-            defaults = list(reversed(spec_args))[:defaults_len]
-            args = []
-            for arg in spec_args:
-                fmt = '<%s>'
-                if arg in defaults:
-                    fmt = '[%s]' % fmt
-                args.append(fmt % arg)
-
-            if spec.varargs:
-                args.append('[<%s...>]' % spec.varargs)
-
-            print("Usage:\n\t%s %s %s" % (self.exe, action, ' '.join(args)))
-            return False
+        # optional arguments can also be given as '--options'
+        options = dict(zip(spec_args[required_len:], spec_defaults))
+        parsed = self.parse_options(argv, options, spec_args)
+        if parsed is None:
+            return self.print_usage(action, spec, options)
+        argv, kwargs = parsed
+        argc = len(argv)
 
-        return fun(*argv)
+        if argc < required_len or (argc > 0 and argv[0] in HELP_FLAGS):
+            return self.print_usage(action, spec, options)
+
+        ret = self.call_action(fun, argv, kwargs)
+        # keep the cookies and the cache for the next command
+        if self.session is not None:
+            self.session.save_cookies()
+            self.session.close()
+        return ret
 
 
 def abort(msg, code=1):
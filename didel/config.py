@@ -7,7 +7,7 @@ except ImportError:  # Python 3
 
 import base64
 from os import chmod
-from os.path import expanduser, isfile
+from os.path import dirname, expanduser, isfile, join
 
 
 class DidelConfig(object):
@@ -29,6 +29,9 @@ class DidelConfig(object):
     """
 
     SOURCE_FILE = expanduser('~/.didel.conf')
+    # these are relative to the config file's directory
+    CACHE_DIR = '.didel.cache'
+    COOKIES_FILE = '.didel.cookies'
     SECRET_SECTION = 'secret'
     _default = None
 
@@ -44,6 +47,8 @@ class DidelConfig(object):
 
     def __init__(self, filename=SOURCE_FILE):
         self.filename = filename
+        self.cache_dir = join(dirname(filename), self.CACHE_DIR)
+        self.cookies_file = join(dirname(filename), self.COOKIES_FILE)
         self.config = SafeConfigParser()
         if not isfile(self.filename):
             self.save()
@@ -118,7 +123,8 @@ class DidelConfig(object):
         """
         if '.' not in key:
             key = '%s.%s' % (self.SECRET_SECTION, key)
-        return self.set(key, base64.b16encode(value), save)
+        value = base64.b16encode(value.encode('utf-8')).decode('ascii')
+        return self.set(key, value, save)
 
 
     def get_secret(self, key):
@@ -130,7 +136,7 @@ class DidelConfig(object):
             key = '%s.%s' % (self.SECRET_SECTION, key)
         value = self.get(key)
         if value is not None:
-            return base64.b16decode(value)
+            return base64.b16decode(value.encode('ascii')).decode('utf-8')
 
 
     def has_secret_key(self, key):
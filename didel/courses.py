@@ -4,19 +4,51 @@ from __future__ import unicode_literals
 
 try:
     from urlparse import urlparse, parse_qs
+    from Queue import Queue, Full
 except ImportError:  # Python 3
     from urllib.parse import urlparse, parse_qs
+    from queue import Queue, Full
 
-import os
+from os.path import dirname, exists, getsize
+from time import time
+import threading
 
 from didel.base import DidelEntity
-from didel.fileutils import date2timestamp, mkdir_p, file_mtime
+from didel.downloads import Download, content_length, SEGMENT_THRESHOLD
+from didel.exceptions import DidelServerError
+from didel.fileutils import deadline2timestamp, mkdir_p
+from didel.manifest import is_outdated
+from didel.multipart import MultipartEncoder
+from didel.parsers import Query, get_parser, has_class
 from didel.souputils import parse_homemade_dl
+from didel.workers import WorkerPool, prefetch
 
 def parse_query(url):
     return parse_qs(urlparse(url).query)
 
 
+# Queries used to parse the pages
+Q_CONTENT = Query('#courseRightContent', ".//*[@id='courseRightContent']")
+Q_SMALL_IN_P = Query('p small', './/p//small')
+Q_ASSIGNMENTS_ROWS = Query('#courseRightContent table tbody tr',
+        ".//*[@id='courseRightContent']//table//tbody//tr")
+Q_LINKS = Query('a', './/a')
+Q_SUBMISSIONS_TITLES = Query('#courseRightContent ul li',
+        ".//*[@id='courseRightContent']//ul//li")
+Q_COURSE_INFOS = Query('.courseInfos', './/*[%s]' % has_class('courseInfos'))
+Q_TITLE_LINK = Query('h2 a', './/h2//a')
+Q_PARAGRAPHS = Query('p', './/p')
+Q_ABOUT = Query('#portletAbout', ".//*[@id='portletAbout']")
+Q_COURSES_LINKS = Query('dt a', './/dt//a')
+Q_DOCUMENTS_ROWS = Query('.claroTable tbody tr[align=center]',
+        ".//*[%s]//tbody//tr[@align='center']" % has_class('claroTable'))
+Q_CELLS = Query('td', './/td')
+Q_ITEM = Query('.item', './/*[%s]' % has_class('item'))
+Q_SMALL = Query('small', './/small')
+Q_FOLDER_ICON = Query('img[src^="/web/img/folder.png"]',
+        ".//img[starts-with(@src, '/web/img/folder.png')]")
+
+
 class CoursePage(DidelEntity):
     """
     A common base for Course-related pages
@@ -43,24 +75,33 @@ class CourseAssignment(CoursePage):
 
 
     def populate(self, soup, session, **kw):
-        content = soup.select('#courseRightContent')[0]
-        attrs = parse_homemade_dl(content.select('p small')[0])
+        p = get_parser(session)
+        content = p.select(soup, Q_CONTENT)[0]
+        attrs = parse_homemade_dl(p.select(content, Q_SMALL_IN_P)[0], p)
         self.title = attrs.get('titre')
         self.begin = attrs.get('du')
         self.end = attrs.get('au')
+        self.deadline = deadline2timestamp(self.end)
         self.submission_type = attrs.get('type de soumission')
         self.work_type = attrs.get('type de travail')
         self.visibility = attrs.get(u'visibilit\xe9 de la soumission')
         self.assig_id = parse_query(self.path)['assigId'][0]
 
 
-    def submit(self, student, title, datafile, description=''):
+    def submit(self, student, title, datafile, description='',
+            progress=None):
         """
         Create a new submission for this assignment
         - ``student``: a ``Student`` object for the currently connected user
         - ``title``: the assignment's title
         - ``datafile``: an open file-like object for the attachment
         - ``description``: an optional description
+        - ``progress``: an optional callback, called with the number of bytes
+          sent and the total size as the upload progresses
+
+        The file is streamed, so it's never loaded in memory. Once it's
+        uploaded, the submission is confirmed by checking that the page of
+        the assignment lists its title.
         """
         authors = '%s %s' % (student.lastname, student.firstname)
         data = {
@@ -76,25 +117,93 @@ class CourseAssignment(CoursePage):
         files = {
             'wrkFile': datafile
         }
-        path_fmt = '/claroline/work/user_work.php?assigId={aid}&authId={uid}'
-        path = path_fmt.format(aid=self.assig_id, uid=student.auth_id)
-        resp = self.session.post(path, data=data, files=files)
-        return resp.ok and title in resp.text
+        body = MultipartEncoder(data, files, progress)
+        resp = self.session.post(self.submissions_path(student), data=body,
+                headers={'Content-Type': body.content_type})
+        if not resp.ok:
+            return False
+        # the response may not be the page of the assignment
+        try:
+            return self.is_submitted(student, title)
+        except DidelServerError:
+            return False
+
+
+    def submissions_path(self, student):
+        """
+        Return the path of the page of the student's submissions for this
+        assignment
+        """
+        # the course is given so that the page can be fetched again
+        path_fmt = '/claroline/work/user_work.php' \
+                '?assigId={aid}&authId={uid}&cidReq={ref}'
+        return path_fmt.format(aid=self.assig_id, uid=student.auth_id,
+                ref=self.course_code)
+
+
+    def _fetch_submissions(self, student):
+        resp = self.session.get(self.submissions_path(student))
+        self.session.check_response(resp)
+        p = get_parser(self.session)
+        soup = p.parse_response(resp)
+        titles = [p.text(item).strip()
+                  for item in p.select(soup, Q_SUBMISSIONS_TITLES)]
+        return titles, p.text(soup)
+
+
+    def submission_titles(self, student):
+        """
+        Return the titles of the student's submissions for this assignment,
+        as listed on their page. Raise a ``DidelServerError`` if they can't
+        be fetched.
+        """
+        return self._fetch_submissions(student)[0]
+
+
+    def is_submitted(self, student, title):
+        """
+        Test if the student's submissions for this assignment include one
+        with the given title. If their page has no list of submissions, the
+        title is looked for in its text. Raise a ``DidelServerError`` if it
+        can't be fetched.
+        """
+        titles, text = self._fetch_submissions(student)
+        if titles:
+            return title.strip() in titles
+        # the text also has the title of the assignment, which can contain
+        # the title of the submission
+        return text.count(title) > (self.title or '').count(title)
 
 
 
 class CourseAssignments(CoursePage, list):
     """
-    Assignments list for a course
+    Assignments list for a course. Iterating over it fetches the assignments
+    ``prefetch_window`` at a time in parallel, ahead of the loop: ::
+
+        for assignment in course.assignments:
+            print(assignment.title)
     """
 
     URL_FMT = '/claroline/work/work.php?cidReset=true&cidReq={ref}'
 
+    prefetch_window = 8
+
+    def __iter__(self):
+        session = getattr(self, 'session', None)
+        assignments = list.__iter__(self)
+        if session is None:
+            return assignments
+        return prefetch(assignments, lambda a: a.fetch(session),
+                self.prefetch_window)
+
+
     def populate(self, soup, session):
-        trs = soup.select('#courseRightContent table tbody tr')
+        p = get_parser(session)
+        trs = p.select(soup, Q_ASSIGNMENTS_ROWS)
         path_fmt = '/claroline/work/%s'
         for tr in trs:
-            path = path_fmt % tr.select('a')[0].attrs['href']
+            path = path_fmt % p.attr(p.select(tr, Q_LINKS)[0], 'href')
             self.append(CourseAssignment(path, self.ref))
 
 
@@ -120,23 +229,40 @@ class Course(CoursePage):
 
 
     def populate(self, soup, session):
-        header = soup.select('.courseInfos')[0]
-        self.title = header.select('h2 a')[0].get_text()
-        self.teacher = header.select('p')[0].get_text().split('\n')[-1].strip()
-        about = soup.select('#portletAbout')
+        p = get_parser(session)
+        header = p.select(soup, Q_COURSE_INFOS)[0]
+        self.title = p.text(p.select(header, Q_TITLE_LINK)[0])
+        teacher = p.text(p.select(header, Q_PARAGRAPHS)[0])
+        self.teacher = teacher.split('\n')[-1].strip()
+        about = p.select(soup, Q_ABOUT)
         if about:
-            self.about = about[0].get_text().strip()
+            self.about = p.text(about[0]).strip()
 
 
-    def synchronize_docs(self, path, session):
+    def synchronize_docs(self, path, session, concurrency=1, manifest=None,
+            segments=1, segment_threshold=SEGMENT_THRESHOLD, store=None):
         """
         Synchronize the documents in the given path with the ones from the
         courses followed by the student. The path will be created and populated
-        if it doesn't exist.
+        if it doesn't exist. ``concurrency`` is the maximum number of folders
+        fetched in parallel. See ``CourseDocuments.synchronize`` for
+        ``manifest`` and ``store``, and ``CourseDocuments.download`` for
+        ``segments`` and ``segment_threshold``.
+        Return the list of downloaded documents.
+        """
+        d = CourseDocuments(self.ref)
+        return d.pull(path, session, concurrency, manifest, segments,
+                segment_threshold, store)
+
+
+    def plan_docs(self, path, session, concurrency=1, manifest=None,
+            store=None):
+        """
+        Same as ``synchronize_docs`` without downloading anything: return
+        what it would do. See ``CourseDocuments.plan``.
         """
         d = CourseDocuments(self.ref)
-        d.fetch(session)
-        d.synchronize(path)
+        return d.plan(path, session, concurrency, manifest, store)
 
 
     def enroll(self, key=None):
@@ -167,7 +293,11 @@ class Course(CoursePage):
 
 class CoursesMainPage(DidelEntity, list):
     """
-    DidEL's student homepage
+    DidEL's student homepage. It's a list of the student's courses, which are
+    not fetched; ``fetch_courses`` fetches them in parallel: ::
+
+        for course in student.courses.fetch_courses(session):
+            print(course.title)
     """
 
     def __init__(self):
@@ -175,9 +305,53 @@ class CoursesMainPage(DidelEntity, list):
         self.path = '/'
 
 
-    def populate(self, soup, *args, **kw):
-        for ref in soup.select("dt a"):
-            href = ref.get("href")
+    def fetch_courses(self, session, window=8):
+        """
+        Yield the courses in order, each one after its page was fetched. Up
+        to ``window`` pages are fetched in parallel ahead of the loop.
+        """
+        return prefetch(list.__iter__(self), lambda c: c.fetch(session),
+                window)
+
+
+    def fetch_assignments(self, session, concurrency=8):
+        """
+        Fetch the assignments of all the courses, without fetching the
+        courses themselves, and return them as a list of
+        ``CourseAssignment``\ s. Up to ``concurrency`` pages are fetched in
+        parallel. Raise a ``DidelServerError`` if a page can't be fetched,
+        rather than returning an incomplete list.
+        """
+        pool = WorkerPool(concurrency)
+        assignments = []
+        lock = threading.Lock()
+
+        def fetch(entity):
+            resp = session.get(entity.url())
+            session.check_response(resp)
+            entity.load(resp, session)
+
+        def fetch_list(course):
+            course_assignments = CourseAssignments(course.ref)
+            fetch(course_assignments)
+            for assignment in list.__iter__(course_assignments):
+                pool.submit(fetch_assignment, assignment)
+
+        def fetch_assignment(assignment):
+            fetch(assignment)
+            with lock:
+                assignments.append(assignment)
+
+        for course in list.__iter__(self):
+            pool.submit(fetch_list, course)
+        pool.join()
+        return assignments
+
+
+    def populate(self, soup, session=None, *args, **kw):
+        p = get_parser(session)
+        for ref in p.select(soup, Q_COURSES_LINKS):
+            href = p.attr(ref, "href")
             if not href:
                 continue
             cid = parse_query(href).get("cid")
@@ -193,7 +367,12 @@ class CourseDocuments(DidelEntity):
     def __init__(self, ref, path=None):
         super(CourseDocuments, self).__init__()
         self.ressources = {}
+        self.folders = []
+        self.rows = []
         self.ref = ref
+        # date and size of the folder as shown in its parent's listing
+        self.date = None
+        self.size = None
         if path :
             self.path = path
             self.ref = ""
@@ -205,58 +384,322 @@ class CourseDocuments(DidelEntity):
         """
         Get all documents and folder from a course.
         """
-        table = soup.select(".claroTable tbody tr[align=center]")
+        p = get_parser(session)
+        table = p.select(soup, Q_DOCUMENTS_ROWS)
+        rows = []
         for line in table:
-            cols = line.select("td")
-            item = cols[0].select(".item")[0]
-            name = item.contents[1].strip()
-            date = cols[2].select("small")[0].contents[0].strip()
-            url = cols[0].select("a")[0].attrs["href"].strip()
-
-            if item.select("img[src^=/web/img/folder.png]"):
+            cols = p.select(line, Q_CELLS)
+            item = p.select(cols[0], Q_ITEM)[0]
+            name = p.children(item)[1][1].strip()
+            size = p.text(cols[1]).strip()
+            date = p.children(p.select(cols[2], Q_SMALL)[0])[0][1].strip()
+            url = p.attr(p.select(cols[0], Q_LINKS)[0], "href").strip()
+            is_folder = bool(p.select(item, Q_FOLDER_ICON))
+            rows.append([name, url, date, size, is_folder])
+        self.add_rows(rows)
+
+
+    def add_rows(self, rows):
+        """
+        Add the documents and folders of a listing, given as the
+        ``[name, url, date, size, is_folder]`` rows extracted by
+        ``populate``. They're kept in ``rows``.
+        """
+        for name, url, date, size, is_folder in rows:
+            if is_folder:
+                # subfolders are fetched by ``crawl``
                 doc = CourseDocuments("", url)
-                doc.fetch(self.session)
+                doc.date = date
+                doc.size = size
+                self.folders.append(doc)
             else:
-                doc = CourseDocument(name, url, date)
+                doc = CourseDocument(name, url, date, size)
             self.add_resource(name, doc)
+        self.rows.extend(rows)
+
+
+    def crawl(self, session, concurrency=1):
+        """
+        Fetch this folder and all its subfolders, recursively. Up to
+        ``concurrency`` folders are fetched in parallel; the resulting tree is
+        the same whatever the concurrency is.
+        """
+        pool = WorkerPool(concurrency)
+
+        def visit(folder):
+            folder.fetch(session)
+            for subfolder in folder.folders:
+                pool.submit(visit, subfolder)
+
+        pool.submit(visit, self)
+        pool.join()
 
 
-    def synchronize(self, path):
+    def acrawl(self, session):
+        """
+        Asynchronous version of ``crawl``, to be used with a
+        ``didel.aio.AsyncSession``. It returns a coroutine.
+        """
+        return session.crawl(self)
+
+
+    def walk(self, session, concurrency=1, queue_size=64, manifest=None):
+        """
+        Crawl this folder and its subfolders like ``crawl``, and yield a
+        ``(relative_path, CourseDocument)`` tuple for each document as soon
+        as the listing of its folder is parsed: ::
+
+            for path, document in folder.walk(session, 4):
+                print(path)
+
+        If a ``didel.manifest.SyncManifest`` is given, the listings of the
+        subfolders are recorded in it, and a subfolder whose date and size in
+        its parent's listing didn't change since then isn't fetched again:
+        its recorded listing is used instead, with the exceptions described
+        in ``SyncManifest``. Only the changed branches of a tree are fetched.
+
+        The documents are passed from the crawling threads through a queue
+        of ``queue_size`` items; when it's full the crawl waits for the
+        caller to consume them. The crawled folders are not kept, so the
+        memory used doesn't depend on the size of the tree. Closing the
+        generator stops the crawl.
+        """
+        items = Queue(queue_size)
+        stopped = threading.Event()
+        pool = WorkerPool(concurrency)
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return
+                except Full:
+                    pass
+
+        def visit(folder, prefix):
+            if stopped.is_set():
+                return
+            # the root folder has no date and is always fetched
+            known = manifest is not None and folder.date is not None
+            rows = manifest.folder(folder.path, folder.date, folder.size) \
+                    if known else None
+            if rows is not None:
+                folder.add_rows(rows)
+            else:
+                # a folder which can't be listed must not be silently skipped
+                resp = session.get(folder.url())
+                session.check_response(resp)
+                folder.load(resp, session)
+                if known:
+                    manifest.record_folder(folder.path, folder.date,
+                            folder.rows, folder.size)
+            for name, res in folder._resources.items():
+                if isinstance(res, CourseDocuments):
+                    pool.submit(visit, res, '%s%s/' % (prefix, name))
+                else:
+                    put(('%s%s' % (prefix, name), res))
+
+        def crawl():
+            error = None
+            try:
+                # crawl a copy of this folder so that the tree isn't kept
+                pool.submit(visit, CourseDocuments("", self.path), '')
+                pool.join()
+            except Exception as e:
+                error = e
+            # the end of the crawl
+            put((None, error))
+
+        crawler = threading.Thread(target=crawl)
+        crawler.daemon = True
+        crawler.start()
+        try:
+            while True:
+                path, item = items.get()
+                if path is None:
+                    if item is not None:
+                        raise item
+                    return
+                yield path, item
+        finally:
+            stopped.set()
+            crawler.join()
+
+
+    def pull(self, path, session, concurrency=1, manifest=None, segments=1,
+            segment_threshold=SEGMENT_THRESHOLD, store=None):
+        """
+        Same as ``crawl`` followed by ``synchronize``, except that documents
+        are downloaded while the folders are still being crawled, using
+        ``walk``, which skips the unchanged subfolders recorded in
+        ``manifest``. Empty folders are not created. See ``download`` for
+        ``segments`` and ``segment_threshold``, and ``synchronize`` for
+        ``store``.
+        Return the list of downloaded documents.
+        """
+        path = "%s/%s" % (path, self.ref)
+        mkdir_p(path)
+        self.session = session
+        downloaded = []
+        for relpath, document in self.walk(session, concurrency,
+                manifest=manifest):
+            filepath = "%s/%s" % (path, relpath)
+            if self._is_outdated(filepath, document, manifest):
+                mkdir_p(dirname(filepath))
+                self._download(document, filepath, manifest, segments,
+                        segment_threshold, store)
+                downloaded.append(document)
+        return downloaded
+
+
+    def plan(self, path, session, concurrency=1, manifest=None,
+            store=None):
+        """
+        Tell what ``pull`` would do, without downloading anything. Return a
+        list of ``dict``\ s, one per document, with its ``path`` relative to
+        the course folder, its ``url``, its remote ``date``, its ``status``
+        (``new``, ``updated`` or ``unchanged``) and, for the documents which
+        would be downloaded, their size in ``bytes`` as given by the
+        ``Content-Length`` of a ``HEAD`` request, or ``None`` if it's
+        unknown. Up to ``concurrency`` ``HEAD`` requests are made in
+        parallel. The documents which are already in ``store`` would be
+        linked instead: they're ``stored`` and have 0 ``bytes``.
+        """
+        path = "%s/%s" % (path, self.ref)
+        entries = []
+        pool = WorkerPool(concurrency)
+
+        def estimate(entry, document):
+            entry['bytes'] = self.remote_size(document, session)
+
+        try:
+            for relpath, document in self.walk(session, concurrency,
+                    manifest=manifest):
+                filepath = "%s/%s" % (path, relpath)
+                if not self._is_outdated(filepath, document, manifest):
+                    status = 'unchanged'
+                elif exists(filepath):
+                    status = 'updated'
+                else:
+                    status = 'new'
+                entry = {
+                    'path': relpath,
+                    'url': document.url,
+                    'date': document.date,
+                    'status': status,
+                    'bytes': None,
+                }
+                entries.append(entry)
+                if status == 'unchanged':
+                    continue
+                if store is not None and store.lookup(document):
+                    entry['stored'] = True
+                    entry['bytes'] = 0
+                else:
+                    pool.submit(estimate, entry, document)
+        finally:
+            pool.join()
+        entries.sort(key=lambda e: e['path'])
+        return entries
+
+
+    def remote_size(self, document, session):
+        """
+        Return the size of a document with a ``HEAD`` request, without
+        downloading it, or ``None`` if it's unknown
+        """
+        resp = session.head(document.url, allow_redirects=True)
+        return content_length(resp) if resp.ok else None
+
+
+    def _is_outdated(self, filepath, document, manifest):
+        if manifest is None:
+            return is_outdated(filepath, document)
+        return manifest.is_outdated(filepath, document)
+
+
+    def _download(self, document, filepath, manifest, segments=1,
+            segment_threshold=SEGMENT_THRESHOLD, store=None):
+        digest = store.lookup(document) if store is not None else None
+        if digest is not None:
+            # the same document was already downloaded
+            store.checkout(digest, filepath)
+            document.path = filepath
+            document.linked = True
+            document.resumed = False
+            document.download_time = 0
+            document.downloaded_size = 0
+        else:
+            self.download(document, dirname(filepath), segments,
+                    segment_threshold)
+            if store is not None:
+                store.add(filepath, document)
+        if manifest is not None:
+            manifest.record(filepath, document)
+
+
+    def synchronize(self, path, manifest=None, store=None):
         """
         compare files on didel with file in folder,
             and calling download add or reset files'user
             only if not exist or older
+        If a ``didel.manifest.SyncManifest`` is given, it's used instead of
+        the filesystem to know which files are outdated, and it's updated
+        with the downloaded ones.
+        If a ``didel.objectstore.ObjectStore`` is given, the downloaded files
+        are stored in it and replaced by links to their object, and the
+        documents it already has are linked instead of being downloaded: their
+        ``linked`` attribute is true.
+        Return the list of downloaded documents.
         """
         path = "%s/%s" % (path, self.ref)
         mkdir_p(path)
+        downloaded = []
         for k, resource in self._resources.items():
+            filepath = "%s/%s" % (path, k)
             if isinstance(resource, CourseDocuments):
-                resource.synchronize("%s/%s" % (path, k))
-            else:
-                no_file = not os.path.exists("%s/%s" % (path, k))
-                didel_time = date2timestamp(resource.date)
-                if no_file or didel_time > file_mtime("%s/%s" % (path, k)):
-                    self.download(resource, path)
+                downloaded.extend(resource.synchronize(filepath, manifest,
+                    store))
+                continue
+            if self._is_outdated(filepath, resource, manifest):
+                self._download(resource, filepath, manifest, store=store)
+                downloaded.append(resource)
+        return downloaded
 
 
     # TODO move this on the CourseDocument class
-    def download(self, document, path):
+    def download(self, document, path, segments=1,
+            segment_threshold=SEGMENT_THRESHOLD):
         """
         Download a document in a given path, provided that the parent
-        directories already exist
+        directories already exist. The document is streamed to a ``.part``
+        file and only appears at its final path once it's complete. An
+        interrupted download is resumed by the next one.
+
+        Files of at least ``segment_threshold`` bytes are downloaded in
+        ``segments`` parallel ``Range`` requests if the server supports them,
+        and in one stream otherwise. See ``didel.downloads``.
+
+        The size of the downloaded file and the time it took are stored in the
+        document's ``downloaded_size`` and ``download_time`` attributes, and
+        ``resumed`` tells if a previous download was resumed.
         """
-        response = self.session.get(document.url)
         document.path = "%s/%s" % (path, document.name)
-        with open(document.path, 'w') as file:
-            # TODO use a binary stream here
-            file.write(response.content)
+        start = time()
+        download = Download(self.session, document.url, document.path)
+        download.run(segments, segment_threshold)
+        document.linked = False
+        document.resumed = download.resumed
+        document.download_time = time() - start
+        document.downloaded_size = getsize(document.path)
 
 
 
 class CourseDocument(object):
 
-    def __init__(self, name, url, date):
+    def __init__(self, name, url, date, size=None):
         self.name = name
         self.url = url
         self.date = date
+        self.size = size
 
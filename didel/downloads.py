@@ -0,0 +1,299 @@
+# -*- coding: UTF-8 -*-
+
+"""
+Resumable and segmented downloads. A file is downloaded in a ``.part`` file
+next to its final path, and the state of the download is saved as it
+progresses so that an interrupted download can be resumed later with
+``Range`` requests. Large files are fetched as several ``Range`` requests
+made in parallel, each one written at its offset in the ``.part`` file.
+"""
+
+from os import remove
+from os.path import getsize, isfile
+import json
+import re
+import threading
+
+from requests.exceptions import ContentDecodingError
+
+from didel.fileutils import replace, write_atomically, CHUNK_SIZE
+from didel.tracing import span
+from didel.workers import WorkerPool
+
+# Default minimum size of the files downloaded in segments
+SEGMENT_THRESHOLD = 8 * 1024 * 1024
+
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class RangeNotSupported(Exception):
+    """
+    Raised when the server doesn't respond to a ``Range`` request with the
+    requested part of the file, e.g. because it changed
+    """
+
+    pass
+
+
+def is_encoded(response):
+    """
+    Test if the body of ``response`` is encoded, e.g. compressed. Its
+    offsets are then the ones of the encoded body, not of the file.
+    """
+    return response.headers.get('content-encoding', 'identity') != 'identity'
+
+
+def content_length(response):
+    """
+    Return the size of the file served by ``response``, or ``None`` if it's
+    unknown
+    """
+    if is_encoded(response):
+        return None
+    try:
+        return int(response.headers.get('content-length'))
+    except (TypeError, ValueError):
+        return None
+
+
+def segmented_size(response, segments, threshold=SEGMENT_THRESHOLD):
+    """
+    Return the size of the file served by ``response`` if it can be
+    downloaded in ``segments`` segments, i.e. the server accepts ranges and
+    the file is at least ``threshold`` bytes long. Return ``None`` otherwise.
+    """
+    if segments < 2 or response.headers.get('accept-ranges') != 'bytes':
+        return None
+    size = content_length(response)
+    return size if size and size >= threshold else None
+
+
+def validator(response):
+    """
+    Return the value of the ``If-Range`` header to use for the ranges of the
+    file served by ``response``, or ``None``
+    """
+    etag = response.headers.get('etag')
+    # If-Range only accepts strong ETags
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('last-modified')
+
+
+def split_ranges(size, segments):
+    """
+    Split ``size`` bytes in ``segments`` ``(start, end)`` ranges, ``end``
+    being excluded
+    """
+    step = -(-size // segments)
+    return [(start, min(start + step, size))
+            for start in range(0, size, step)]
+
+
+class Download(object):
+    """
+    A download from ``url`` to ``path``, made with the given session. The
+    file is written at ``path + '.part'`` until it's complete, and the state
+    of the download (URL, validator, size and remaining ranges) is saved in
+    ``path + '.part.json'`` every ``SAVE_INTERVAL`` bytes and when it fails.
+    If the download is interrupted, the next one resumes from there with
+    ``Range`` requests, unless the remote file changed.
+
+    >>> Download(session, url, path).run(segments=4)
+    """
+
+    PART_SUFFIX = '.part'
+    SAVE_INTERVAL = 1024 * 1024
+
+    def __init__(self, session, url, path):
+        self.session = session
+        self.url = url
+        self.path = path
+        self.part = path + self.PART_SUFFIX
+        self.state_file = self.part + '.json'
+        self.state = self._load_state()
+        self.resumed = False
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._file = None
+
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if state.get('url') != self.url or not state.get('validator') \
+                or not isfile(self.part):
+            return None
+        return state
+
+
+    def save_state(self):
+        """
+        Save the state of the download if it can be resumed, i.e. the server
+        gave a validator for the file and didn't encode it
+        """
+        if self.state and self.state['validator']:
+            data = json.dumps(self.state).encode('utf-8')
+            write_atomically(self.state_file, [data])
+
+
+    def discard(self):
+        """
+        Remove the partially downloaded file and its state
+        """
+        self.state = None
+        for path in (self.part, self.state_file):
+            try:
+                remove(path)
+            except OSError:
+                pass
+
+
+    def run(self, segments=1, threshold=SEGMENT_THRESHOLD):
+        """
+        Download the file, resuming the previous download if there's one.
+        Files of at least ``threshold`` bytes are downloaded in ``segments``
+        parallel ranges if the server supports them.
+        """
+        with span('download', 'download', url=self.url, path=self.path) \
+                as trace:
+            self._run(segments, threshold)
+            trace['resumed'] = self.resumed
+            trace['bytes'] = getsize(self.path)
+
+
+    def _run(self, segments, threshold):
+        if self.state is not None:
+            self.resumed = True
+            try:
+                return self._fetch()
+            except (RangeNotSupported, ContentDecodingError):
+                # the remote file changed, or the server sent an encoded
+                # part of it: start over
+                self.resumed = False
+                self.discard()
+        try:
+            self._start(segments, threshold)
+        except RangeNotSupported:
+            # the server advertises ranges but doesn't support them
+            self.discard()
+            self._start(1, threshold)
+
+
+    def _start(self, segments, threshold):
+        # the slot is taken again by ``_fetch`` to read the body
+        with self.session.slot():
+            response = self.session.get(self.url, stream=True)
+            try:
+                self.session.check_response(response)
+            except BaseException:
+                response.close()
+                raise
+        size = segmented_size(response, segments, threshold)
+        if size is None:
+            size = content_length(response)
+            ranges = [[0, size]]
+        else:
+            ranges = [list(r) for r in split_ranges(size, segments)]
+        # the ranges count decoded bytes, but a Range request would apply to
+        # the encoded body: it can't be resumed
+        resumable = not is_encoded(response)
+        self.state = {
+            'url': self.url,
+            'validator': validator(response) if resumable else None,
+            'size': size,
+            'ranges': ranges,
+        }
+        with open(self.part, 'wb') as f:
+            if len(ranges) > 1:
+                f.truncate(size)
+        self.save_state()
+        self._fetch(response)
+
+
+    def _fetch(self, response=None):
+        """
+        Fetch the remaining ranges. If ``response`` is given, it's the
+        response of a request for the whole file, used for the first range.
+        """
+        first = self.state['ranges'][0] if response is not None else None
+        ranges = [r for r in self.state['ranges'] if r is not first
+                and (r[1] is None or r[0] < r[1])]
+        pool = WorkerPool(len(ranges))
+        with open(self.part, 'r+b') as f:
+            self._file = f
+            for rng in ranges:
+                pool.submit(self._fetch_range, rng)
+            try:
+                try:
+                    if response is not None:
+                        with self.session.slot():
+                            self._write(response, first)
+                finally:
+                    if response is not None:
+                        response.close()
+                    pool.join()
+            except BaseException:
+                self._save_progress()
+                raise
+        replace(self.part, self.path)
+        self.discard()
+
+
+    def _fetch_range(self, rng):
+        start, end = rng
+        headers = {
+            'Range': 'bytes=%d-%s' % (start, '' if end is None else end - 1),
+            'If-Range': self.state['validator'],
+        }
+        size = self.state['size']
+        with self.session.slot():
+            resp = self.session.get(self.url, stream=True, headers=headers)
+            try:
+                served = CONTENT_RANGE.match(
+                        resp.headers.get('content-range', ''))
+                if resp.status_code != 206 or not served or \
+                        is_encoded(resp) or int(served.group(1)) != start or \
+                        (size is not None and served.group(3) != str(size)):
+                    raise RangeNotSupported('%s: range %d-%s not served'
+                            % (self.url, start, end))
+                self._write(resp, rng)
+            finally:
+                resp.close()
+
+
+    def _write(self, resp, rng):
+        """
+        Write the body of ``resp`` from the start of the range ``rng``, which
+        is updated as the body is read
+        """
+        with span('write range', 'fs', path=self.part, start=rng[0]):
+            self._write_range(resp, rng)
+
+
+    def _write_range(self, resp, rng):
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            if rng[1] is not None:
+                chunk = chunk[:rng[1] - rng[0]]
+            with self._lock:
+                self._file.seek(rng[0])
+                self._file.write(chunk)
+                rng[0] += len(chunk)
+                self._unsaved += len(chunk)
+                if self._unsaved >= self.SAVE_INTERVAL:
+                    self._file.flush()
+                    self.save_state()
+                    self._unsaved = 0
+            if rng[1] is not None and rng[0] >= rng[1]:
+                break
+        if rng[1] is not None and rng[0] < rng[1]:
+            raise IOError('%s: incomplete download' % self.url)
+
+
+    def _save_progress(self):
+        with self._lock:
+            self._file.flush()
+            self.save_state()
@@ -20,3 +20,18 @@ class DidelServerError(Exception):
 
     def __unicode__(self):
         return self.msg
+
+
+
+class DidelCircuitOpen(Exception):
+
+    def __init__(self, failures):
+        self.msg = u"Too many server errors (%d in a row), giving up" \
+                % failures
+        super(DidelCircuitOpen, self).__init__(self.msg)
+
+    def __str__(self):
+        return self.msg
+
+    def __unicode__(self):
+        return self.msg
@@ -1,10 +1,28 @@
 # -*- coding: UTF-8 -*-
 
+from contextlib import contextmanager
 from os import stat, makedirs
-from os.path import isdir
+from os.path import isdir, split
 from time import mktime
 from datetime import datetime
+from binascii import hexlify
 import errno
+import os
+import re
+
+try:
+    from os import replace as _rename
+except ImportError:  # Python 2
+    from os import rename as _rename
+
+from didel.tracing import span
+
+# Size of the chunks used to stream files
+CHUNK_SIZE = 64 * 1024
+
+# A date with an optional time, e.g. "30/03/2015" or "30.03.2015 23:59"
+DEADLINE = re.compile(r'(\d{1,2})[/.](\d{1,2})[/.](\d{4})'
+        r'(?:\D+(\d{1,2})[:h](\d{2}))?')
 
 def date2timestamp(text, default=None):
     """
@@ -19,6 +37,27 @@ def date2timestamp(text, default=None):
     return mktime(date.timetuple())
 
 
+def deadline2timestamp(text, default=None):
+    """
+    Return a timestamp from an assignment's deadline, formatted as
+    ``30/03/2015`` or ``30/03/2015 23:59``. A deadline without a time is at
+    the end of the day. Like ``date2timestamp``, it assumes you're in the
+    same timezone as DidEL.
+    """
+    m = DEADLINE.search(text or '')
+    if m is None:
+        return default
+    day, month, year, hour, minute = m.groups()
+    if hour is None:
+        hour, minute = 23, 59
+    try:
+        date = datetime(int(year), int(month), int(day), int(hour),
+                int(minute))
+    except ValueError:
+        return default
+    return mktime(date.timetuple())
+
+
 def file_mtime(path):
     """
     Return the last modification time of a file
@@ -37,3 +76,65 @@ def mkdir_p(path):
         if ex.errno == errno.EEXIST and isdir(path):
             return
         raise
+
+
+@contextmanager
+def atomic_file(path, mode=438):
+    """
+    Context manager which opens a temporary file in the same directory as
+    ``path`` for writing in binary mode, and renames it to ``path`` when the
+    block ends, so ``path`` is never left truncated. The temporary file is
+    removed if the block fails. ``mode`` gives the permissions of the file;
+    the default is 0666 (438), filtered by the umask. ::
+
+        with atomic_file(path) as f:
+            f.write(data)
+    """
+    dirname, basename = split(path)
+    tmp = os.path.join(dirname, '.%s.%s.tmp' % (
+        basename, hexlify(os.urandom(4)).decode('ascii')))
+    flags = os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    fd = os.open(tmp, flags, mode)
+    try:
+        with span('write', 'fs', path=path) as args:
+            with os.fdopen(fd, 'r+b') as f:
+                yield f
+                args['bytes'] = f.tell()
+            _rename(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def replace(src, dst):
+    """
+    Rename ``src`` to ``dst``, replacing ``dst`` if it exists
+    """
+    _rename(src, dst)
+
+
+def write_atomically(path, chunks, mode=438):
+    """
+    Write an iterable of ``bytes`` chunks in the file at ``path``, using
+    ``atomic_file``: the file is not modified if the iteration or the write
+    fails.
+    """
+    with atomic_file(path, mode) as f:
+        for chunk in chunks:
+            if chunk:
+                f.write(chunk)
+
+
+def human_size(size):
+    """
+    Return a human-readable version of a size in bytes
+    """
+    if size < 1024:
+        return '%d B' % size
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024.0
+        if size < 1024 or unit == 'GB':
+            return '%.1f %s' % (size, unit)
@@ -0,0 +1,198 @@
+# -*- coding: UTF-8 -*-
+
+from hashlib import sha1
+from os import chmod, remove
+from os.path import join
+from time import time
+import json
+import threading
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from didel.fileutils import mkdir_p, write_atomically
+
+# Headers kept with the cached bodies
+KEPT_HEADERS = ('content-type', 'etag', 'last-modified')
+
+
+class HTTPCache(object):
+    """
+    An on-disk cache of responses to ``GET`` requests. It keeps their
+    validators (``ETag`` and ``Last-Modified`` headers) to make conditional
+    requests, and serves ``304 Not Modified`` responses from the disk.
+
+    The cache is kept under ``max_size`` bytes by evicting the least recently
+    used responses first.
+
+    The index of the responses is kept in memory and written every
+    ``save_every`` changes, and by ``flush``, which ``Session.close`` calls.
+
+    >>> cache = HTTPCache('/tmp/didel-cache')
+    >>> session = Session(cache=cache)
+    """
+
+    INDEX = 'index.json'
+
+    def __init__(self, path, max_size=50 * 1024 * 1024, save_every=100):
+        self.path = path
+        self.max_size = max_size
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        mkdir_p(path)
+        # 448 is 0700; cached pages are private
+        chmod(path, 448)
+        self._index = self._load_index()
+        self._size = sum(e['size'] for e in self._index.values())
+        self._changes = 0
+
+
+    def _load_index(self):
+        try:
+            with open(join(self.path, self.INDEX)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+
+    def _save_index(self):
+        data = json.dumps(self._index).encode('utf-8')
+        write_atomically(join(self.path, self.INDEX), [data])
+        self._changes = 0
+
+
+    def _changed(self):
+        # must be called with the lock held
+        self._changes += 1
+        if self._changes >= self.save_every:
+            self._save_index()
+
+
+    def flush(self):
+        """
+        Write the index if it changed since it was last written
+        """
+        with self._lock:
+            if self._changes:
+                self._save_index()
+
+
+    def key(self, url):
+        """
+        Return the cache key of an URL
+        """
+        return sha1(url.encode('utf-8')).hexdigest()
+
+
+    def size(self):
+        """
+        Return the total size of the cached bodies
+        """
+        return self._size
+
+
+    def validators(self, url):
+        """
+        Return the conditional headers to use for a request on ``url``
+        """
+        entry = self._index.get(self.key(url))
+        headers = {}
+        if not entry:
+            return headers
+        if entry['headers'].get('etag'):
+            headers['If-None-Match'] = entry['headers']['etag']
+        if entry['headers'].get('last-modified'):
+            headers['If-Modified-Since'] = entry['headers']['last-modified']
+        return headers
+
+
+    def store(self, url, resp):
+        """
+        Store a successful response in the cache if it has validators and is
+        not too large. Return ``True`` if it was stored.
+        """
+        headers = resp.headers
+        if not (headers.get('etag') or headers.get('last-modified')):
+            return False
+        body = resp.content
+        if len(body) > self.max_size:
+            return False
+        key = self.key(url)
+        write_atomically(join(self.path, key), [body])
+        with self._lock:
+            old = self._index.get(key)
+            if old is not None:
+                self._size -= old['size']
+            self._size += len(body)
+            self._index[key] = {
+                'url': url,
+                'size': len(body),
+                'atime': time(),
+                'encoding': resp.encoding,
+                'headers': dict((h, headers[h])
+                    for h in KEPT_HEADERS if h in headers),
+            }
+            self._evict()
+            self._changed()
+        return True
+
+
+    def _evict(self):
+        if self._size <= self.max_size:
+            return
+        lru = sorted(self._index.items(), key=lambda kv: kv[1]['atime'])
+        for key, entry in lru:
+            if self._size <= self.max_size:
+                break
+            self._remove(key)
+
+
+    def _remove(self, key):
+        self._size -= self._index.pop(key)['size']
+        try:
+            remove(join(self.path, key))
+        except OSError:
+            pass
+
+
+    def response(self, url, not_modified):
+        """
+        Return the cached response for ``url`` given the ``304 Not Modified``
+        response of the server, or ``None`` if it's not in the cache anymore.
+        """
+        key = self.key(url)
+        with self._lock:
+            entry = self._index.get(key)
+        if not entry:
+            return None
+        try:
+            with open(join(self.path, key), 'rb') as f:
+                body = f.read()
+        except IOError:
+            return None
+        with self._lock:
+            entry['atime'] = time()
+            self._changed()
+
+        resp = Response()
+        resp.status_code = 200
+        resp.reason = 'OK'
+        resp._content = body
+        resp.headers = CaseInsensitiveDict(entry['headers'])
+        resp.encoding = entry['encoding']
+        resp.url = not_modified.url
+        resp.request = not_modified.request
+        resp.history = not_modified.history
+        resp.from_cache = True
+        return resp
+
+
+    def clear(self):
+        """
+        Remove everything from the cache
+        """
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            self._size = 0
+            self._save_index()
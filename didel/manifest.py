@@ -0,0 +1,243 @@
+# -*- coding: UTF-8 -*-
+
+from hashlib import sha1
+from os.path import exists, getsize, join, normpath, relpath
+from time import time
+import json
+import sqlite3
+import threading
+
+from didel.fileutils import date2timestamp, file_mtime
+
+# Remote dates have a day precision, and are in DidEL's timezone: a folder
+# listed less than this many seconds after the start of its date's day may
+# have changed since then without getting a new date
+DATE_PRECISION = 2 * 24 * 3600
+
+# The columns of the folders table
+FOLDER_COLUMNS = ('url', 'date', 'size', 'fingerprint', 'rows', 'listed',
+        'reuses')
+
+
+def folder_columns(db):
+    """
+    Return the columns of the folders table of a database, or an empty tuple
+    if it doesn't have one
+    """
+    return tuple(row[1] for row in db.execute("PRAGMA table_info(folders)"))
+
+
+def is_outdated(path, document):
+    """
+    Test if the local file at ``path`` is missing or older than the remote
+    ``document``, using the filesystem. Note that remote dates only have a
+    day precision.
+    """
+    if not exists(path):
+        return True
+    return date2timestamp(document.date) > file_mtime(path)
+
+
+class SyncManifest(object):
+    """
+    An index of the documents synchronized under a directory. For each local
+    file it records the URL, remote date and size of the document it was
+    downloaded from, so that deciding what to download doesn't need to look
+    at the filesystem. It also records the listings of the remote folders,
+    so that the unchanged ones don't need to be fetched again.
+
+    It's stored in a SQLite database at the root of the directory and is
+    entirely loaded in memory when opened. Changes are written with ``commit``
+    or ``close``. A ``readonly`` manifest is loaded from the database if it
+    exists, but its changes are only kept in memory.
+
+    A folder's recorded listing is used as long as its date and size in its
+    parent's listing don't change, except if it was listed on the day of its
+    date, and it's listed again at least once every ``relist_every`` times.
+
+    >>> manifest = SyncManifest('/path/to/courses')
+    >>> if manifest.is_outdated(path, document):
+    ...     download(document, path)
+    ...     manifest.record(path, document)
+    >>> manifest.close()
+    """
+
+    FILENAME = '.didel-manifest.sqlite'
+
+    def __init__(self, root, relist_every=10, readonly=False):
+        self.root = root
+        self.relist_every = relist_every
+        self.readonly = readonly
+        self.filename = join(root, self.FILENAME)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(':memory:' if readonly else self.filename,
+                check_same_thread=False)
+        self._create_tables()
+        if readonly and exists(self.filename):
+            self._copy_tables()
+        self._entries = {}
+        for row in self._db.execute(
+                "SELECT path, url, date, size, local_size FROM documents"):
+            self._entries[row[0]] = row[1:]
+        self._folders = {}
+        for row in self._db.execute("SELECT %s FROM folders"
+                % ', '.join(FOLDER_COLUMNS)):
+            self._folders[row[0]] = list(row[1:])
+
+
+    def _create_tables(self):
+        self._db.execute("""CREATE TABLE IF NOT EXISTS documents (
+            path TEXT PRIMARY KEY,
+            url TEXT,
+            date TEXT,
+            size TEXT,
+            local_size INTEGER
+        )""")
+        if folder_columns(self._db) not in ((), FOLDER_COLUMNS):
+            # an older version; the listings are fetched again
+            self._db.execute("DROP TABLE folders")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS folders (
+            url TEXT PRIMARY KEY,
+            date TEXT,
+            size TEXT,
+            fingerprint TEXT,
+            rows TEXT,
+            listed REAL,
+            reuses INTEGER
+        )""")
+
+
+    def _copy_tables(self):
+        # only read the database: it's not modified nor upgraded
+        saved = sqlite3.connect(self.filename)
+        try:
+            self._db.executemany("INSERT INTO documents VALUES "
+                    "(?, ?, ?, ?, ?)", saved.execute("SELECT path, url, "
+                        "date, size, local_size FROM documents"))
+            if folder_columns(saved) == FOLDER_COLUMNS:
+                self._db.executemany("INSERT INTO folders VALUES "
+                        "(?, ?, ?, ?, ?, ?, ?)", saved.execute(
+                            "SELECT %s FROM folders"
+                            % ', '.join(FOLDER_COLUMNS)))
+        finally:
+            saved.close()
+
+
+    def key(self, path):
+        """
+        Return the key of a local path in the manifest
+        """
+        return normpath(relpath(path, self.root))
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def get(self, path):
+        """
+        Return a ``(url, date, size, local_size)`` tuple for a local path, or
+        ``None`` if it's not in the manifest.
+        """
+        return self._entries.get(self.key(path))
+
+
+    def is_outdated(self, path, document):
+        """
+        Test if the local file at ``path`` must be downloaded from
+        ``document``. Files which are not in the manifest yet are checked on
+        the filesystem, and recorded if they're up to date.
+        """
+        entry = self.get(path)
+        if entry is None:
+            if is_outdated(path, document):
+                return True
+            self.record(path, document)
+            return False
+        url, date, size = entry[:3]
+        return (url, date, size) != (document.url, document.date,
+                getattr(document, 'size', None))
+
+
+    def record(self, path, document):
+        """
+        Record that the file at ``path`` is up to date with ``document``
+        """
+        key = self.key(path)
+        local_size = getsize(path) if exists(path) else None
+        row = (document.url, document.date, getattr(document, 'size', None),
+                local_size)
+        with self._lock:
+            self._entries[key] = row
+            self._db.execute("INSERT OR REPLACE INTO documents VALUES "
+                    "(?, ?, ?, ?, ?)", (key,) + row)
+
+
+    def folder(self, url, date, size=None):
+        """
+        Return the rows of the listing of the folder at ``url`` recorded with
+        ``record_folder``, if the folder still has the same ``date`` and
+        ``size`` and its listing can be trusted (see above). Return ``None``
+        if it's unknown or may have changed.
+        """
+        with self._lock:
+            entry = self._folders.get(url)
+            if entry is None or entry[:2] != [date, size]:
+                return None
+            fingerprint, rows, listed, reuses = entry[2:]
+            if sha1(rows.encode('utf-8')).hexdigest() != fingerprint:
+                return None
+            # a change on the same day wouldn't change the date
+            date_ts = date2timestamp(date or '')
+            if date_ts is None or listed < date_ts + DATE_PRECISION:
+                return None
+            if reuses + 1 >= self.relist_every:
+                return None
+            entry[5] = reuses + 1
+            self._db.execute("UPDATE folders SET reuses = ? WHERE url = ?",
+                    (reuses + 1, url))
+        return json.loads(rows)
+
+
+    def record_folder(self, url, date, rows, size=None):
+        """
+        Record the rows of the listing of the folder at ``url``, which has
+        the given ``date`` and ``size`` in its parent's listing. The rows are
+        fingerprinted so that an unchanged listing isn't written again.
+        """
+        rows = json.dumps(rows, sort_keys=True)
+        fingerprint = sha1(rows.encode('utf-8')).hexdigest()
+        listed = time()
+        with self._lock:
+            entry = self._folders.get(url)
+            if entry is not None and entry[:3] == [date, size, fingerprint]:
+                entry[4:] = [listed, 0]
+                self._db.execute("UPDATE folders SET listed = ?, reuses = 0 "
+                        "WHERE url = ?", (listed, url))
+                return
+            self._folders[url] = [date, size, fingerprint, rows, listed, 0]
+            self._db.execute("INSERT OR REPLACE INTO folders VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?)", (url, date, size, fingerprint,
+                        rows, listed, 0))
+
+
+    def clear(self):
+        """
+        Forget everything. The manifest will be rebuilt from the filesystem
+        on the next synchronization, and all the folders will be fetched.
+        """
+        with self._lock:
+            self._entries = {}
+            self._folders = {}
+            self._db.execute("DELETE FROM documents")
+            self._db.execute("DELETE FROM folders")
+
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+
+    def close(self):
+        self.commit()
+        self._db.close()
@@ -0,0 +1,132 @@
+# -*- coding: UTF-8 -*-
+
+"""
+Streaming ``multipart/form-data`` bodies. ``requests`` builds the whole body
+of a request with ``files`` in memory; a ``MultipartEncoder`` is a file-like
+object which reads the files chunk by chunk as the body is sent, so that
+uploading a large file uses a constant amount of memory: ::
+
+    body = MultipartEncoder({'title': 'TP 1'}, {'file': open(path, 'rb')})
+    session.post(url, data=body, headers={'Content-Type': body.content_type})
+"""
+
+from binascii import hexlify
+from os import fstat, urandom
+from os.path import basename
+
+from didel.fileutils import CHUNK_SIZE
+
+
+def to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    if not isinstance(value, type(u'')):
+        value = u'%s' % value
+    return value.encode('utf-8')
+
+
+def quote_param(value):
+    """
+    Quote the value of a ``Content-Disposition`` parameter, as browsers do
+    """
+    value = to_bytes(value)
+    for char, escaped in ((b'"', b'%22'), (b'\r', b'%0D'), (b'\n', b'%0A')):
+        value = value.replace(char, escaped)
+    return b'"' + value + b'"'
+
+
+def remaining_size(f):
+    """
+    Return the number of bytes which can still be read from the file ``f``
+    """
+    start = f.tell()
+    try:
+        return fstat(f.fileno()).st_size - start
+    except (AttributeError, IOError, OSError, ValueError):
+        f.seek(0, 2)
+        size = f.tell() - start
+        f.seek(start)
+        return size
+
+
+class MultipartEncoder(object):
+    """
+    A ``multipart/form-data`` body made of ``fields``, a ``dict`` of form
+    values, and ``files``, a ``dict`` which maps names to open files. Only
+    ``CHUNK_SIZE`` bytes of a file are in memory at a time. ``callback`` is
+    called with the number of bytes read so far and the total size each
+    time a part of the body is read.
+    """
+
+    def __init__(self, fields, files, callback=None, chunk_size=CHUNK_SIZE):
+        self.boundary = hexlify(urandom(16))
+        self.content_type = 'multipart/form-data; boundary=%s' % \
+                self.boundary.decode('ascii')
+        self.callback = callback
+        self.chunk_size = chunk_size
+        self.read_size = 0
+        self._parts = []
+        for name, value in sorted(fields.items()):
+            self._parts.append(self._headers(name) + to_bytes(value)
+                    + b'\r\n')
+        for name, f in sorted(files.items()):
+            filename = basename(getattr(f, 'name', name))
+            self._parts.append(self._headers(name, filename))
+            self._parts.append(f)
+            self._parts.append(b'\r\n')
+        self._parts.append(b'--' + self.boundary + b'--\r\n')
+        self.size = sum(len(p) if isinstance(p, bytes) else remaining_size(p)
+                        for p in self._parts)
+        self._chunks = self._iter_chunks()
+        self._buffer = b''
+
+
+    def _headers(self, name, filename=None):
+        disposition = b'form-data; name=' + quote_param(name)
+        headers = [b'--' + self.boundary]
+        if filename is None:
+            headers.append(b'Content-Disposition: ' + disposition)
+        else:
+            headers.append(b'Content-Disposition: ' + disposition
+                    + b'; filename=' + quote_param(filename))
+            headers.append(b'Content-Type: application/octet-stream')
+        return b'\r\n'.join(headers) + b'\r\n\r\n'
+
+
+    def _iter_chunks(self):
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            while True:
+                chunk = part.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+    def __len__(self):
+        return self.size
+
+
+    def read(self, size=-1):
+        """
+        Read up to ``size`` bytes of the body, or what remains of it if
+        ``size`` is negative
+        """
+        if size is None or size < 0:
+            size = self.size
+        buf = [self._buffer]
+        length = len(self._buffer)
+        while length < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            buf.append(chunk)
+            length += len(chunk)
+        data = b''.join(buf)
+        data, self._buffer = data[:size], data[size:]
+        self.read_size += len(data)
+        if data and self.callback is not None:
+            self.callback(self.read_size, self.size)
+        return data
@@ -0,0 +1,139 @@
+# -*- coding: UTF-8 -*-
+
+"""
+Content-addressed storage of the pulled documents. Each distinct file is
+stored once in the store, named after the SHA-256 of its content, and the
+documents are hardlinks to these objects, so a file posted in several
+courses or folders only uses its space once.
+
+The store also remembers which object each remote document (its URL, date
+and size) was downloaded as, so that a document which is already in the
+store is linked instead of being downloaded again, e.g. when several
+accounts pulling the same courses share a store.
+
+Since the documents are hardlinks, a local file modified in place is
+modified everywhere it appears; ``pull`` always replaces files instead.
+
+>>> store = ObjectStore('/path/to/courses/.didel-objects')
+>>> digest = store.lookup(document)
+>>> if digest is None:
+...     download(document, path)
+...     store.add(path, document)
+... else:
+...     store.checkout(digest, path)
+"""
+
+from hashlib import sha1, sha256
+from os.path import dirname, exists, join, split
+from binascii import hexlify
+import json
+import os
+import shutil
+
+from didel.fileutils import mkdir_p, replace, write_atomically, CHUNK_SIZE
+
+
+def file_digest(path):
+    """
+    Return the SHA-256 of the content of the file at ``path``
+    """
+    h = sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """
+    Make ``dst`` a hardlink to ``src``, replacing ``dst`` if it exists. The
+    file is copied if it can't be linked, e.g. across filesystems.
+    """
+    dirpath, basename = split(dst)
+    tmp = join(dirpath, '.%s.%s.tmp' % (basename,
+        hexlify(os.urandom(4)).decode('ascii')))
+    try:
+        os.link(src, tmp)
+    except (AttributeError, OSError):
+        shutil.copyfile(src, tmp)
+    try:
+        replace(tmp, dst)
+    except OSError:
+        os.remove(tmp)
+        raise
+
+
+class ObjectStore(object):
+    """
+    A store of files named after their content, under ``path``. Objects are
+    in ``objects/``, in subfolders named after the first two characters of
+    their digest, and the digests of the known remote documents are in
+    ``documents/``. Several processes can use the same store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        mkdir_p(join(path, 'objects'))
+        mkdir_p(join(path, 'documents'))
+
+
+    def object_path(self, digest):
+        """
+        Return the path of an object
+        """
+        return join(self.path, 'objects', digest[:2], digest[2:])
+
+
+    def _document_path(self, document):
+        key = json.dumps([document.url, document.date,
+            getattr(document, 'size', None)])
+        return join(self.path, 'documents',
+                sha1(key.encode('utf-8')).hexdigest())
+
+
+    def lookup(self, document):
+        """
+        Return the digest of the object a remote document was stored as, or
+        ``None`` if it's not in the store
+        """
+        try:
+            with open(self._document_path(document), 'rb') as f:
+                digest = f.read().decode('ascii').strip()
+        except (IOError, OSError, UnicodeDecodeError):
+            return None
+        if not digest or not exists(self.object_path(digest)):
+            return None
+        return digest
+
+
+    def add(self, path, document=None):
+        """
+        Store the file at ``path`` and return its digest. If the store
+        already has the same content, the file is replaced by a link to it.
+        If ``document`` is given, it's recorded as having this content.
+        """
+        digest = file_digest(path)
+        obj = self.object_path(digest)
+        mkdir_p(dirname(obj))
+        try:
+            os.link(path, obj)
+        except (AttributeError, OSError):
+            if exists(obj):
+                # the same content is already stored
+                if not os.path.samefile(path, obj):
+                    link_or_copy(obj, path)
+            else:
+                # hardlinks aren't supported here: store a copy
+                link_or_copy(path, obj)
+        if document is not None:
+            write_atomically(self._document_path(document),
+                    [digest.encode('ascii')])
+        return digest
+
+
+    def checkout(self, digest, path):
+        """
+        Make the file at ``path`` a link to an object, replacing it if it
+        exists. Its parent directory must exist.
+        """
+        link_or_copy(self.object_path(digest), path)
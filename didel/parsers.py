@@ -0,0 +1,180 @@
+# -*- coding: UTF-8 -*-
+
+import threading
+
+from bs4 import BeautifulSoup, Comment, NavigableString
+from lxml import etree
+import lxml.html
+
+try:
+    unicode
+except NameError:  # Python 3
+    unicode = str
+
+
+def has_class(name):
+    """
+    Return an XPath predicate matching elements with the given class
+    """
+    return "contains(concat(' ', normalize-space(@class), ' '), ' %s ')" % name
+
+
+class Query(object):
+    """
+    A query on a parsed page. It has a CSS selector used by the bs4 backend
+    and an equivalent XPath expression used by the lxml one, which is
+    compiled on its first use in each thread: ::
+
+        LINKS = Query('dt a', './/dt//a')
+        for link in parser.select(soup, LINKS):
+            ...
+    """
+
+    def __init__(self, css, xpath):
+        self.css = css
+        self.xpath = xpath
+        self._local = threading.local()
+
+
+    def compiled(self):
+        """
+        Return the compiled XPath expression
+        """
+        compiled = getattr(self._local, 'compiled', None)
+        if compiled is None:
+            compiled = self._local.compiled = etree.XPath(self.xpath)
+        return compiled
+
+
+
+class Bs4Backend(object):
+    """
+    The default parser backend, which uses BeautifulSoup with lxml
+    """
+
+    name = 'bs4'
+
+    def parse(self, markup):
+        return BeautifulSoup(markup, 'lxml')
+
+
+    def parse_response(self, resp):
+        return self.parse(resp.text)
+
+
+    def select(self, node, query):
+        return node.select(query.css)
+
+
+    def text(self, node):
+        return node.get_text()
+
+
+    def attr(self, node, name, default=None):
+        return node.attrs.get(name, default)
+
+
+    def children(self, node):
+        """
+        Return the children of a node as a list of ``(tag, text)`` tuples,
+        where ``tag`` is ``None`` for text nodes. Comments are skipped.
+        """
+        children = []
+        for child in node.children:
+            if isinstance(child, Comment):
+                continue
+            if isinstance(child, NavigableString):
+                children.append((None, unicode(child)))
+            else:
+                children.append((child.name, child.get_text()))
+        return children
+
+
+
+class LxmlBackend(object):
+    """
+    A faster parser backend which uses ``lxml.html`` directly on the bytes of
+    the responses and evaluates precompiled XPath expressions.
+    """
+
+    name = 'lxml'
+
+    def __init__(self):
+        # lxml parsers can't be shared between threads
+        self._local = threading.local()
+
+
+    def _parser(self, encoding):
+        parsers = self._local.__dict__.setdefault('parsers', {})
+        if encoding not in parsers:
+            parsers[encoding] = lxml.html.HTMLParser(encoding=encoding)
+        return parsers[encoding]
+
+
+    def parse(self, markup, encoding=None):
+        if isinstance(markup, unicode):
+            # lxml refuses unicode strings with an encoding declaration
+            markup, encoding = markup.encode('utf-8'), 'utf-8'
+        if not markup.strip():
+            markup = b'<html></html>'
+        return lxml.html.document_fromstring(markup,
+                parser=self._parser(encoding))
+
+
+    def parse_response(self, resp):
+        return self.parse(resp.content, resp.encoding)
+
+
+    def select(self, node, query):
+        return query.compiled()(node)
+
+
+    def text(self, node):
+        return node.text_content()
+
+
+    def attr(self, node, name, default=None):
+        return node.get(name, default)
+
+
+    def children(self, node):
+        """
+        Same as ``Bs4Backend.children``
+        """
+        children = []
+        if node.text:
+            children.append((None, node.text))
+        for child in node:
+            if isinstance(child.tag, (str, unicode)):
+                children.append((child.tag, child.text_content()))
+            if child.tail:
+                children.append((None, child.tail))
+        return children
+
+
+
+BACKENDS = {
+    'bs4': Bs4Backend,
+    'lxml': LxmlBackend,
+}
+
+DEFAULT_BACKEND = Bs4Backend()
+
+
+def get_backend(name=None):
+    """
+    Return a parser backend from its name, ``bs4`` or ``lxml``. The default
+    one is returned if ``name`` is ``None``.
+    """
+    if name is None:
+        return DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError("Unknown parser backend '%s'" % name)
+    return BACKENDS[name]()
+
+
+def get_parser(session):
+    """
+    Return the parser backend of a session, or the default one
+    """
+    return getattr(session, 'parser', None) or DEFAULT_BACKEND
@@ -0,0 +1,113 @@
+# -*- coding: UTF-8 -*-
+
+from random import uniform
+from time import time
+import threading
+
+from didel.exceptions import DidelCircuitOpen
+
+
+class RetryPolicy(object):
+    """
+    A policy to retry failed requests: connection errors and responses with
+    one of the ``statuses`` status codes are retried up to ``retries`` times,
+    waiting ``backoff * 2 ** attempt`` seconds (up to ``max_backoff``) with a
+    random jitter between two attempts. A ``Retry-After`` header is honored
+    if it's not longer than ``max_backoff``.
+
+    Only requests with an idempotent method (``methods``) are retried, so a
+    ``POST`` such as an assignment submission is never sent twice.
+
+    >>> session = Session(retry=RetryPolicy(retries=5))
+    """
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30,
+            statuses=(500, 502, 503, 504), methods=('GET', 'HEAD', 'OPTIONS')):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(methods)
+
+
+    def can_retry(self, method, attempt):
+        """
+        Test if a request with the given method can be retried after its
+        ``attempt``-th attempt, starting at 0
+        """
+        return attempt < self.retries and method.upper() in self.methods
+
+
+    def should_retry(self, method, attempt, resp):
+        """
+        Test if a request should be retried given its response
+        """
+        return resp.status_code in self.statuses \
+                and self.can_retry(method, attempt)
+
+
+    def delay(self, attempt, resp=None):
+        """
+        Return the number of seconds to wait after the ``attempt``-th attempt
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        # "equal jitter": at least half of the delay
+        delay = uniform(delay / 2.0, delay)
+        retry_after = resp is not None and resp.headers.get('retry-after')
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(int(retry_after), self.max_backoff))
+        return delay
+
+
+
+class CircuitBreaker(object):
+    """
+    Stop making requests to a failing server. After ``threshold``
+    consecutive failures (server errors or connection errors) the circuit is
+    open: requests fail immediately with ``DidelCircuitOpen`` for
+    ``cooldown`` seconds. After that, one request is let through; if it
+    succeeds the circuit is closed again, otherwise it stays open for
+    another ``cooldown``.
+    """
+
+    def __init__(self, threshold=10, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+
+    def is_open(self):
+        return self._opened_at is not None
+
+
+    def before_request(self):
+        """
+        Raise ``DidelCircuitOpen`` if no request should be made now
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time() - self._opened_at < self.cooldown:
+                raise DidelCircuitOpen(self.failures)
+            # let this request through, and block the other ones until we
+            # know its result
+            self._opened_at = time()
+
+
+    def record(self, success):
+        """
+        Record the result of a request
+        """
+        with self._lock:
+            if success:
+                self.failures = 0
+                self._opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self._opened_at is None:
+                    self.trips += 1
+                self._opened_at = time()
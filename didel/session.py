@@ -1,10 +1,20 @@
 # -*- coding: UTF-8 -*-
 
-from bs4 import BeautifulSoup
-from requests import Session as BaseSession
+from contextlib import contextmanager
+from time import sleep, time
+import json
+import threading
+
+from requests import Request, Session as BaseSession
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from requests.cookies import create_cookie
+from requests.exceptions import ConnectionError, Timeout
 
 from didel.base import ROOT_URL
 from didel.exceptions import DidelServerError
+from didel.fileutils import write_atomically
+from didel.parsers import Query, get_backend
+from didel.tracing import span
 
 
 URLS = {
@@ -15,6 +25,8 @@ URLS = {
         '?authModeReq=CAS',
 }
 
+Q_LOGIN_TOKEN = Query('input[name=lt]', ".//input[@name='lt']")
+
 HEADERS = {
     'User-Agent': 'Python/DidelCli +b@ptistefontaine.fr',
 }
@@ -24,20 +36,107 @@ class Session(BaseSession):
     """
     A session with built-in authentification support for Paris Diderot's
     websites.
+
+    If a ``didel.httpcache.HTTPCache`` is given as ``cache``, ``GET`` requests
+    are conditional and unchanged pages are served from it. Streamed requests
+    are never cached.
+
+    If ``cookies_file`` is given, cookies are loaded from it and saved in it
+    after each login, so that they can be reused by another session with
+    ``resume``. Once logged, the session transparently logs in again when a
+    request is redirected to the login page.
+
+    ``parser`` is the name of the parser backend used to parse the pages,
+    ``bs4`` (the default) or ``lxml``. See ``didel.parsers``.
+
+    ``root_url`` and ``login_url`` can be given to use another server than
+    DidEL, e.g. a mirror or a local one for tests. URLs on ``ROOT_URL`` are
+    then rewritten to ``root_url``.
+
+    ``retry`` is a ``didel.retry.RetryPolicy`` used to retry idempotent
+    requests which failed, and ``breaker`` a ``didel.retry.CircuitBreaker``
+    which stops making requests when the server keeps failing. The number
+    of requests made is kept in ``request_count``, and the number of
+    retried ones in ``retry_count``.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, max_requests=None, cache=None, cookies_file=None,
+            parser=None, root_url=None, login_url=None, retry=None,
+            breaker=None, *args, **kwargs):
         super(Session, self).__init__(*args, **kwargs)
         self.headers.update(HEADERS)
+        self.root_url = (root_url or ROOT_URL).rstrip('/')
+        self.login_url = login_url or URLS['login']
+        self.parser = get_backend(parser)
+        self._local = threading.local()
+        self._login_lock = threading.Lock()
+        self._logins = 0
+        self._credentials = None
+        self._cookies_owner = None
+        self.cache = cache
+        self.cookies_file = cookies_file
+        self.retry = retry
+        self.breaker = breaker
+        self.request_count = 0
+        self.retry_count = 0
+        self._stats_lock = threading.Lock()
+        self.set_max_requests(max_requests)
+        if cookies_file:
+            self.load_cookies()
+
+
+    def set_max_requests(self, max_requests, slots=None):
+        """
+        Limit the number of requests made at the same time with this session,
+        across all threads. ``None`` removes the limit. ``slots`` can be
+        given to share the limit with other sessions: it's a semaphore
+        initialized with ``max_requests``, e.g. a
+        ``multiprocessing.BoundedSemaphore`` shared by several processes.
+        """
+        self.max_requests = max_requests
+        self._slots = slots
+        if max_requests and slots is None:
+            self._slots = threading.BoundedSemaphore(max_requests)
+        # keep enough connections for all the parallel requests
+        pool_size = max(max_requests or 0, DEFAULT_POOLSIZE)
+        for prefix in ('http://', 'https://'):
+            self.mount(prefix, HTTPAdapter(pool_maxsize=pool_size))
+
+
+    @contextmanager
+    def slot(self):
+        """
+        Context manager which holds one of the in-flight requests slots for
+        the current thread, waiting for one to be free if needed. Requests
+        made inside it use this slot; this is useful to keep it while a
+        streamed response is read: ::
+
+            with session.slot():
+                resp = session.get(url, stream=True)
+                for chunk in resp.iter_content(1024):
+                    ...
+        """
+        if self._slots is None or getattr(self._local, 'in_slot', False):
+            yield
+            return
+        slots = self._slots
+        with slots:
+            self._local.in_slot = True
+            try:
+                yield
+            finally:
+                self._local.in_slot = False
 
 
     def get_url(self, url):
         """
         Get the final URL for a given one. If it starts with a slash (``/``),
-        the ``ROOT_URL`` is prepended.
+        the session's root URL is prepended.
         """
         if url.startswith('/'):
-            url = '%s%s' % (ROOT_URL, url)
+            url = '%s%s' % (self.root_url, url)
+        elif url.startswith(ROOT_URL) and self.root_url != ROOT_URL:
+            url = '%s%s' % (self.root_url, url[len(ROOT_URL):])
         return url
 
 
@@ -51,6 +150,95 @@ class Session(BaseSession):
         return super(Session, self).post(url, *args, **kwargs)
 
 
+    def head(self, url, *args, **kwargs):
+        url = self.get_url(url)
+        return super(Session, self).head(url, *args, **kwargs)
+
+
+    def request(self, method, url, *args, **kwargs):
+        with self.slot():
+            logins = self._logins
+            resp = self._retry_request(method, url, *args, **kwargs)
+            # uploaded files and streamed bodies have already been consumed,
+            # we can't send them again
+            consumed = kwargs.get('files') or \
+                    hasattr(kwargs.get('data'), 'read')
+            if self.is_login_redirect(resp) and not consumed:
+                if self.relogin(logins):
+                    resp = self._retry_request(method, url, *args, **kwargs)
+            return resp
+
+
+    def _retry_request(self, method, url, *args, **kwargs):
+        """
+        Make a request, retrying it according to the retry policy
+        """
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                self.breaker.before_request()
+            try:
+                resp = self._request(method, url, *args, **kwargs)
+            except (ConnectionError, Timeout):
+                if self.breaker is not None:
+                    self.breaker.record(False)
+                if self.retry is None or \
+                        not self.retry.can_retry(method, attempt):
+                    raise
+                resp = None
+            else:
+                if self.breaker is not None:
+                    self.breaker.record(resp.status_code < 500)
+                if self.retry is None or \
+                        not self.retry.should_retry(method, attempt, resp):
+                    return resp
+                resp.close()
+            with self._stats_lock:
+                self.retry_count += 1
+            sleep(self.retry.delay(attempt, resp))
+            attempt += 1
+
+
+    def _request(self, method, url, *args, **kwargs):
+        with self._stats_lock:
+            self.request_count += 1
+        with span(method.upper(), 'http', url=url) as trace:
+            if self.cache is not None and method.upper() == 'GET' \
+                    and not args and not kwargs.get('stream'):
+                resp = self._cached_get(url, **kwargs)
+            else:
+                resp = super(Session, self).request(method, url, *args,
+                        **kwargs)
+            trace['status'] = resp.status_code
+            trace['bytes'] = resp.headers.get('content-length')
+            return resp
+
+
+    def _cached_get(self, url, **kwargs):
+        # the cache is keyed on the full URL, including its query string
+        full_url = Request('GET', url, params=kwargs.get('params')) \
+                .prepare().url
+        headers = dict(kwargs.get('headers') or {})
+        validators = self.cache.validators(full_url)
+        headers.update(validators)
+        kwargs['headers'] = headers
+        resp = super(Session, self).request('GET', url, **kwargs)
+
+        if resp.status_code == 304 and validators:
+            cached = self.cache.response(full_url, resp)
+            if cached is not None:
+                return cached
+            # the response was evicted in the meantime
+            for h in validators:
+                del headers[h]
+            resp = super(Session, self).request('GET', url, **kwargs)
+
+        # don't cache redirections, e.g. to the login page
+        if resp.status_code == 200 and not resp.history:
+            self.cache.store(full_url, resp)
+        return resp
+
+
     def check_response(self, resp):
         """
         Check a response and returns ``True`` if it has a success status code,
@@ -65,22 +253,147 @@ class Session(BaseSession):
         """
         Authenticate an user
         """
-        params = {
-            'service': URLS['login_service'],
+        self._credentials = (username, passwd)
+        params = self.login_params()
+        url = self.login_url
+        self._local.logging_in = True
+        try:
+            data = self.login_data(self.get(url, params=params).text,
+                    username, passwd)
+            if data is None:
+                return False
+            resp = self.post(url, params=params, data=data)
+            ok = self.is_logged_in(resp)
+        finally:
+            self._local.logging_in = False
+        if ok:
+            self._logins += 1
+            self._cookies_owner = username
+            self.save_cookies()
+        return ok
+
+
+    def resume(self, username, passwd):
+        """
+        Authenticate an user, reusing the cookies loaded from
+        ``cookies_file`` if they belong to them. The credentials are only
+        used if the session has expired.
+        """
+        if self._cookies_owner == username and len(self.cookies):
+            self._credentials = (username, passwd)
+            return True
+        return self.login(username, passwd)
+
+
+    def relogin(self, logins=None):
+        """
+        Authenticate again with the last credentials given to ``login`` or
+        ``resume``. ``logins`` is the number of successful logins the caller
+        saw before it noticed it was logged out; if another thread has logged
+        in since, this doesn't log in again.
+        """
+        if self._credentials is None:
+            return False
+        with self._login_lock:
+            if logins is not None and logins != self._logins:
+                return True
+            return self.login(*self._credentials)
+
+
+    def is_login_redirect(self, resp):
+        """
+        Test if a response was redirected to the login page while logged,
+        i.e. the session expired.
+        """
+        if self._credentials is None or getattr(self._local, 'logging_in',
+                False):
+            return False
+        return resp.url.startswith(self.login_url)
+
+
+    def load_cookies(self):
+        """
+        Load the cookies saved in ``cookies_file``, skipping expired ones.
+        Return ``False`` if there's no valid cookies file.
+        """
+        try:
+            with open(self.cookies_file) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return False
+        now = time()
+        for attrs in data.get('cookies', ()):
+            expires = attrs.get('expires')
+            if expires is not None and expires < now:
+                continue
+            self.cookies.set_cookie(create_cookie(**attrs))
+        self._cookies_owner = data.get('username')
+        return True
+
+
+    def close(self):
+        """
+        Close the connections, and write the index of the cache
+        """
+        if self.cache is not None:
+            self.cache.flush()
+        super(Session, self).close()
+
+
+    def save_cookies(self):
+        """
+        Save the cookies in ``cookies_file``, readable only by the current
+        user. The file is replaced atomically so that concurrent processes
+        never read a partially written file.
+        """
+        if not self.cookies_file or self._cookies_owner is None:
+            return False
+        cookies = [{
+            'name': c.name,
+            'value': c.value,
+            'domain': c.domain,
+            'path': c.path,
+            'expires': c.expires,
+            'secure': c.secure,
+        } for c in list(self.cookies)]
+        data = json.dumps({'username': self._cookies_owner,
+            'cookies': cookies})
+        # 384 is 0600
+        write_atomically(self.cookies_file, [data.encode('utf-8')], 384)
+        return True
+
+
+    def login_params(self):
+        """
+        Return the query parameters of the login requests
+        """
+        return {
+            'service': self.get_url(URLS['login_service']),
         }
-        url = URLS['login']
-        soup = BeautifulSoup(self.get(url, params=params).text)
-        lts = soup.select('input[name=lt]')
+
+
+    def login_data(self, html, username, passwd):
+        """
+        Return the data to post to the login form given its ``html`` source,
+        or ``None`` if it can't be found.
+        """
+        p = self.parser
+        lts = p.select(p.parse(html), Q_LOGIN_TOKEN)
         if not lts:
-            return False
-        formkey = lts[0].attrs['value']
-        data = {
+            return None
+        formkey = p.attr(lts[0], 'value')
+        return {
             'username': username,
             'password': passwd,
             'lt': formkey,
             '_eventId': 'submit',
         }
-        resp = self.post(url, params=params, data=data)
+
+
+    def is_logged_in(self, resp):
+        """
+        Test if the response to the login form says the user is logged in
+        """
         return self.check_response(resp) and 'Quitter' in resp.text
 
 
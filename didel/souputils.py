@@ -6,11 +6,11 @@ except ImportError:  # Python 2.6
     from ordereddict import OrderedDict
 
 import re
-from bs4 import NavigableString
+from didel.parsers import get_backend
 
 START_COLON = re.compile(r'^\s*:\s*')
 
-def parse_homemade_dl(el):
+def parse_homemade_dl(el, parser=None):
     """
     Parse an homemade ``dl`` element. Those are text elements such as
     ``small`` or ``p`` with labels in bold (``b``) and values in normal font
@@ -26,19 +26,21 @@ def parse_homemade_dl(el):
         {'title': 'foo',
          'from': '2014/02/13',
          'to': '2014/03/25'}
+
+    ``el`` must have been parsed by the given parser backend, which defaults
+    to the bs4 one.
     """
     attrs = OrderedDict()
     key = None
+    parser = parser or get_backend()
 
-    for child in el.children:
-        if child.name == 'b':
-            key = child.get_text().strip().lower()
+    for tag, text in parser.children(el):
+        if tag == 'b':
+            key = text.strip().lower()
             continue
         if key:
             # avoid <br/>s and empty texts
-            if not isinstance(child, NavigableString):
-                child = child.get_text()
-            t = child.strip()
+            t = text.strip()
             if t:
                 attrs[key] = re.sub(START_COLON, '', t)
                 key = None
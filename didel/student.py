@@ -1,33 +1,51 @@
 # -*- coding: UTF-8 -*-
 
 from didel.base import DidelEntity
-from didel.courses import Course, CoursesMainPage
+from didel.courses import Course, CoursesMainPage, Q_COURSES_LINKS
+from didel.parsers import Query, get_parser
 from didel.session import Session
 from didel.exceptions import DidelLoginRequired
 
+PROFILE_FIELDS = ('firstname', 'lastname', 'officialCode', 'username',
+        'email', 'phone', 'skype', 'uidToEdit')
+
+# Queries of the profile fields' inputs
+Q_PROFILE_INPUTS = dict((field, Query('input#%s' % field,
+    ".//input[@id='%s']" % field)) for field in PROFILE_FIELDS)
+
+
 class Student(DidelEntity):
     """
     A virtual student, i.e. a DidEL session
     """
 
-    def __init__(self, username, password, autofetch=True):
+    def __init__(self, username, password, autofetch=True, session=None,
+            login=True):
+        """
+        Create a new student. A new session is created if ``session`` is not
+        given; if it has saved cookies for this student they're used instead
+        of logging in again. If ``login`` is ``False`` the student is not
+        authenticated and ``logged`` must be set by the caller.
+        """
         super(Student, self).__init__()
-        self.session = Session()
+        self.session = session or Session()
         self.username = username
         self.path = '/claroline/auth/profile.php'
         self._courses = {}  # cache
-        self.logged = self.session.login(self.username, password)
+        self.logged = False
+        if login:
+            self.logged = self.session.resume(self.username, password)
         self.add_resource("courses", CoursesMainPage())
         if autofetch:
             self.fetch(self.session)
 
-    def populate(self, soup, *args, **kw):
+    def populate(self, soup, session=None, *args, **kw):
         if not self.logged:
             raise DidelLoginRequired()
+        p = get_parser(session)
         aliases = {'officialCode': 'code', 'uidToEdit': 'auth_id'}
-        for attr in ('firstname', 'lastname', 'officialCode', 'username',
-                'email', 'phone', 'skype', 'uidToEdit'):
-            value = soup.select('input#%s' % attr)[0].attrs['value']
+        for attr in PROFILE_FIELDS:
+            value = p.attr(p.select(soup, Q_PROFILE_INPUTS[attr])[0], 'value')
             attr = aliases.get(attr, attr)
             setattr(self, attr, value)
 
@@ -57,9 +75,11 @@ class StudentCoursesRefs(DidelEntity):
         self.refs = []
 
 
-    def populate(self, soup, *args, **kw):
+    def populate(self, soup, session=None, *args, **kw):
         """
         save references of courses in a list
         """
-        soup_refs = soup.select("dt a")
-        self.refs = [cours.attrs["href"].split("=")[1] for cours in soup_refs]
+        p = get_parser(session)
+        soup_refs = p.select(soup, Q_COURSES_LINKS)
+        self.refs = [p.attr(cours, "href").split("=")[1]
+                for cours in soup_refs]
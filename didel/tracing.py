@@ -0,0 +1,189 @@
+# -*- coding: UTF-8 -*-
+
+"""
+Tracing of what the client spends its time on. When a ``Tracer`` is
+enabled, the ``span`` blocks record their duration and some details (URL,
+status, size...) as events in the Chrome trace event format, which can be
+opened in ``chrome://tracing`` or https://ui.perfetto.dev. Spans cost
+almost nothing when no tracer is enabled.
+
+    with span('GET', 'http', url=url) as args:
+        resp = session.get(url)
+        args['status'] = resp.status_code
+"""
+
+from contextlib import contextmanager
+from time import time
+import json
+import os
+import sys
+import threading
+
+_tracer = None
+
+
+class Tracer(object):
+    """
+    A collection of trace events, which can be safely recorded from several
+    threads
+    """
+
+    def __init__(self):
+        self.events = []
+        self.start = time()
+        self.pid = os.getpid()
+        self._threads = {}
+        self._lock = threading.Lock()
+
+
+    def add(self, name, cat, start, end, args):
+        """
+        Record a span which started and ended at the given timestamps (in
+        seconds)
+        """
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': cat,
+            'ph': 'X',
+            'ts': int((start - self.start) * 1e6),
+            'dur': int((end - start) * 1e6),
+            'pid': self.pid,
+            'tid': thread.ident,
+            'args': args,
+        }
+        with self._lock:
+            self._threads[thread.ident] = thread.name
+            self.events.append(event)
+
+
+    def to_json(self):
+        """
+        Return the events as a JSON-serializable dict
+        """
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        meta = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid,
+                 'tid': tid, 'args': {'name': name}}
+                for tid, name in threads.items()]
+        return {'traceEvents': meta + events, 'displayTimeUnit': 'ms'}
+
+
+    def save(self, path):
+        """
+        Save the events in the file at ``path``
+        """
+        # didel.fileutils uses spans
+        from didel.fileutils import write_atomically
+        data = json.dumps(self.to_json(), default=str).encode('utf-8')
+        write_atomically(path, [data])
+
+
+    def summary(self):
+        """
+        Return a list of ``(category, count, total duration in seconds)``
+        tuples, sorted by decreasing duration
+        """
+        totals = {}
+        with self._lock:
+            for e in self.events:
+                count, dur = totals.get(e['cat'], (0, 0))
+                totals[e['cat']] = (count + 1, dur + e['dur'])
+        return sorted(((cat, count, dur / 1e6)
+                       for cat, (count, dur) in totals.items()),
+                      key=lambda t: -t[2])
+
+
+
+class ThreadsProfile(object):
+    """
+    A ``cProfile`` profile of the thread which enables it and of all the
+    threads started while it's enabled, such as the workers of a
+    ``didel.workers.WorkerPool``, whose stats are merged by ``stats``.
+    """
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+
+
+    def _start(self):
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: a profile already sees all the threads, and only
+            # one can be enabled at a time
+            return
+        with self._lock:
+            self._profiles.append(profile)
+
+
+    def _start_thread(self, frame, event, arg):
+        # called by the first event of a new thread, in this thread
+        sys.setprofile(None)
+        self._start()
+
+
+    def enable(self):
+        threading.setprofile(self._start_thread)
+        self._start()
+
+
+    def disable(self):
+        threading.setprofile(None)
+        with self._lock:
+            for profile in self._profiles:
+                profile.disable()
+
+
+    def stats(self):
+        """
+        Return the merged stats of all the threads, as a ``pstats.Stats``
+        """
+        import pstats
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+
+def enable(tracer=None):
+    """
+    Record the spans in ``tracer`` (a new one by default), and return it
+    """
+    global _tracer
+    _tracer = tracer or Tracer()
+    return _tracer
+
+
+def disable():
+    """
+    Stop recording the spans, and return the tracer which recorded them
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+@contextmanager
+def span(name, cat, **args):
+    """
+    Context manager which records the block as a span. It gives a dict of
+    arguments which can be completed in the block, e.g. with the status of a
+    response.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield args
+        return
+    start = time()
+    try:
+        yield args
+    finally:
+        tracer.add(name, cat, start, time(), args)
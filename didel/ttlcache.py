@@ -0,0 +1,61 @@
+# -*- coding: UTF-8 -*-
+
+from hashlib import sha1
+from os import chmod
+from os.path import join
+from time import time
+import json
+
+from didel.fileutils import mkdir_p, write_atomically
+
+
+class TTLCache(object):
+    """
+    An on-disk cache of JSON-serializable values, such as parsed pages, which
+    expire ``ttl`` seconds after they were stored. Unlike ``HTTPCache`` it
+    doesn't need any request to answer, and it doesn't depend on
+    ``requests``.
+
+    >>> cache = TTLCache('/tmp/didel-cache/data', 600)
+    >>> cache.set('upcoming', rows)
+    >>> cache.get('upcoming')
+    """
+
+    def __init__(self, path, ttl=600):
+        self.path = path
+        self.ttl = ttl
+        mkdir_p(path)
+        # 448 is 0700; cached values are private
+        chmod(path, 448)
+
+
+    def filename(self, key):
+        """
+        Return the file of a key
+        """
+        return join(self.path, '%s.json' % sha1(key.encode('utf-8'))
+                .hexdigest())
+
+
+    def get(self, key, default=None):
+        """
+        Return the value of a key, or ``default`` if it's missing or expired
+        """
+        try:
+            with open(self.filename(key)) as f:
+                entry = json.load(f)
+        except (IOError, ValueError):
+            return default
+        age = time() - entry.get('time', 0)
+        if entry.get('key') != key or not 0 <= age < self.ttl:
+            return default
+        return entry['value']
+
+
+    def set(self, key, value):
+        """
+        Store the value of a key
+        """
+        entry = {'key': key, 'time': time(), 'value': value}
+        write_atomically(self.filename(key),
+                [json.dumps(entry).encode('utf-8')])
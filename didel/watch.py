@@ -0,0 +1,108 @@
+# -*- coding: UTF-8 -*-
+
+"""
+Continuous synchronization. Each key (e.g. a course) is synchronized again
+after an interval which adapts to its activity: it's reset to the minimum
+when something changed, and doubled up to the maximum otherwise, so
+dormant courses are polled less and less often.
+"""
+
+from time import time
+
+from didel.workers import WorkerPool
+
+
+class AdaptiveSchedule(object):
+    """
+    Schedule of the next synchronization of each key. All keys are due at
+    first.
+
+    >>> schedule = AdaptiveSchedule(['a', 'b'], 60, 3600)
+    >>> schedule.due(time())
+    ['a', 'b']
+    >>> schedule.update('a', changed=False, now=time())
+    >>> schedule.interval('a')
+    120
+    """
+
+    def __init__(self, keys, min_interval=60, max_interval=3600, now=0):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.keys = list(keys)
+        self._intervals = dict((k, min_interval) for k in self.keys)
+        self._due = dict((k, now) for k in self.keys)
+
+
+    def interval(self, key):
+        """
+        Return the current interval of ``key``, in seconds
+        """
+        return self._intervals[key]
+
+
+    def due(self, now):
+        """
+        Return the keys which should be synchronized at ``now``
+        """
+        return [k for k in self.keys if self._due[k] <= now]
+
+
+    def next_due(self):
+        """
+        Return the time at which the next key is due, or ``None`` if there
+        are no keys
+        """
+        return min(self._due.values()) if self._due else None
+
+
+    def update(self, key, changed, now):
+        """
+        Schedule the next synchronization of ``key``, which ended at ``now``
+        and changed something or not
+        """
+        if changed:
+            interval = self.min_interval
+        else:
+            interval = min(self.max_interval, self._intervals[key] * 2)
+        self._intervals[key] = interval
+        self._due[key] = now + interval
+
+
+
+def watch(schedule, sync, stop, jobs=1, clock=time, after_round=None):
+    """
+    Call ``sync(key)`` for the due keys of ``schedule``, up to ``jobs`` in
+    parallel, until the ``stop`` event is set. ``sync`` returns a true value
+    if something changed; if it fails, the key is considered unchanged. A
+    round of synchronizations is always completed before returning, so that
+    nothing is left half done, and followed by a call to ``after_round()``,
+    e.g. to save the state of the synchronizations.
+    """
+    while not stop.is_set():
+        now = clock()
+        due = schedule.due(now)
+        if not due:
+            next_due = schedule.next_due()
+            if next_due is None:
+                return
+            stop.wait(next_due - now)
+            continue
+
+        changes = {}
+
+        def run(key):
+            changes[key] = sync(key)
+
+        pool = WorkerPool(jobs)
+        for key in due:
+            pool.submit(run, key)
+        try:
+            pool.join()
+        except Exception:
+            # each failure is ignored, they're not worth stopping the watch
+            pass
+        if after_round is not None:
+            after_round()
+        now = clock()
+        for key in due:
+            schedule.update(key, changes.get(key), now)
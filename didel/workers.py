@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+
+try:
+    from Queue import Queue
+except ImportError:  # Python 3
+    from queue import Queue
+
+from collections import deque
+import threading
+
+
+class WorkerPool(object):
+    """
+    A bounded pool of worker threads. Tasks are plain callables given to
+    ``submit``, and they can themselves submit other tasks to the same pool,
+    which makes it usable for recursive crawls.
+
+    ``join`` waits until all tasks are done and re-raises the first exception
+    raised by one of them, if any.
+
+    >>> pool = WorkerPool(4)
+    >>> pool.submit(fetch_something, arg1, arg2)
+    >>> pool.join()
+    """
+
+    def __init__(self, size=1):
+        self.size = max(1, int(size))
+        self._tasks = Queue()
+        self._threads = []
+        self._errors = []
+        self._lock = threading.Lock()
+
+
+    def submit(self, fun, *args, **kwargs):
+        """
+        Schedule ``fun(*args, **kwargs)`` to be called by one of the workers.
+        """
+        self._tasks.put((fun, args, kwargs))
+        with self._lock:
+            if len(self._threads) < self.size:
+                t = threading.Thread(target=self._work)
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                self._tasks.task_done()
+                return
+            fun, args, kwargs = task
+            try:
+                fun(*args, **kwargs)
+            except Exception as e:
+                self._errors.append(e)
+            finally:
+                self._tasks.task_done()
+
+
+    def join(self):
+        """
+        Wait for all submitted tasks to complete, then stop the workers.
+        """
+        self._tasks.join()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._tasks.put(None)
+        for t in threads:
+            t.join()
+        errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+
+def prefetch(items, fun, window=8):
+    """
+    Yield the given items in order, each one after ``fun`` was called on it.
+    ``fun`` is called on up to ``window`` items in parallel ahead of the
+    consumer, and its exceptions are raised when the item is reached: ::
+
+        for page in prefetch(pages, lambda p: p.fetch(session)):
+            print(page.title)
+    """
+    pool = WorkerPool(window)
+    pending = deque()
+
+    def call(item, task):
+        try:
+            fun(item)
+        except Exception as e:
+            task.append(e)
+        finally:
+            task[0].set()
+
+    items = iter(items)
+    try:
+        while True:
+            while len(pending) < pool.size:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                task = [threading.Event()]
+                pending.append((item, task))
+                pool.submit(call, item, task)
+            if not pending:
+                return
+            item, task = pending.popleft()
+            task[0].wait()
+            if len(task) > 1:
+                raise task[1]
+            yield item
+    finally:
+        pool.join()
@@ -0,0 +1,189 @@
+# -*- coding: UTF-8 -*-
+
+"""
+Benchmarks of ``didel pull`` against a local fake DidEL. Usage: ::
+
+    python tests/benchmark.py [small|medium|large|big ...] [--latency SECONDS]
+                              [--bandwidth BYTES] [--runs N] [-- PULL-ARGS]
+
+Each preset is pulled in a fresh process, first in an empty directory
+("cold") then again in the same one ("warm"). The report gives the wall time,
+the number of requests per second, the downloaded megabytes per second and
+the peak RSS of the pulling process. Arguments after ``--`` are given to
+``didel pull``, e.g. ``-- --jobs 8 --concurrency 8``.
+
+``--bandwidth`` limits the speed of each connection, which shows the effect
+of segmented downloads on large files: ::
+
+    python tests/benchmark.py big --bandwidth 4000000 -- --segments 1
+    python tests/benchmark.py big --bandwidth 4000000 -- --segments 4
+"""
+
+from __future__ import print_function
+
+import multiprocessing
+import shutil
+import sys
+from os.path import abspath, dirname, join
+from tempfile import mkdtemp
+from time import time
+
+here = dirname(abspath(__file__))
+sys.path.insert(0, here)
+sys.path.insert(0, dirname(here))
+
+from fakedidel import FakeDidel, make_courses
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# name -> arguments of ``make_courses``
+PRESETS = {
+    'small': dict(count=2, depth=1, folders=2, files=5, file_size=16 * 1024),
+    'medium': dict(count=5, depth=2, folders=3, files=10,
+        file_size=64 * 1024),
+    'large': dict(count=10, depth=3, folders=3, files=10,
+        file_size=256 * 1024),
+    # a few large files, e.g. lecture recordings
+    'big': dict(count=1, depth=0, files=4, file_size=32 * 1024 * 1024),
+}
+
+
+def peak_rss():
+    """
+    Return the peak RSS of the current process in megabytes
+    """
+    if resource is None:
+        return float('nan')
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # it's in bytes on OS X and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return rss / (1024.0 * 1024)
+    return rss / 1024.0
+
+
+def pull(tmp, dest, pull_args, results):
+    """
+    Run ``didel pull`` in a child process and put its wall time, result and
+    peak RSS in the ``results`` queue. ``None`` is put there if it crashes.
+    """
+    from didel.cli import DidelCli
+    from didel.config import DidelConfig
+
+    DidelConfig._default = DidelConfig(join(tmp, 'didel.conf'))
+    argv = ['didel', '--no-cache', 'pull', dest] + pull_args
+    try:
+        with open(join(tmp, 'pull.log'), 'w') as log:
+            stdout, sys.stdout = sys.stdout, log
+            try:
+                start = time()
+                ret = DidelCli(argv).run()
+                elapsed = time() - start
+            finally:
+                sys.stdout = stdout
+    except Exception:
+        results.put(None)
+        raise
+    results.put((elapsed, ret != False, peak_rss()))
+
+
+def run_pull(server, tmp, dest, pull_args):
+    server.reset_stats()
+    results = multiprocessing.Queue()
+    p = multiprocessing.Process(target=pull,
+            args=(tmp, dest, pull_args, results))
+    p.start()
+    result = results.get()
+    p.join()
+    if result is None:
+        raise RuntimeError('didel pull crashed')
+    elapsed, ok, rss = result
+    stats = dict(server.stats)
+    return {
+        'ok': ok,
+        'time': elapsed,
+        'requests': stats['requests'],
+        'listings': stats['listings'],
+        'downloads': stats['downloads'],
+        'req/s': stats['requests'] / elapsed,
+        'MB/s': stats['bytes'] / elapsed / (1024 * 1024),
+        'rss': rss,
+    }
+
+
+def benchmark(name, latency=0, bandwidth=None, pull_args=()):
+    """
+    Benchmark a preset and return a list of ``(label, results)`` tuples
+    """
+    from didel.config import DidelConfig
+    from fakedidel import USERNAME, PASSWORD
+
+    server = FakeDidel(make_courses(**PRESETS[name]), latency=latency,
+            bandwidth=bandwidth).start()
+    tmp = mkdtemp()
+    try:
+        config = DidelConfig(join(tmp, 'didel.conf'))
+        config.set_secret('username', USERNAME, False)
+        config.set_secret('password', PASSWORD, False)
+        config.set('session.root_url', server.url, False)
+        config.set('session.login_url', server.login_url)
+        config.save()
+
+        dest = join(tmp, 'courses')
+        pull_args = list(pull_args)
+        return [
+            ('cold', run_pull(server, tmp, dest, pull_args)),
+            ('warm', run_pull(server, tmp, dest, pull_args)),
+        ]
+    finally:
+        server.stop()
+        shutil.rmtree(tmp)
+
+
+def print_report(rows):
+    fmt = '%-8s %-5s %8s %9s %9s %9s %9s %9s %9s'
+    print(fmt % ('preset', 'run', 'time (s)', 'requests', 'listings',
+        'downloads', 'req/s', 'MB/s', 'RSS (MB)'))
+    for name, label, r in rows:
+        print(fmt % (name, label, '%.2f' % r['time'], r['requests'],
+            r['listings'], r['downloads'], '%.1f' % r['req/s'], '%.2f' % r['MB/s'],
+            '%.1f' % r['rss']) + ('' if r['ok'] else '  FAILED'))
+
+
+def main(argv):
+    pull_args = []
+    if '--' in argv:
+        i = argv.index('--')
+        argv, pull_args = argv[:i], argv[i + 1:]
+
+    latency, bandwidth, runs = 0, None, 1
+    names = []
+    while argv:
+        arg = argv.pop(0)
+        if arg == '--latency':
+            latency = float(argv.pop(0))
+        elif arg == '--bandwidth':
+            bandwidth = int(argv.pop(0))
+        elif arg == '--runs':
+            runs = int(argv.pop(0))
+        elif arg in PRESETS:
+            names.append(arg)
+        else:
+            print(__doc__.strip())
+            return 1
+
+    rows = []
+    for name in names or ['small', 'medium']:
+        for _ in range(runs):
+            for label, results in benchmark(name, latency, bandwidth,
+                    pull_args):
+                rows.append((name, label, results))
+    print_report(rows)
+    return 0 if all(r['ok'] for _, _, r in rows) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,621 @@
+# -*- coding: UTF-8 -*-
+
+"""
+A local stand-in for DidEL and its CAS login page, used by the end-to-end
+tests and the benchmarks. It serves synthetic courses generated with
+``make_courses``: ::
+
+    server = FakeDidel(make_courses(3, depth=2, files=10))
+    server.start()
+    session = Session(root_url=server.url, login_url=server.login_url)
+    ...
+    server.stop()
+"""
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+    from urllib import quote
+    from cgi import escape
+except ImportError:  # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs, quote
+    from html import escape
+
+from collections import OrderedDict
+from hashlib import sha1
+from time import sleep
+from uuid import uuid4
+import threading
+import zlib
+
+from helpers import documents_page
+
+USERNAME = 'student'
+PASSWORD = 'secret'
+
+SESSION_COOKIE = 'FAKESESSID'
+
+# size of the pattern file contents are made of
+PATTERN_SIZE = 251
+
+
+class FakeFile(object):
+
+    def __init__(self, name, size, date='01.02.2015'):
+        self.name = name
+        self.size = size
+        self.date = date
+        self.version = 0
+
+
+    def etag(self, path):
+        return '"%s"' % sha1(('%s:%d:%d' % (path, self.version, self.size))
+                .encode('utf-8')).hexdigest()
+
+
+    def chunks(self, path, start=0, end=None, chunk_size=64 * 1024):
+        """
+        Yield the content of the file between ``start`` and ``end``
+        (excluded). It's generated on the fly from a pattern which depends on
+        the path and version of the file.
+        """
+        if end is None:
+            end = self.size
+        seed = int(self.etag(path)[1:9], 16)
+        pattern = bytearray((seed + i) % 256 for i in range(PATTERN_SIZE))
+        pattern = bytes(pattern * (chunk_size // PATTERN_SIZE + 2))
+        offset = start
+        while offset < end:
+            length = min(chunk_size, end - offset)
+            i = offset % PATTERN_SIZE
+            yield pattern[i:i + length]
+            offset += length
+
+
+    def content(self, path):
+        return b''.join(self.chunks(path))
+
+
+
+class FakeFolder(object):
+
+    def __init__(self, name, date='01.02.2015'):
+        self.name = name
+        self.date = date
+        self.children = OrderedDict()
+
+
+    def add(self, node):
+        self.children[node.name] = node
+        return node
+
+
+    def walk(self, prefix=''):
+        """
+        Yield ``(path, FakeFile)`` tuples for all files in this folder and its
+        subfolders
+        """
+        for name, node in self.children.items():
+            path = '%s/%s' % (prefix, name)
+            if isinstance(node, FakeFolder):
+                for item in node.walk(path):
+                    yield item
+            else:
+                yield path, node
+
+
+
+class FakeCourse(object):
+
+    def __init__(self, ref, title=None, teacher='Jeanne Dupont',
+            assignments=2):
+        self.ref = ref
+        self.title = title or 'Course %s' % ref
+        self.teacher = teacher
+        self.documents = FakeFolder('')
+        self.assignments = [{
+            'title': 'TP %d' % (i + 1),
+            'begin': '01/02/2015',
+            'end': '%02d/03/2015' % (i + 1),
+        } for i in range(assignments)]
+        self.submissions = []
+
+
+
+def make_folder(folder, depth, folders, files, file_size):
+    for i in range(files):
+        folder.add(FakeFile('document %d.pdf' % i, file_size))
+    if depth > 0:
+        for i in range(folders):
+            sub = folder.add(FakeFolder('folder %d' % i))
+            make_folder(sub, depth - 1, folders, files, file_size)
+    return folder
+
+
+def make_courses(count, depth=1, folders=2, files=3, file_size=1024,
+        assignments=2):
+    """
+    Generate ``count`` synthetic courses. The documents of each course are a
+    tree of ``depth`` levels of ``folders`` folders with ``files`` files of
+    ``file_size`` bytes in each one of them.
+    """
+    courses = OrderedDict()
+    for i in range(count):
+        course = FakeCourse('COURSE%d' % i, assignments=assignments)
+        make_folder(course.documents, depth, folders, files, file_size)
+        courses[course.ref] = course
+    return courses
+
+
+def parse_multipart(content_type, body):
+    """
+    Return a ``dict`` of the fields of a ``multipart/form-data`` body. Files
+    are given as ``(filename, content)`` tuples.
+    """
+    # Python 3 only
+    from email.parser import BytesParser
+    from email.policy import HTTP
+
+    msg = BytesParser(policy=HTTP).parsebytes(b'Content-Type: '
+            + content_type.encode('ascii') + b'\r\n\r\n' + body)
+    fields = {}
+    for part in msg.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        content = part.get_payload(decode=True)
+        filename = part.get_filename()
+        if filename is None:
+            fields[name] = content.decode('utf-8')
+        else:
+            fields[name] = (filename, content)
+    return fields
+
+
+def human_size(size):
+    return '%d Ko' % max(1, size // 1024)
+
+
+
+class FakeDidelHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+
+    @property
+    def didel(self):
+        return self.server.didel
+
+
+    def do_HEAD(self):
+        self.handle_request('HEAD')
+
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+
+    def handle_request(self, method):
+        # a request is active until its response starts: once the client
+        # has read the response it can make another request before this
+        # handler returns
+        self.didel.count_request(1)
+        try:
+            if self.didel.latency:
+                sleep(self.didel.latency)
+        finally:
+            self.didel.count_request(-1)
+        self.route_request(method)
+
+
+    def route_request(self, method):
+
+        url = urlparse(self.path)
+        self.query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        self.form = {}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length)
+            if method == 'POST' and b'multipart/form-data' not in \
+                    self.headers.get('Content-Type', '').encode('ascii'):
+                self.form = dict((k, v[0]) for k, v in
+                        parse_qs(body.decode('utf-8')).items())
+            else:
+                self.form = {'_raw': body}
+        self.method = method
+
+        if self.didel.take_error():
+            return self.send_body('Overloaded', 503)
+        if url.path == '/cas/login':
+            return self.login()
+        if not self.is_logged():
+            return self.redirect('/cas/login?service=%s' % quote(self.path))
+
+        routes = {
+            '/': self.main_page,
+            '/claroline/auth/profile.php': self.profile,
+            '/claroline/course/index.php': self.course_page,
+            '/claroline/work/work.php': self.assignments_page,
+            '/claroline/work/user_work.php': self.assignment_page,
+            '/claroline/document/document.php': self.documents_page,
+            '/claroline/backends/download.php': self.download,
+        }
+        route = routes.get(url.path)
+        if route is None:
+            return self.send_html('Not Found', 404)
+        return route()
+
+
+    def is_logged(self):
+        cookies = self.headers.get('Cookie') or ''
+        for cookie in cookies.split(';'):
+            name, _, value = cookie.strip().partition('=')
+            if name == SESSION_COOKIE and value in self.didel.sessions:
+                return True
+        return False
+
+
+    def course(self, key='cidReq'):
+        return self.didel.courses.get(self.query.get(key))
+
+
+    # responses
+
+    def send_body(self, body, status=200, headers=None):
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.method != 'HEAD':
+            self.wfile.write(body)
+            self.didel.count_bytes(len(body))
+
+
+    def send_html(self, html, status=200, headers=None):
+        headers = dict(headers or {})
+        headers['Content-Type'] = 'text/html; charset=utf-8'
+        page = '<html><body>%s</body></html>' % html
+        self.send_body(page, status, headers)
+
+
+    def redirect(self, location):
+        self.send_body('', 302, {'Location': location})
+
+
+    # pages
+
+    def login(self):
+        if self.method == 'GET':
+            return self.send_html('<form method="post">'
+                    '<input name="username"/><input name="password"/>'
+                    '<input type="hidden" name="lt" value="LT-42"/></form>')
+        if self.form.get('lt') != 'LT-42' or \
+                (self.form.get('username'), self.form.get('password')) != \
+                (self.didel.username, self.didel.password):
+            return self.send_html('Wrong credentials')
+        token = self.didel.new_session()
+        self.send_html('<a href="/logout">Quitter</a>', headers={
+            'Set-Cookie': '%s=%s; Path=/' % (SESSION_COOKIE, token)})
+
+
+    def main_page(self):
+        self.send_html('<dl>%s</dl>' % ''.join(
+            '<dt><a href="/claroline/course/index.php?cid=%s">%s</a></dt>'
+            % (c.ref, c.title) for c in self.didel.courses.values()))
+
+
+    def profile(self):
+        fields = {
+            'firstname': 'Jeanne',
+            'lastname': 'Dupont',
+            'officialCode': '21500042',
+            'username': self.didel.username,
+            'email': 'jeanne@example.com',
+            'phone': '',
+            'skype': '',
+            'uidToEdit': '4242',
+        }
+        self.send_html(''.join('<input id="%s" value="%s"/>' % kv
+            for kv in fields.items()))
+
+
+    def course_page(self):
+        course = self.course('cid')
+        if course is None:
+            return self.send_html('No such course', 404)
+        self.send_html('<div class="courseInfos"><h2><a>%s</a></h2>'
+                '<p>Enseignant :\n%s</p></div>'
+                '<div id="portletAbout">About %s</div>'
+                % (course.title, course.teacher, course.ref))
+
+
+    def assignments_page(self):
+        course = self.course()
+        if course is None:
+            return self.send_html('No such course', 404)
+        rows = ''.join('<tr><td><a href="user_work.php?assigId=%d'
+                '&amp;cidReq=%s">%s</a></td></tr>' % (i + 1, course.ref,
+                    a['title']) for i, a in enumerate(course.assignments))
+        self.send_html('<div id="courseRightContent"><table><tbody>%s'
+                '</tbody></table></div>' % rows)
+
+
+    def assignment_page(self):
+        course = self.course()
+        try:
+            assignment = course.assignments[int(self.query['assigId']) - 1]
+        except (AttributeError, KeyError, ValueError, IndexError):
+            return self.send_html('No such assignment', 404)
+        if self.method == 'POST':
+            course.submissions.append((self.query['assigId'],
+                parse_multipart(self.headers.get('Content-Type'),
+                    self.form.get('_raw', b''))))
+        submitted = ''.join('<li>%s</li>' % escape(s[1].get('wrkTitle'))
+                for s in course.submissions if s[0] == self.query['assigId'])
+        self.send_html('<div id="courseRightContent"><p><small>'
+                '<b>Titre</b> : %s<br/><b>Du</b> %s <b>au</b> %s<br/>'
+                '<b>Type de soumission</b> : Fichier</small></p>'
+                '<ul>%s</ul></div>' % (assignment['title'],
+                    assignment['begin'], assignment['end'], submitted))
+
+
+    def documents_page(self):
+        course = self.course()
+        if course is None:
+            return self.send_html('No such course', 404)
+        path = self.query.get('file', '')
+        folder = self.didel.find(course, path)
+        if not isinstance(folder, FakeFolder):
+            return self.send_html('No such folder', 404)
+        self.didel.count_listing()
+        rows = []
+        for name, node in folder.children.items():
+            node_path = quote('%s/%s' % (path, name))
+            if isinstance(node, FakeFolder):
+                url = '/claroline/document/document.php?cidReq=%s' \
+                      '&amp;cmd=exChDir&amp;file=%s' % (course.ref, node_path)
+                rows.append((name, url, node.date, True, ''))
+            else:
+                url = '/claroline/backends/download.php?cidReq=%s' \
+                      '&amp;url=%s' % (course.ref, node_path)
+                rows.append((name, url, node.date, False,
+                    human_size(node.size)))
+        self.send_html(documents_page(rows))
+
+
+    def download(self):
+        course = self.course()
+        path = self.query.get('url', '')
+        f = self.didel.find(course, path) if course else None
+        if not isinstance(f, FakeFile):
+            return self.send_html('No such file', 404)
+
+        etag = f.etag('%s%s' % (course.ref, path))
+        headers = {
+            'Content-Type': 'application/octet-stream',
+            'ETag': etag,
+            'Last-Modified': 'Sun, 01 Feb 2015 12:00:%02d GMT' % (
+                f.version % 60),
+        }
+        size = f.size
+        body = None
+        if self.didel.gzip and 'gzip' in self.headers.get('Accept-Encoding',
+                ''):
+            # ranges apply to the compressed body
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            body = compressor.compress(f.content('%s%s' % (course.ref,
+                path))) + compressor.flush()
+            size = len(body)
+            headers['Content-Encoding'] = 'gzip'
+        start, end = 0, size
+        status = 200
+        ranges = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if ranges and self.didel.ranges and ranges.startswith('bytes=') \
+                and (not if_range or if_range in (etag,
+                    headers['Last-Modified'])):
+            first, _, last = ranges[6:].partition('-')
+            start = int(first or 0)
+            end = int(last) + 1 if last else size
+            end = min(end, size)
+            if start >= size:
+                return self.send_body('', 416, {
+                    'Content-Range': 'bytes */%d' % size})
+            status = 206
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end - 1,
+                    size)
+        if self.didel.ranges:
+            headers['Accept-Ranges'] = 'bytes'
+
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(end - start))
+        self.end_headers()
+        if self.method == 'HEAD':
+            return
+        self.didel.count_download()
+        bandwidth = self.didel.bandwidth
+        drop_after = self.didel.drop_after
+        sent = 0
+        if body is None:
+            chunks = f.chunks('%s%s' % (course.ref, path), start, end,
+                    chunk_size=16 * 1024)
+        else:
+            chunks = [body[i:min(i + 1024, end)]
+                      for i in range(start, end, 1024)]
+        for chunk in chunks:
+            if drop_after is not None and sent + len(chunk) > drop_after:
+                # simulate a connection lost in the middle of the body
+                self.wfile.write(chunk[:drop_after - sent])
+                self.close_connection = True
+                return
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            self.didel.count_bytes(len(chunk))
+            if bandwidth:
+                sleep(float(len(chunk)) / bandwidth)
+
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+
+class FakeDidel(object):
+    """
+    A fake DidEL server. ``latency`` is a delay in seconds added to each
+    request, and ``bandwidth`` limits the speed of each download in bytes per
+    second. ``ranges`` can be set to ``False`` to ignore ``Range`` headers,
+    and ``gzip`` to ``True`` to compress the downloads.
+    If ``drop_after`` is set, the connection of each download is closed after
+    this number of bytes of the body. The next ``errors`` requests fail with
+    a ``503 Service Unavailable``.
+    """
+
+    def __init__(self, courses, latency=0, bandwidth=None, ranges=True,
+            gzip=False, username=USERNAME, password=PASSWORD):
+        self.courses = courses
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.ranges = ranges
+        self.gzip = gzip
+        self.drop_after = None
+        self.errors = 0
+        self.username = username
+        self.password = password
+        self.sessions = set()
+        self._lock = threading.Lock()
+        self.active = 0
+        self.reset_stats()
+        self._server = None
+
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+
+    @property
+    def login_url(self):
+        return '%s/cas/login' % self.url
+
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), FakeDidelHandler)
+        self._server.didel = self
+        t = threading.Thread(target=self._server.serve_forever)
+        t.daemon = True
+        t.start()
+        return self
+
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+    def new_session(self):
+        token = uuid4().hex
+        with self._lock:
+            self.sessions.add(token)
+        return token
+
+
+    def expire_sessions(self):
+        """
+        Log everybody out
+        """
+        with self._lock:
+            self.sessions = set()
+
+
+    # stats
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'requests': 0, 'listings': 0, 'downloads': 0,
+                    'bytes': 0, 'max_active': 0}
+
+
+    def take_error(self):
+        """
+        Return ``True`` if the current request must fail
+        """
+        with self._lock:
+            if self.errors > 0:
+                self.errors -= 1
+                return True
+        return False
+
+
+    def count_request(self, delta):
+        """
+        Count a request which starts (``delta=1``) or ends (``delta=-1``),
+        and the maximum number of requests active at the same time
+        """
+        with self._lock:
+            self.active += delta
+            if delta > 0:
+                self.stats['requests'] += 1
+                self.stats['max_active'] = max(self.stats['max_active'],
+                        self.active)
+
+
+    def count_listing(self):
+        with self._lock:
+            self.stats['listings'] += 1
+
+
+    def count_download(self):
+        with self._lock:
+            self.stats['downloads'] += 1
+
+
+    def count_bytes(self, n):
+        with self._lock:
+            self.stats['bytes'] += n
+
+
+    # documents
+
+    def find(self, course, path):
+        """
+        Return the node at ``path`` in a course's documents, or ``None``
+        """
+        node = course.documents
+        for name in [p for p in path.split('/') if p]:
+            if not isinstance(node, FakeFolder) or name not in node.children:
+                return None
+            node = node.children[name]
+        return node
+
+
+    def update_file(self, ref, path, size=None, date=None):
+        """
+        Change a file's content, and optionally its size and date. A new date
+        is also given to the folders which contain the file.
+        """
+        course = self.courses[ref]
+        f = self.find(course, path)
+        f.version += 1
+        if size is not None:
+            f.size = size
+        if date is not None:
+            f.date = date
+            parts = [p for p in path.split('/') if p][:-1]
+            for i in range(len(parts)):
+                self.find(course, '/'.join(parts[:i + 1])).date = date
+        return f
@@ -9,3 +9,21 @@ if platform.python_version() < '3.0':
 else:
     import imp
     reload = imp.reload
+
+
+def documents_page(rows):
+    """
+    Return the HTML of a course documents page listing the given rows. Each
+    row is a tuple of ``(name, url, date, is_folder)`` or ``(name, url, date,
+    is_folder, size)``.
+    """
+    tr_fmt = '<tr align="center"><td><a href="%s"><span class="item">' \
+             '<img src="/web/img/%s.png"/> %s</span></a></td>' \
+             '<td>%s</td><td><small>%s</small></td></tr>'
+    trs = []
+    for row in rows:
+        name, url, date, folder = row[:4]
+        size = row[4] if len(row) > 4 else '1 Ko'
+        trs.append(tr_fmt % (url, 'folder' if folder else 'pdf', name, size,
+            date))
+    return '<table class="claroTable"><tbody>%s</tbody></table>' % ''.join(trs)
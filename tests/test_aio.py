@@ -0,0 +1,125 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import sys
+
+import responses
+
+from didel.base import ROOT_URL
+from didel.courses import Course, CourseDocuments
+
+from helpers import documents_page
+from test_courses import tree
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from didel.aio import AsyncSession, agather
+    from didel.session import Session
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def course_page(title):
+    return '<div class="courseInfos"><h2><a>%s</a></h2>' \
+           '<p>Prof\nJohn Doe</p></div>' % title
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio requires Python 3.5+")
+class TestAsyncSession(unittest.TestCase):
+
+    def setUp(self):
+        self.session = AsyncSession(4)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_get_url(self):
+        self.assertEquals(Session().get_url('/foo'),
+                self.session.get_url('/foo'))
+
+    @responses.activate
+    def test_afetch(self):
+        c = Course('C1')
+        responses.add(responses.GET, c.url(), body=course_page('Foo'),
+                status=200, match_querystring=True)
+        self.assertTrue(run(c.afetch(self.session)))
+        self.assertEquals('Foo', c.title)
+        self.assertEquals('John Doe', c.teacher)
+        # the blocking session is kept for the synchronous API
+        self.assertEquals(self.session.session, c.session)
+        # already populated
+        self.assertFalse(run(c.afetch(self.session)))
+
+    @responses.activate
+    def test_agather(self):
+        courses = [Course('C%d' % i) for i in range(10)]
+        for c in courses:
+            responses.add(responses.GET, c.url(), body=course_page(c.ref),
+                    status=200, match_querystring=True)
+        results = run(agather(self.session, courses))
+        self.assertEquals([True] * 10, results)
+        self.assertEquals([c.ref for c in courses],
+                [c.title for c in courses])
+
+    @responses.activate
+    def test_acrawl(self):
+        ref = 'XYZ'
+        root = CourseDocuments.URL_FMT.format(ref=ref)
+        responses.add(responses.GET, ROOT_URL + root, status=200,
+                match_querystring=True, body=documents_page([
+                    ('a.pdf', '/a.pdf', '01.01.2015', False),
+                    ('sub', '/sub', '01.01.2015', True)]))
+        responses.add(responses.GET, ROOT_URL + '/sub', status=200,
+                match_querystring=True, body=documents_page([
+                    ('b.pdf', '/b.pdf', '02.01.2015', False)]))
+        d = CourseDocuments(ref)
+        run(d.acrawl(self.session))
+        self.assertEquals({'a.pdf': ('/a.pdf', '01.01.2015'),
+            'sub': {'b.pdf': ('/b.pdf', '02.01.2015')}}, tree(d))
+
+    def test_shared_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        import threading
+        import time
+
+        executor = ThreadPoolExecutor(4)
+        sessions = [AsyncSession(1, executor=executor) for _ in range(3)]
+        active = {}
+        threads = set()
+        lock = threading.Lock()
+
+        def work(i):
+            with lock:
+                active[i] = active.get(i, 0) + 1
+                self.assertEquals(1, active[i])
+                threads.add(threading.current_thread())
+            time.sleep(0.01)
+            with lock:
+                active[i] -= 1
+            return i
+
+        async def main():
+            return await asyncio.gather(*[s.run(work, i)
+                for i, s in enumerate(sessions) for _ in range(5)])
+
+        try:
+            self.assertEquals([0] * 5 + [1] * 5 + [2] * 5, run(main()))
+            self.assertTrue(len(threads) <= 4)
+            for s in sessions:
+                s.close()
+            # the executor is still usable
+            self.assertEquals(42, executor.submit(lambda: 42).result())
+        finally:
+            executor.shutdown()
@@ -0,0 +1,149 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import shutil
+import sys
+from os.path import isfile, join
+from tempfile import mkdtemp
+
+try:
+    from StringIO import StringIO
+except ImportError:  # Python 3
+    from io import StringIO
+
+from didel.batch import read_accounts, read_submissions
+from didel.cli import DidelCli
+from didel.config import DidelConfig
+
+from fakedidel import FakeDidel, make_courses, USERNAME, PASSWORD
+from test_pull import make_config
+
+
+class TestReadAccounts(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.filename = join(self.tmp, 'accounts.conf')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, text):
+        with open(self.filename, 'w') as f:
+            f.write(text)
+
+    def test_read_accounts(self):
+        self.write('[alice]\nusername = a\npassword = x\npath = alice\n'
+                   '[bob]\nusername = b\npassword = y\npath = /srv/bob\n')
+        accounts = read_accounts(self.filename)
+        self.assertEquals(['alice', 'bob'], [a['name'] for a in accounts])
+        self.assertEquals(('a', 'x', join(self.tmp, 'alice')),
+                (accounts[0]['username'], accounts[0]['password'],
+                 accounts[0]['path']))
+        self.assertEquals('/srv/bob', accounts[1]['path'])
+
+    def test_values_are_not_interpolated(self):
+        self.write('[alice]\nusername = a\npassword = 50%off\npath = alice\n')
+        accounts = read_accounts(self.filename)
+        self.assertEquals('50%off', accounts[0]['password'])
+
+    def test_invalid_file(self):
+        self.write('username = a\n')
+        self.assertRaises(ValueError, lambda: read_accounts(self.filename))
+
+    def test_missing_key(self):
+        self.write('[alice]\nusername = a\npath = alice\n')
+        self.assertRaises(ValueError, lambda: read_accounts(self.filename))
+
+    def test_read_submissions(self):
+        self.write('course,index,title,file\n'
+                   '# a comment\n'
+                   '\n'
+                   'PF2, 1, "TP 1, final",tp1.tar.gz\n'
+                   'PF2,2,TP 2,/srv/tp2.tar.gz\n')
+        rows = read_submissions(self.filename)
+        self.assertEquals([(4, 'PF2', 1, 'TP 1, final',
+                            join(self.tmp, 'tp1.tar.gz')),
+                           (5, 'PF2', 2, 'TP 2', '/srv/tp2.tar.gz')],
+                [(r['line'], r['course'], r['index'], r['title'], r['file'])
+                 for r in rows])
+
+    def test_invalid_submission(self):
+        self.write('PF2,first,TP 1,tp1.tar.gz\n')
+        self.assertRaises(ValueError,
+                lambda: read_submissions(self.filename))
+
+
+class TestBatchPull(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.server = FakeDidel(make_courses(2, depth=1, folders=2, files=2,
+            file_size=3000), latency=0.01).start()
+        DidelConfig._default = make_config(self.tmp, self.server)
+        self.accounts = join(self.tmp, 'accounts.conf')
+
+    def tearDown(self):
+        DidelConfig._default = None
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def write_accounts(self, accounts):
+        with open(self.accounts, 'w') as f:
+            for name, password in accounts:
+                f.write('[%s]\nusername = %s\npassword = %s\npath = %s\n'
+                        % (name, USERNAME, password, name))
+
+    def batch_pull(self, *args):
+        argv = ['didel', '--no-cache', 'batch-pull', self.accounts] + \
+                list(args)
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            return DidelCli(argv).run()
+        finally:
+            sys.stdout, self.output = stdout, sys.stdout.getvalue()
+
+    def test_batch_pull(self):
+        names = ['a%d' % i for i in range(3)]
+        self.write_accounts([(name, PASSWORD) for name in names])
+        self.assertNotEquals(False, self.batch_pull('--processes', '3',
+            '--max-connections', '2'))
+        files = 2 * (2 + 2 * 2)
+        self.assertEquals(3 * files, self.server.stats['downloads'])
+        self.assertTrue(self.server.stats['max_active'] <= 2, self.server.stats)
+        for name in names:
+            self.assertTrue(isfile(join(self.tmp, name,
+                'COURSE0/folder 1/document 1.pdf')))
+            self.assertTrue('== %s: ok, %d file(s)' % (name, files)
+                    in self.output, self.output)
+            # the credentials are not saved
+            with open(join(self.tmp, name, '.didel.conf')) as f:
+                self.assertEquals('', f.read())
+        self.assertTrue('Pulled 3 account(s)' in self.output, self.output)
+
+    def test_credentials_are_not_saved_with_a_legacy_config(self):
+        DidelConfig._default.set('Courses.path', join(self.tmp, 'mine'))
+        self.write_accounts([('a0', PASSWORD)])
+        self.assertNotEquals(False, self.batch_pull())
+        config = DidelConfig(join(self.tmp, 'a0', '.didel.conf'))
+        self.assertFalse(config.config.has_section(config.SECRET_SECTION))
+
+    def test_percent_signs(self):
+        self.server.password = '50%off'
+        DidelConfig._default.set('courses.note', '100%%')
+        self.write_accounts([('a0', '50%off')])
+        self.assertNotEquals(False, self.batch_pull())
+        self.assertTrue('== a0: ok' in self.output, self.output)
+
+    def test_failed_account(self):
+        self.write_accounts([('good', PASSWORD), ('bad', 'nope')])
+        self.assertEquals(False, self.batch_pull())
+        self.assertTrue('== bad: failed' in self.output, self.output)
+        self.assertTrue('== good: ok' in self.output, self.output)
+        self.assertTrue('Failed accounts: bad' in self.output, self.output)
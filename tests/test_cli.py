@@ -7,6 +7,13 @@ if platform.python_version() < '2.7':
 else:
     import unittest
 
+import sys
+
+try:
+    from StringIO import StringIO
+except ImportError:  # Python 3
+    from io import StringIO
+
 from didel.cli import DidelCli
 
 class TestCli(unittest.TestCase):
@@ -14,3 +21,83 @@ class TestCli(unittest.TestCase):
     def test_init_with_exe_as_first_arg(self):
         c = DidelCli(["foo"])
         self.assertEquals("foo", c.exe)
+
+    # .parse_options
+
+    def test_parse_options_without_options(self):
+        c = DidelCli(["foo"])
+        self.assertEquals((['a', 'b'], {}),
+                c.parse_options(['a', 'b'], {'x': None}))
+
+    def test_parse_options_with_value(self):
+        c = DidelCli(["foo"])
+        opts = {'some_opt': None}
+        self.assertEquals((['a'], {'some_opt': '3'}),
+                c.parse_options(['a', '--some-opt', '3'], opts))
+        self.assertEquals((['a'], {'some_opt': '3'}),
+                c.parse_options(['--some-opt=3', 'a'], opts))
+
+    def test_parse_options_flag(self):
+        c = DidelCli(["foo"])
+        self.assertEquals((['a'], {'flag': True}),
+                c.parse_options(['--flag', 'a'], {'flag': False}))
+
+    def test_parse_options_double_dash(self):
+        c = DidelCli(["foo"])
+        self.assertEquals((['--flag'], {}),
+                c.parse_options(['--', '--flag'], {'flag': False}))
+
+    def test_parse_options_unknown_option(self):
+        c = DidelCli(["foo"])
+        self.assertEquals(None, c.parse_options(['--x'], {'y': None}))
+
+    def test_parse_options_missing_value(self):
+        c = DidelCli(["foo"])
+        self.assertEquals(None, c.parse_options(['--x'], {'x': None}))
+
+    def test_parse_options_argument_given_twice(self):
+        c = DidelCli(["foo"])
+        names = ['path', 'jobs']
+        self.assertEquals(None, c.parse_options(['.', '4', '--jobs', '2'],
+            {'jobs': None}, names))
+        self.assertEquals((['.'], {'jobs': '2'}),
+                c.parse_options(['.', '--jobs', '2'], {'jobs': None}, names))
+
+    def test_run_with_an_argument_given_twice(self):
+        c = DidelCli(["foo", "pull", ".", "4", "--concurrency", "2"])
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            self.assertEquals(False, c.run())
+        finally:
+            sys.stdout, output = stdout, sys.stdout.getvalue()
+        self.assertTrue("Argument 'concurrency' given twice" in output, output)
+        self.assertTrue('Usage:\n\tfoo pull [<path>] [<concurrency>]'
+                in output, output)
+
+    # .print_help
+
+    def test_help_shows_the_subcommands_names(self):
+        c = DidelCli(["foo"])
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            c.print_help()
+        finally:
+            sys.stdout, output = stdout, sys.stdout.getvalue()
+        lines = output.splitlines()
+        self.assertTrue('assignments:submit-batch' in lines, output)
+        self.assertTrue('batch:pull' in lines, output)
+
+    # .parse_global_options
+
+    def test_parse_global_options(self):
+        c = DidelCli(["foo", "--no-cache", "pull", "--no-cache"])
+        argv = c.argv
+        self.assertTrue(c.parse_global_options(argv))
+        self.assertTrue(c.options['no_cache'])
+        self.assertEquals(["pull", "--no-cache"], argv)
+
+    def test_parse_global_options_default(self):
+        c = DidelCli(["foo", "pull"])
+        self.assertTrue(c.parse_global_options(c.argv))
+        self.assertFalse(c.options['no_cache'])
+        self.assertEquals(["pull"], c.argv)
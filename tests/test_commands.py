@@ -0,0 +1,253 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import json
+import shutil
+import sys
+from os.path import join
+from tempfile import mkdtemp
+
+try:
+    from StringIO import StringIO
+except ImportError:  # Python 3
+    from io import StringIO
+
+from didel.cli import DidelCli
+from didel.config import DidelConfig
+from didel.exceptions import DidelServerError
+
+from fakedidel import FakeDidel, make_courses
+from test_pull import make_config
+
+
+class CommandTestCase(unittest.TestCase):
+    """
+    End-to-end tests of subcommands against a local fake DidEL
+    """
+
+    latency = 0
+
+    courses = 20
+
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.server = FakeDidel(make_courses(self.courses, depth=0, files=0),
+                latency=self.latency).start()
+        DidelConfig._default = make_config(self.tmp, self.server)
+
+    def tearDown(self):
+        DidelConfig._default = None
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def run_cli(self, *args):
+        argv = ['didel'] + list(args)
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            return DidelCli(argv).run()
+        finally:
+            sys.stdout, self.output = stdout, sys.stdout.getvalue()
+
+
+class TestCoursesList(CommandTestCase):
+
+    latency = 0.1
+
+    def test_table(self):
+        self.assertNotEquals(False, self.run_cli('courses:list'))
+        lines = self.output.splitlines()
+        self.assertEquals(21, len(lines))
+        self.assertEquals(['Code', 'Title', 'Teacher'], lines[0].split())
+        self.assertEquals('COURSE0   Course COURSE0   Jeanne Dupont',
+                lines[1])
+
+    def test_json_and_concurrency(self):
+        self.assertNotEquals(False, self.run_cli('courses:list', '--json'))
+        rows = [json.loads(line) for line in self.output.splitlines()]
+        self.assertEquals(['COURSE%d' % i for i in range(20)],
+                [r['code'] for r in rows])
+        self.assertEquals({'code': 'COURSE3', 'title': 'Course COURSE3',
+            'teacher': 'Jeanne Dupont'}, rows[3])
+        # the pages are fetched in parallel
+        self.assertTrue(self.server.stats['max_active'] > 1,
+                self.server.stats)
+
+
+class TestAssignmentsUpcoming(CommandTestCase):
+
+    courses = 3
+
+    def setUp(self):
+        super(TestAssignmentsUpcoming, self).setUp()
+        ends = {
+            'COURSE0': ['01/03/2015', '10/05/2099 12:00'],
+            'COURSE1': ['02/04/2099', 'someday'],
+            'COURSE2': ['10/05/2099 08:00', '01/01/2099'],
+        }
+        for ref, course in self.server.courses.items():
+            for assignment, end in zip(course.assignments, ends[ref]):
+                assignment['end'] = end
+
+    def test_upcoming(self):
+        self.assertNotEquals(False, self.run_cli('assignments:upcoming'))
+        self.assertEquals([
+            '01/01/2099        COURSE2     TP 2',
+            '02/04/2099        COURSE1     TP 1',
+            '10/05/2099 08:00  COURSE2     TP 1',
+            '10/05/2099 12:00  COURSE0     TP 2',
+            'someday           COURSE1     TP 2',
+        ], self.output.splitlines())
+
+    def test_cached(self):
+        self.run_cli('assignments:upcoming')
+        output = self.output
+        self.server.reset_stats()
+        self.assertNotEquals(False, self.run_cli('assignments:upcoming'))
+        self.assertEquals(output, self.output)
+        self.assertEquals(0, self.server.stats['requests'])
+
+        self.run_cli('assignments:upcoming', '--refresh')
+        self.assertEquals(output, self.output)
+        self.assertTrue(self.server.stats['requests'] > 0)
+
+
+    def test_incomplete_results_are_not_cached(self):
+
+        class Unreachable(list):
+            # the list is shown, but the assignments can't be fetched
+            def __getitem__(self, index):
+                raise IndexError(index)
+
+        course = self.server.courses['COURSE1']
+        assignments = course.assignments
+        course.assignments = Unreachable(assignments)
+        self.assertRaises(DidelServerError, self.run_cli,
+                'assignments:upcoming')
+        course.assignments = assignments
+        self.server.reset_stats()
+        self.assertNotEquals(False, self.run_cli('assignments:upcoming'))
+        self.assertTrue(self.server.stats['requests'] > 0)
+        self.assertEquals(5, len(self.output.splitlines()))
+
+
+class TestAssignmentsSubmit(CommandTestCase):
+
+    courses = 1
+
+    def test_submit_with_progress(self):
+        filename = join(self.tmp, 'tp1.tar.gz')
+        content = b'0123456789abcdef' * (256 * 1024)
+        with open(filename, 'wb') as f:
+            f.write(content)
+        self.assertEquals(True, self.run_cli('assignments:submit', 'COURSE0',
+            '1', 'My TP', filename, '--progress'))
+        self.assertTrue('Uploading: 100% (4.0 MB / 4.0 MB)' in self.output,
+                self.output)
+        submissions = self.server.courses['COURSE0'].submissions
+        self.assertEquals(1, len(submissions))
+        assig_id, fields = submissions[0]
+        self.assertEquals('1', assig_id)
+        self.assertEquals('My TP', fields['wrkTitle'])
+        self.assertEquals(('tp1.tar.gz', content), fields['wrkFile'])
+
+
+class TestAssignmentsSubmitBatch(CommandTestCase):
+
+    courses = 2
+
+    def write_manifest(self, rows):
+        manifest = join(self.tmp, 'submissions.csv')
+        with open(manifest, 'w') as f:
+            f.write('course,index,title,file\n')
+            for course, index, title, name in rows:
+                with open(join(self.tmp, name), 'wb') as data:
+                    data.write(name.encode('utf-8'))
+                f.write('%s,%d,%s,%s\n' % (course, index, title, name))
+        return manifest
+
+    def submitted(self, code):
+        return sorted((assig_id, fields['wrkTitle'], fields['wrkFile'][1])
+                      for assig_id, fields
+                      in self.server.courses[code].submissions)
+
+    def test_submit_batch_skips_previous_submissions(self):
+        manifest = self.write_manifest([
+            ('COURSE0', 1, 'TP 1', 'a.txt'),
+            ('COURSE0', 2, 'TP 2', 'b.txt'),
+            ('COURSE1', 1, 'TP 1', 'c.txt'),
+        ])
+        self.assertNotEquals(False, self.run_cli('assignments:submit-batch',
+            manifest))
+        self.assertTrue('COURSE0 #2 TP 2: submitted' in self.output,
+                self.output)
+        self.assertTrue('3 submission(s), 0 failed' in self.output,
+                self.output)
+        self.assertEquals([('1', 'TP 1', b'a.txt'), ('2', 'TP 2', b'b.txt')],
+                self.submitted('COURSE0'))
+        self.assertEquals([('1', 'TP 1', b'c.txt')], self.submitted('COURSE1'))
+
+        self.assertNotEquals(False, self.run_cli('assignments:submit-batch',
+            manifest))
+        self.assertEquals(3, self.output.count('already submitted'),
+                self.output)
+        self.assertEquals(2, len(self.submitted('COURSE0')))
+        self.assertEquals(1, len(self.submitted('COURSE1')))
+
+    def test_submit_batch_compares_titles_exactly(self):
+        self.assertNotEquals(False, self.run_cli('assignments:submit-batch',
+            self.write_manifest([('COURSE0', 1, 'TP 10', 'a.txt')])))
+        manifest = self.write_manifest([
+            ('COURSE0', 1, 'TP 1', 'b.txt'),
+            ('COURSE0', 1, 'A & B', 'c.txt'),
+        ])
+        self.assertNotEquals(False, self.run_cli('assignments:submit-batch',
+            manifest))
+        self.assertEquals(0, self.output.count('already submitted'),
+                self.output)
+        self.assertEquals([('1', 'A & B', b'c.txt'), ('1', 'TP 1', b'b.txt'),
+                ('1', 'TP 10', b'a.txt')], self.submitted('COURSE0'))
+
+        self.assertNotEquals(False, self.run_cli('assignments:submit-batch',
+            manifest))
+        self.assertEquals(2, self.output.count('already submitted'),
+                self.output)
+        self.assertEquals(3, len(self.submitted('COURSE0')))
+
+    def test_submit_batch_skips_repeated_rows(self):
+        manifest = self.write_manifest([
+            ('COURSE0', 1, 'TP 1', 'a.txt'),
+            ('COURSE0', 1, 'TP 1', 'b.txt'),
+        ])
+        self.assertNotEquals(False, self.run_cli('assignments:submit-batch',
+            manifest, '--jobs', '2'))
+        self.assertTrue('COURSE0 #1 TP 1: skipped: same as line 2'
+                in self.output, self.output)
+        self.assertEquals([('1', 'TP 1', b'a.txt')],
+                self.submitted('COURSE0'))
+
+    def test_submit_batch_reports_fetch_errors(self):
+        manifest = self.write_manifest([('COURSE9', 1, 'TP 1', 'a.txt')])
+        self.assertEquals(False, self.run_cli('assignments:submit-batch',
+            manifest))
+        self.assertTrue('COURSE9 #1 TP 1: error: Server error 404'
+                in self.output, self.output)
+
+    def test_submit_batch_reports_errors(self):
+        manifest = self.write_manifest([
+            ('COURSE0', 1, 'TP 1', 'a.txt'),
+            ('COURSE0', 9, 'TP 9', 'b.txt'),
+        ])
+        self.assertEquals(False, self.run_cli('assignments:submit-batch',
+            manifest))
+        self.assertTrue('COURSE0 #1 TP 1: submitted' in self.output,
+                self.output)
+        self.assertTrue('COURSE0 #9 TP 9: error: no such assignment'
+                in self.output, self.output)
+        self.assertTrue('2 submission(s), 1 failed' in self.output,
+                self.output)
@@ -7,9 +7,30 @@ if platform.python_version() < '2.7':
 else:
     import unittest
 
+import shutil
+from os.path import join
+from tempfile import mkdtemp
+
 from didel.config import DidelConfig
 
 class TestDidelConfig(unittest.TestCase):
 
     def setUp(self):
         DidelConfig._default = None
+        self.tmp = mkdtemp()
+        self.filename = join(self.tmp, 'didel.conf')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_paths_are_relative_to_the_config_file(self):
+        cfg = DidelConfig(self.filename)
+        self.assertEquals(join(self.tmp, '.didel.cache'), cfg.cache_dir)
+        self.assertEquals(join(self.tmp, '.didel.cookies'), cfg.cookies_file)
+
+    def test_secret_round_trip(self):
+        cfg = DidelConfig(self.filename)
+        cfg.set_secret('password', u'pâss', True)
+        self.assertNotEquals(u'pâss', cfg.get('secret.password'))
+        self.assertEquals(u'pâss', DidelConfig(self.filename).get_secret(
+            'password'))
@@ -0,0 +1,302 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import shutil
+from os import listdir
+from tempfile import mkdtemp
+
+import responses
+from requests.exceptions import ConnectionError
+
+from didel.base import ROOT_URL
+from didel.exceptions import DidelServerError
+from didel.manifest import SyncManifest
+from didel.courses import CourseAssignment, CourseAssignments, \
+        CourseDocuments, CourseDocument
+from didel.session import Session
+from didel.student import Student
+
+from helpers import documents_page
+
+
+def tree(folder):
+    """
+    Return a comparable representation of a crawled documents tree
+    """
+    t = {}
+    for name, res in folder._resources.items():
+        if isinstance(res, CourseDocument):
+            t[name] = (res.url, res.date)
+        else:
+            t[name] = tree(res)
+    return t
+
+
+def flatten(t, prefix=''):
+    """
+    Return a list of ``(path, (url, date))`` tuples from a tree made by
+    ``tree``
+    """
+    items = []
+    for name, value in t.items():
+        if isinstance(value, dict):
+            items.extend(flatten(value, '%s%s/' % (prefix, name)))
+        else:
+            items.append(('%s%s' % (prefix, name), value))
+    return items
+
+
+class TestCourseAssignments(unittest.TestCase):
+
+    def add_assignments(self, count):
+        path = CourseAssignments.URL_FMT.format(ref='C1')
+        rows = ''.join('<tr><td><a href="user_work.php?assigId=%d&amp;'
+                'cidReq=C1">TP %d</a></td></tr>' % (i, i)
+                for i in range(count))
+        responses.add(responses.GET, ROOT_URL + path, status=200,
+                match_querystring=True, body='<div id="courseRightContent">'
+                '<table><tbody>%s</tbody></table></div>' % rows)
+        for i in range(count):
+            responses.add(responses.GET, '%s/claroline/work/user_work.php'
+                    '?assigId=%d&cidReq=C1' % (ROOT_URL, i), status=200,
+                    match_querystring=True, body='<div id='
+                    '"courseRightContent"><p><small><b>Titre</b> : TP %d'
+                    '</small></p></div>' % i)
+
+    @responses.activate
+    def test_iteration_fetches_the_assignments_in_order(self):
+        self.add_assignments(20)
+        assignments = CourseAssignments('C1')
+        assignments.fetch(Session())
+        self.assertEquals(['TP %d' % i for i in range(20)],
+                [a.title for a in assignments])
+        self.assertEquals(21, len(responses.calls))
+        # they're not fetched again
+        self.assertEquals('TP 3', assignments[3].title)
+        self.assertEquals(21, len(responses.calls))
+
+
+class TestCourseAssignment(unittest.TestCase):
+
+    def setUp(self):
+        self.student = Student('jdoe', 'secret', autofetch=False,
+                login=False)
+        self.student.auth_id = '42'
+        self.assignment = CourseAssignment('/claroline/work/user_work.php'
+                '?assigId=1&cidReq=C1', 'C1')
+        self.assignment.session = Session()
+        self.assignment.title = 'TP 1'
+        self.assignment.assig_id = '1'
+
+    def add_page(self, content):
+        responses.add(responses.GET, '%s/claroline/work/user_work.php'
+                '?assigId=1&authId=42&cidReq=C1' % ROOT_URL, status=200,
+                match_querystring=True, body='<div id="courseRightContent">'
+                '<p><small><b>Titre</b> : TP 1</small></p>%s</div>' % content)
+
+    @responses.activate
+    def test_is_submitted(self):
+        self.add_page('<ul><li>TP 10</li><li> A &amp; B </li></ul>')
+        self.assertEquals(['TP 10', 'A & B'],
+                self.assignment.submission_titles(self.student))
+        self.assertTrue(self.assignment.is_submitted(self.student, 'A & B'))
+        self.assertFalse(self.assignment.is_submitted(self.student, 'TP 1'))
+
+    @responses.activate
+    def test_is_submitted_without_a_list(self):
+        self.add_page('<table><tr><td>A &amp; B</td></tr></table>')
+        self.assertEquals([], self.assignment.submission_titles(self.student))
+        self.assertTrue(self.assignment.is_submitted(self.student, 'A & B'))
+        self.assertFalse(self.assignment.is_submitted(self.student, 'TP 1'))
+
+    @responses.activate
+    def test_is_submitted_raises_server_errors(self):
+        responses.add(responses.GET, '%s/claroline/work/user_work.php'
+                '?assigId=1&authId=42&cidReq=C1' % ROOT_URL, status=500,
+                match_querystring=True, body='oops')
+        self.assertRaises(DidelServerError, lambda:
+                self.assignment.is_submitted(self.student, 'TP 1'))
+
+
+class TestCourseDocuments(unittest.TestCase):
+
+    def setUp(self):
+        self.ref = 'XYZ42'
+
+    def add_folder(self, path, depth, width):
+        rows = []
+        for i in range(width):
+            name = 'doc%d.pdf' % i
+            rows.append((name, '%s/%s' % (path, name), '01.02.2015', False))
+            if depth > 0:
+                sub = '%s/dir%d' % (path, i)
+                rows.append(('dir%d' % i, sub, '02.02.2015', True))
+                self.add_folder(sub, depth - 1, width)
+        responses.add(responses.GET, ROOT_URL + path,
+                body=documents_page(rows), status=200,
+                match_querystring=True)
+
+    def crawl(self, concurrency):
+        d = CourseDocuments(self.ref)
+        d.crawl(Session(), concurrency)
+        return d
+
+    @responses.activate
+    def test_crawl_fetches_all_folders(self):
+        self.add_folder(CourseDocuments.URL_FMT.format(ref=self.ref), 2, 3)
+        d = self.crawl(1)
+        # 1 root + 3 subfolders + 9 sub-subfolders
+        self.assertEquals(13, len(responses.calls))
+        self.assertEquals(3, len(d.folders))
+        self.assertTrue(d.dir1.dir2.is_populated())
+
+    @responses.activate
+    def test_parallel_crawl_gives_the_same_tree(self):
+        self.add_folder(CourseDocuments.URL_FMT.format(ref=self.ref), 3, 3)
+        serial = tree(self.crawl(1))
+        self.assertEquals(serial, tree(self.crawl(8)))
+
+    # .walk
+
+    @responses.activate
+    def test_walk_yields_all_documents(self):
+        self.add_folder(CourseDocuments.URL_FMT.format(ref=self.ref), 2, 3)
+        expected = sorted(flatten(tree(self.crawl(1))))
+        for concurrency, queue_size in ((1, 64), (4, 1)):
+            d = CourseDocuments(self.ref)
+            walked = sorted((path, (doc.url, doc.date))
+                    for path, doc in d.walk(Session(), concurrency,
+                        queue_size))
+            self.assertEquals(expected, walked)
+
+    @responses.activate
+    def test_walk_stops_when_closed(self):
+        self.add_folder(CourseDocuments.URL_FMT.format(ref=self.ref), 2, 3)
+        walker = CourseDocuments(self.ref).walk(Session(), 1, queue_size=1)
+        self.assertEquals('doc0.pdf', next(walker)[0])
+        walker.close()
+        self.assertEquals(1, len(responses.calls))
+
+    @responses.activate
+    def test_walk_raises_crawl_errors(self):
+        root = CourseDocuments.URL_FMT.format(ref=self.ref)
+        responses.add(responses.GET, ROOT_URL + root, status=200,
+                match_querystring=True, body=documents_page([
+                    ('dir', '/nope', '01.02.2015', True)]))
+        walker = CourseDocuments(self.ref).walk(Session())
+        self.assertRaises(ConnectionError, lambda: list(walker))
+
+
+class TestCourseDocumentsDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        self.docs = CourseDocuments('XYZ42')
+        self.docs.session = Session()
+        self.url = '%s/claroline/document/goto/?url=/foo.pdf' % ROOT_URL
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @responses.activate
+    def test_download_binary_file(self):
+        body = b'%PDF\x00\xff\xfe' * 50000
+        responses.add(responses.GET, self.url, body=body, status=200)
+        doc = CourseDocument('foo.pdf', self.url, '01.02.2015')
+        self.docs.download(doc, self.path)
+        self.assertEquals('%s/foo.pdf' % self.path, doc.path)
+        with open(doc.path, 'rb') as f:
+            self.assertEquals(body, f.read())
+
+    @responses.activate
+    def test_download_error_doesnt_write_anything(self):
+        responses.add(responses.GET, self.url, body='oops', status=500)
+        doc = CourseDocument('foo.pdf', self.url, '01.02.2015')
+        self.assertRaises(DidelServerError,
+                lambda: self.docs.download(doc, self.path))
+        self.assertEquals([], listdir(self.path))
+
+    @responses.activate
+    def test_synchronize_with_manifest(self):
+        root = CourseDocuments.URL_FMT.format(ref='XYZ42')
+        responses.add(responses.GET, ROOT_URL + root, status=200,
+                match_querystring=True, body=documents_page([
+                    ('foo.pdf', self.url, '01.02.2015', False)]))
+        responses.add(responses.GET, self.url, body='abc', status=200)
+        manifest = SyncManifest(self.path)
+
+        d = CourseDocuments('XYZ42')
+        d.crawl(Session())
+        self.assertEquals(['foo.pdf'],
+                [doc.name for doc in d.synchronize(self.path, manifest)])
+        self.assertEquals((self.url, '01.02.2015', '1 Ko', 3),
+            manifest.get('%s/XYZ42/foo.pdf' % self.path))
+
+        d = CourseDocuments('XYZ42')
+        d.crawl(Session())
+        self.assertEquals([], d.synchronize(self.path, manifest))
+        # 2 listings + 1 download
+        self.assertEquals(3, len(responses.calls))
+        manifest.close()
+
+    @responses.activate
+    def test_pull(self):
+        root = CourseDocuments.URL_FMT.format(ref='XYZ42')
+        sub = '/claroline/document/document.php?cmd=exChDir&file=/sub'
+        responses.add(responses.GET, ROOT_URL + root, status=200,
+                match_querystring=True, body=documents_page([
+                    ('sub', sub, '01.02.2015', True),
+                    ('foo.pdf', self.url, '01.02.2015', False)]))
+        responses.add(responses.GET, ROOT_URL + sub, status=200,
+                match_querystring=True, body=documents_page([
+                    ('bar.pdf', self.url, '01.02.2015', False)]))
+        responses.add(responses.GET, self.url, body='abc', status=200)
+        manifest = SyncManifest(self.path)
+
+        docs = CourseDocuments('XYZ42').pull(self.path, Session(), 2, manifest)
+        self.assertEquals(['bar.pdf', 'foo.pdf'],
+                sorted(doc.name for doc in docs))
+        for name in ('XYZ42/foo.pdf', 'XYZ42/sub/bar.pdf'):
+            with open('%s/%s' % (self.path, name)) as f:
+                self.assertEquals('abc', f.read())
+        self.assertEquals([], CourseDocuments('XYZ42').pull(self.path,
+            Session(), 2, manifest))
+        manifest.close()
+
+    @responses.activate
+    def test_pull_skips_unchanged_folders(self):
+        root = CourseDocuments.URL_FMT.format(ref='XYZ42')
+        sub = '/claroline/document/document.php?cmd=exChDir&file=/sub'
+
+        def listings(date):
+            responses.reset()
+            responses.add(responses.GET, ROOT_URL + root, status=200,
+                    match_querystring=True, body=documents_page([
+                        ('sub', sub, date, True)]))
+            responses.add(responses.GET, ROOT_URL + sub, status=200,
+                    match_querystring=True, body=documents_page([
+                        ('bar.pdf', self.url, date, False)]))
+            responses.add(responses.GET, self.url, body='abc', status=200)
+
+        def pull():
+            return [d.name for d in CourseDocuments('XYZ42').pull(self.path,
+                Session(), 2, manifest)]
+
+        manifest = SyncManifest(self.path)
+        listings('01.02.2015')
+        self.assertEquals(['bar.pdf'], pull())
+        listings('01.02.2015')
+        self.assertEquals([], pull())
+        # only the root folder was fetched
+        self.assertEquals([ROOT_URL + root],
+                [c.request.url for c in responses.calls])
+        listings('02.02.2015')
+        self.assertEquals(['bar.pdf'], pull())
+        self.assertEquals(3, len(responses.calls))
+        manifest.close()
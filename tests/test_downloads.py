@@ -0,0 +1,163 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import json
+import shutil
+from os import listdir
+from os.path import exists, join
+from tempfile import mkdtemp
+
+import responses
+
+from didel.base import ROOT_URL
+from didel.courses import CourseDocuments, CourseDocument
+from didel.downloads import split_ranges
+from didel.session import Session
+
+from fakedidel import FakeDidel, make_courses, USERNAME, PASSWORD
+
+
+class TestSplitRanges(unittest.TestCase):
+
+    def test_split_ranges(self):
+        self.assertEquals([(0, 4), (4, 8), (8, 10)], split_ranges(10, 3))
+        self.assertEquals([(0, 3), (3, 6)], split_ranges(6, 2))
+        self.assertEquals([(0, 1), (1, 2)], split_ranges(2, 4))
+
+
+class DownloadTestCase(unittest.TestCase):
+
+    size = 1024 * 1024 + 17
+
+    def setUp(self):
+        self.path = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def start_server(self, **kw):
+        self.server = FakeDidel(make_courses(1, depth=0, files=1,
+            file_size=self.size), **kw).start()
+        self.addCleanup(self.server.stop)
+        session = Session(root_url=self.server.url,
+                login_url=self.server.login_url)
+        session.login(USERNAME, PASSWORD)
+        self.docs = CourseDocuments('COURSE0')
+        self.docs.fetch(session)
+        self.server.reset_stats()
+        return self.docs.get_resource('document 0.pdf')
+
+    def download(self, doc, segments):
+        self.docs.download(doc, self.path, segments, segment_threshold=1024)
+        f = self.server.find(self.server.courses['COURSE0'], '/' + doc.name)
+        with open(doc.path, 'rb') as fd:
+            self.assertEquals(f.content('COURSE0/' + doc.name), fd.read())
+        self.assertEquals(self.size, doc.downloaded_size)
+        self.assertTrue(doc.download_time > 0)
+
+
+class TestSegmentedDownload(DownloadTestCase):
+
+    def test_download_in_segments(self):
+        doc = self.start_server()
+        self.download(doc, 4)
+        self.assertEquals(4, self.server.stats['downloads'])
+        self.assertEquals(['document 0.pdf'], listdir(self.path))
+
+    def test_download_without_ranges_support(self):
+        doc = self.start_server(ranges=False)
+        self.download(doc, 4)
+        self.assertEquals(1, self.server.stats['downloads'])
+
+    def test_small_files_are_downloaded_in_one_stream(self):
+        doc = self.start_server()
+        self.docs.download(doc, self.path, 4, segment_threshold=self.size + 1)
+        self.assertEquals(1, self.server.stats['downloads'])
+
+    @responses.activate
+    def test_fallback_when_ranges_are_ignored(self):
+        url = '%s/claroline/document/goto/?url=/foo.pdf' % ROOT_URL
+        body = b'x' * 5000
+        responses.add(responses.GET, url, body=body, status=200,
+                headers={'Accept-Ranges': 'bytes', 'ETag': '"abc"'})
+        docs = CourseDocuments('XYZ42')
+        docs.session = Session()
+        doc = CourseDocument('foo.pdf', url, '01.02.2015')
+        docs.download(doc, self.path, 4, segment_threshold=1024)
+        with open(doc.path, 'rb') as f:
+            self.assertEquals(body, f.read())
+        self.assertEquals(['foo.pdf'], listdir(self.path))
+
+
+class TestResumedDownload(DownloadTestCase):
+
+    def interrupt(self, doc, segments=1):
+        self.server.drop_after = 128 * 1024
+        self.assertRaises(Exception, lambda: self.docs.download(doc,
+            self.path, segments, segment_threshold=1024))
+        self.server.drop_after = None
+        self.assertEquals(['document 0.pdf.part', 'document 0.pdf.part.json'],
+                sorted(listdir(self.path)))
+        self.server.reset_stats()
+
+    def test_resume_download(self):
+        doc = self.start_server()
+        self.interrupt(doc)
+        self.download(doc, 1)
+        self.assertTrue(doc.resumed)
+        # the last chunk read before the connection was lost may be lost
+        self.assertTrue(self.server.stats['bytes'] <= self.size - 64 * 1024)
+        self.assertEquals(['document 0.pdf'], listdir(self.path))
+
+    def test_resume_segmented_download(self):
+        doc = self.start_server()
+        self.interrupt(doc, 4)
+        self.download(doc, 4)
+        self.assertTrue(doc.resumed)
+        self.assertTrue(self.server.stats['bytes'] < self.size - 128 * 1024)
+        self.assertEquals(['document 0.pdf'], listdir(self.path))
+
+    def test_restart_if_the_file_changed(self):
+        doc = self.start_server()
+        self.interrupt(doc)
+        self.server.update_file('COURSE0', '/document 0.pdf')
+        self.download(doc, 1)
+        self.assertFalse(doc.resumed)
+        self.assertEquals(['document 0.pdf'], listdir(self.path))
+
+
+class TestEncodedDownload(DownloadTestCase):
+
+    def test_encoded_download_is_not_resumed(self):
+        doc = self.start_server(gzip=True)
+        self.server.drop_after = 1024
+        self.assertRaises(Exception, lambda: self.docs.download(doc,
+            self.path, 4, segment_threshold=1024))
+        self.server.drop_after = None
+        # the offsets of the decoded file can't be requested
+        self.assertFalse(exists(doc.path + '.part.json'))
+        self.server.reset_stats()
+        self.download(doc, 4)
+        self.assertFalse(doc.resumed)
+        self.assertEquals(1, self.server.stats['downloads'])
+        self.assertEquals(['document 0.pdf'], listdir(self.path))
+
+    def test_restart_if_the_resumed_part_is_encoded(self):
+        doc = self.start_server(gzip=True)
+        f = self.server.find(self.server.courses['COURSE0'], '/' + doc.name)
+        part = join(self.path, doc.name) + '.part'
+        # the state saved by a download of the compressed file
+        with open(part, 'wb') as fd:
+            fd.write(b'x' * 1024)
+        with open(part + '.json', 'w') as fd:
+            json.dump({'url': doc.url, 'validator': f.etag('COURSE0/'
+                + doc.name), 'size': None, 'ranges': [[1024, None]]}, fd)
+        self.download(doc, 1)
+        self.assertFalse(doc.resumed)
+        self.assertEquals(['document 0.pdf'], listdir(self.path))
@@ -9,11 +9,13 @@ else:
 
 import shutil
 from time import sleep
-from os import chmod
+from os import chmod, listdir
 from os.path import isdir
 from tempfile import mkdtemp
 
-from didel.fileutils import date2timestamp, file_mtime, mkdir_p
+from didel.fileutils import date2timestamp, deadline2timestamp
+from didel.fileutils import file_mtime, mkdir_p
+from didel.fileutils import write_atomically
 
 
 class TestFileutils(unittest.TestCase):
@@ -54,6 +56,21 @@ class TestFileutils(unittest.TestCase):
         d2 = date2timestamp("28.02.2015", 42)
         self.assertLess(d1, d2)
 
+    # deadline2timestamp
+
+    def test_deadline2timestamp_wrong_format(self):
+        self.assertEquals(None, deadline2timestamp(None))
+        self.assertEquals(0, deadline2timestamp("soon", 0))
+        self.assertEquals(0, deadline2timestamp("31/02/2015", 0))
+
+    def test_deadline2timestamp_with_or_without_time(self):
+        day = deadline2timestamp("28/02/2015")
+        self.assertEquals(day, deadline2timestamp("28.02.2015 23:59"))
+        self.assertEquals(day - 12 * 3600,
+                deadline2timestamp("le 28/02/2015 à 11h59"))
+        self.assertLess(deadline2timestamp("1/3/2015 0:00"),
+                deadline2timestamp("01/03/2015"))
+
     # file_mtime
 
     def test_mtime_order(self):
@@ -93,3 +110,39 @@ class TestFileutils(unittest.TestCase):
     def test_mkdir_p_should_fail_if_no_permissions(self):
         chmod(self.path, 0)
         self.assertRaises(OSError, lambda: mkdir_p(self.full_path("a")))
+
+    # write_atomically
+
+    def test_write_atomically(self):
+        path = self.full_path("foo")
+        write_atomically(path, [b"abc", b"", b"def"])
+        with open(path, "rb") as f:
+            self.assertEquals(b"abcdef", f.read())
+        self.assertEquals(["foo"], listdir(self.path))
+
+    def test_write_atomically_replaces_existing_file(self):
+        path = self.full_path("foo")
+        self.touch(path)
+        write_atomically(path, [b"xyz"])
+        with open(path, "rb") as f:
+            self.assertEquals(b"xyz", f.read())
+
+    def test_write_atomically_doesnt_leave_partial_files(self):
+        def chunks():
+            yield b"abc"
+            raise IOError("connection lost")
+
+        path = self.full_path("foo")
+        self.assertRaises(IOError, lambda: write_atomically(path, chunks()))
+        self.assertEquals([], listdir(self.path))
+
+    def test_write_atomically_keeps_old_file_on_error(self):
+        def chunks():
+            yield b"new"
+            raise IOError("connection lost")
+
+        path = self.full_path("foo")
+        write_atomically(path, [b"old"])
+        self.assertRaises(IOError, lambda: write_atomically(path, chunks()))
+        with open(path, "rb") as f:
+            self.assertEquals(b"old", f.read())
@@ -0,0 +1,127 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import shutil
+from tempfile import mkdtemp
+
+import responses
+
+from didel.httpcache import HTTPCache
+from didel.session import Session
+
+
+class TestHTTPCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        self.cache = HTTPCache(self.path)
+        self.session = Session(cache=self.cache)
+        self.url = 'http://www.example.com/foo'
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def add(self, body, status=200, **headers):
+        responses.add(responses.GET, self.url, body=body, status=status,
+                adding_headers=headers)
+
+    @responses.activate
+    def test_dont_store_responses_without_validators(self):
+        self.add('foo')
+        self.session.get(self.url)
+        self.assertEquals({}, self.cache.validators(self.url))
+        self.assertEquals(0, self.cache.size())
+
+    @responses.activate
+    def test_store_validators(self):
+        self.add('foo', ETag='"abc"', **{'Last-Modified': 'Sat, 1 Jan 2000'})
+        self.session.get(self.url)
+        self.assertEquals({'If-None-Match': '"abc"',
+                           'If-Modified-Since': 'Sat, 1 Jan 2000'},
+                           self.cache.validators(self.url))
+
+    @responses.activate
+    def test_send_validators_and_serve_304_from_cache(self):
+        self.add(u'caf\xe9', ETag='"abc"',
+                **{'Content-Type': 'text/html; charset=utf-8'})
+        self.add('', status=304)
+        self.session.get(self.url)
+        resp = self.session.get(self.url)
+        self.assertEquals(2, len(responses.calls))
+        self.assertEquals('"abc"',
+                responses.calls[1].request.headers['If-None-Match'])
+        self.assertEquals(200, resp.status_code)
+        self.assertEquals(u'caf\xe9', resp.text)
+        self.assertTrue(resp.from_cache)
+
+    @responses.activate
+    def test_query_string_is_part_of_the_key(self):
+        self.add('foo', ETag='"abc"')
+        self.session.get(self.url, params={'a': 1})
+        self.assertEquals({}, self.cache.validators(self.url))
+        self.assertNotEquals({}, self.cache.validators(self.url + '?a=1'))
+
+    @responses.activate
+    def test_streamed_requests_arent_cached(self):
+        self.add('foo', ETag='"abc"')
+        self.session.get(self.url, stream=True).close()
+        self.assertEquals(0, self.cache.size())
+
+    @responses.activate
+    def test_index_is_persistent(self):
+        self.add('foo', ETag='"abc"')
+        self.session.get(self.url)
+        self.session.close()
+        self.assertEquals({'If-None-Match': '"abc"'},
+                HTTPCache(self.path).validators(self.url))
+
+    @responses.activate
+    def test_index_is_written_every_n_changes(self):
+        cache = HTTPCache(self.path, save_every=3)
+        session = Session(cache=cache)
+        self.add('foo', ETag='"abc"')
+        self.add('', status=304)
+        session.get(self.url)
+        session.get(self.url)
+        # the store and the hit are only in memory
+        self.assertEquals({}, HTTPCache(self.path).validators(self.url))
+        session.get(self.url)
+        self.assertEquals({'If-None-Match': '"abc"'},
+                HTTPCache(self.path).validators(self.url))
+
+    @responses.activate
+    def test_lru_eviction(self):
+        cache = HTTPCache(self.path, max_size=10)
+        session = Session(cache=cache)
+        for i in range(3):
+            url = '%s/%d' % (self.url, i)
+            responses.add(responses.GET, url, body='1234', status=200,
+                    adding_headers={'ETag': str(i)})
+            responses.add(responses.GET, url, body='', status=304)
+        session.get(self.url + '/0')
+        session.get(self.url + '/1')
+        # /0 is now more recently used than /1
+        session.get(self.url + '/0')
+        session.get(self.url + '/2')
+        self.assertEquals(8, cache.size())
+        self.assertEquals({}, cache.validators(self.url + '/1'))
+        self.assertNotEquals({}, cache.validators(self.url + '/0'))
+        self.assertNotEquals({}, cache.validators(self.url + '/2'))
+
+    @responses.activate
+    def test_too_large_responses_arent_cached(self):
+        cache = HTTPCache(self.path, max_size=2)
+        self.add('foo', ETag='"abc"')
+        Session(cache=cache).get(self.url)
+        self.assertEquals(0, cache.size())
+
+    def test_clear(self):
+        self.cache._index['x'] = {'size': 3, 'atime': 0}
+        self.cache.clear()
+        self.assertEquals(0, self.cache.size())
@@ -0,0 +1,137 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import os
+import shutil
+import time
+from os.path import join
+from tempfile import mkdtemp
+
+from didel.courses import CourseDocument
+from didel.manifest import SyncManifest
+
+
+class TestSyncManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.manifest = SyncManifest(self.root)
+        self.doc = CourseDocument('a.pdf', '/a.pdf', '01.02.2015', '1 Ko')
+        self.path = '%s/C1/a.pdf' % self.root
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def touch(self, path):
+        with open(path, 'w') as f:
+            f.write('x')
+
+    def test_missing_file_is_outdated(self):
+        self.assertTrue(self.manifest.is_outdated(self.path, self.doc))
+        self.assertEquals(0, len(self.manifest))
+
+    def test_existing_file_is_recorded(self):
+        path = '%s/a.pdf' % self.root
+        self.touch(path)
+        self.assertFalse(self.manifest.is_outdated(path, self.doc))
+        self.assertEquals(('/a.pdf', '01.02.2015', '1 Ko', 1),
+                self.manifest.get(path))
+
+    def test_recorded_file_is_up_to_date(self):
+        self.manifest.record(self.path, self.doc)
+        self.assertFalse(self.manifest.is_outdated(self.path, self.doc))
+
+    def test_changes_make_a_file_outdated(self):
+        self.manifest.record(self.path, self.doc)
+        for attr, value in (('date', '02.02.2015'), ('size', '2 Ko'),
+                ('url', '/b.pdf')):
+            doc = CourseDocument('a.pdf', '/a.pdf', '01.02.2015', '1 Ko')
+            setattr(doc, attr, value)
+            self.assertTrue(self.manifest.is_outdated(self.path, doc))
+
+    def test_keys_are_normalized(self):
+        self.manifest.record('%s/C1//x/../a.pdf' % self.root, self.doc)
+        self.assertNotEquals(None, self.manifest.get(self.path))
+
+    def test_persistence(self):
+        self.manifest.record(self.path, self.doc)
+        self.manifest.commit()
+        other = SyncManifest(self.root)
+        self.assertEquals(1, len(other))
+        self.assertFalse(other.is_outdated(self.path, self.doc))
+        other.close()
+
+    def test_clear(self):
+        self.manifest.record(self.path, self.doc)
+        self.manifest.clear()
+        self.assertEquals(0, len(self.manifest))
+        self.assertTrue(self.manifest.is_outdated(self.path, self.doc))
+
+    def test_folders(self):
+        rows = [['a.pdf', '/a.pdf', '01.02.2015', '1 Ko', False]]
+        self.assertEquals(None, self.manifest.folder('/f', '01.02.2015'))
+        self.manifest.record_folder('/f', '01.02.2015', rows)
+        self.assertEquals(rows, self.manifest.folder('/f', '01.02.2015'))
+        self.assertEquals(None, self.manifest.folder('/f', '02.02.2015'))
+        self.manifest.commit()
+        other = SyncManifest(self.root)
+        self.assertEquals(rows, other.folder('/f', '01.02.2015'))
+        other.close()
+        self.manifest.clear()
+        self.assertEquals(None, self.manifest.folder('/f', '01.02.2015'))
+
+    def test_folders_with_a_new_size(self):
+        rows = [['a.pdf', '/a.pdf', '01.02.2015', '1 Ko', False]]
+        self.manifest.record_folder('/f', '01.02.2015', rows, '1 Ko')
+        self.assertEquals(rows, self.manifest.folder('/f', '01.02.2015',
+            '1 Ko'))
+        self.assertEquals(None, self.manifest.folder('/f', '01.02.2015',
+            '2 Ko'))
+
+    def test_folders_listed_on_the_day_of_their_date(self):
+        today = time.strftime('%d.%m.%Y')
+        self.manifest.record_folder('/f', today, [])
+        # it may change later today without getting a new date
+        self.assertEquals(None, self.manifest.folder('/f', today))
+
+    def test_folders_are_listed_again_periodically(self):
+        manifest = SyncManifest(self.root, relist_every=3)
+        manifest.record_folder('/f', '01.02.2015', [])
+        self.assertEquals([], manifest.folder('/f', '01.02.2015'))
+        self.assertEquals([], manifest.folder('/f', '01.02.2015'))
+        self.assertEquals(None, manifest.folder('/f', '01.02.2015'))
+        manifest.record_folder('/f', '01.02.2015', [])
+        self.assertEquals([], manifest.folder('/f', '01.02.2015'))
+        manifest.close()
+
+    def test_readonly(self):
+        rows = [['a.pdf', '/a.pdf', '01.02.2015', '1 Ko', False]]
+        self.manifest.record(self.path, self.doc)
+        self.manifest.record_folder('/f', '01.02.2015', rows)
+        self.manifest.commit()
+        readonly = SyncManifest(self.root, readonly=True)
+        self.assertEquals(1, len(readonly))
+        self.assertEquals(rows, readonly.folder('/f', '01.02.2015'))
+        readonly.record(join(self.root, 'b.pdf'), self.doc)
+        readonly.record_folder('/g', '01.02.2015', rows)
+        readonly.close()
+        other = SyncManifest(self.root)
+        self.assertEquals(1, len(other))
+        self.assertEquals(None, other.folder('/g', '01.02.2015'))
+        other.close()
+
+    def test_readonly_does_not_create_the_database(self):
+        root = join(self.root, 'empty')
+        os.mkdir(root)
+        readonly = SyncManifest(root, readonly=True)
+        readonly.record_folder('/f', '01.02.2015', [])
+        self.assertEquals([], readonly.folder('/f', '01.02.2015'))
+        readonly.close()
+        self.assertEquals([], os.listdir(root))
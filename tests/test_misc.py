@@ -13,3 +13,17 @@ class TestMisc(unittest.TestCase):
 
     def test_version_format(self):
         self.assertRegexpMatches(__version__, r'^\d+\.\d+\.\d+')
+
+    def test_shortcuts(self):
+        from didel import Course, CourseAssignment, CourseAssignments
+        from didel import Session, Student
+        from didel import courses, session, student
+        self.assertIs(courses.Course, Course)
+        self.assertIs(courses.CourseAssignment, CourseAssignment)
+        self.assertIs(courses.CourseAssignments, CourseAssignments)
+        self.assertIs(session.Session, Session)
+        self.assertIs(student.Student, Student)
+
+    def test_unknown_shortcut(self):
+        import didel
+        self.assertRaises(AttributeError, lambda: didel.DoesntExist)
@@ -0,0 +1,82 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import shutil
+from os.path import join
+from tempfile import mkdtemp
+
+from didel.multipart import MultipartEncoder
+
+from fakedidel import parse_multipart
+
+
+class RecordingFile(object):
+    """
+    A file which records the size of the reads
+    """
+
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        self.name = path
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return self.f.read(size)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+class TestMultipartEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        self.filename = join(self.path, 'archive "1".zip')
+        self.content = bytes(bytearray(range(256))) * 4000
+        with open(self.filename, 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def read_all(self, body, size=8192):
+        chunks = []
+        while True:
+            chunk = body.read(size)
+            if not chunk:
+                return b''.join(chunks)
+            self.assertTrue(len(chunk) <= size)
+            chunks.append(chunk)
+
+    def test_encode(self):
+        f = RecordingFile(self.filename)
+        body = MultipartEncoder({'title': u'TP \xe9t\xe9', 'n': 3},
+                {'file': f}, chunk_size=4096)
+        data = self.read_all(body)
+        f.close()
+        self.assertEquals(len(body), len(data))
+        fields = parse_multipart(body.content_type, data)
+        self.assertEquals(u'TP \xe9t\xe9', fields['title'])
+        self.assertEquals('3', fields['n'])
+        self.assertEquals('archive %221%22.zip', fields['file'][0])
+        self.assertEquals(self.content, fields['file'][1])
+        # the file is read chunk by chunk
+        self.assertEquals(set([4096]), set(f.reads))
+
+    def test_progress(self):
+        calls = []
+        with open(self.filename, 'rb') as f:
+            body = MultipartEncoder({}, {'file': f},
+                    lambda done, total: calls.append((done, total)))
+            self.read_all(body, 100000)
+        self.assertEquals(len(body), calls[-1][0])
+        self.assertEquals(set([len(body)]), set(c[1] for c in calls))
+        self.assertEquals(sorted(calls), calls)
+        self.assertTrue(len(calls) >= len(self.content) // 100000)
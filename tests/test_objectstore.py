@@ -0,0 +1,70 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import os
+import shutil
+from os.path import join, samefile
+from tempfile import mkdtemp
+
+from didel.courses import CourseDocument
+from didel.objectstore import ObjectStore, file_digest
+
+
+class TestObjectStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        self.store = ObjectStore(join(self.path, 'store'))
+        self.doc = CourseDocument('a.pdf', '/a.pdf', '01.02.2015', '3 Ko')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, name, content):
+        path = join(self.path, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_identical_files_are_stored_once(self):
+        a = self.write('a.pdf', b'slides')
+        b = self.write('b.pdf', b'slides')
+        c = self.write('c.pdf', b'other slides')
+        digest = self.store.add(a)
+        self.assertEquals(digest, self.store.add(b))
+        self.assertNotEquals(digest, self.store.add(c))
+        self.assertTrue(samefile(a, b))
+        self.assertTrue(samefile(a, self.store.object_path(digest)))
+        self.assertFalse(samefile(a, c))
+        with open(b, 'rb') as f:
+            self.assertEquals(b'slides', f.read())
+
+    def test_lookup(self):
+        self.assertEquals(None, self.store.lookup(self.doc))
+        digest = self.store.add(self.write('a.pdf', b'slides'), self.doc)
+        self.assertEquals(file_digest(join(self.path, 'a.pdf')), digest)
+        self.assertEquals(digest, self.store.lookup(self.doc))
+        other = CourseDocument('a.pdf', '/a.pdf', '02.02.2015', '3 Ko')
+        self.assertEquals(None, self.store.lookup(other))
+        other = ObjectStore(join(self.path, 'store'))
+        self.assertEquals(digest, other.lookup(self.doc))
+
+    def test_lookup_missing_object(self):
+        self.store.add(self.write('a.pdf', b'slides'), self.doc)
+        os.remove(join(self.path, 'a.pdf'))
+        os.remove(self.store.object_path(self.store.lookup(self.doc)))
+        self.assertEquals(None, self.store.lookup(self.doc))
+
+    def test_checkout(self):
+        digest = self.store.add(self.write('a.pdf', b'slides'))
+        b = self.write('b.pdf', b'old content')
+        self.store.checkout(digest, b)
+        self.assertTrue(samefile(join(self.path, 'a.pdf'), b))
+        self.assertEquals(['a.pdf', 'b.pdf', 'store'],
+                sorted(os.listdir(self.path)))
@@ -0,0 +1,233 @@
+# -*- coding: UTF-8 -*-
+
+from __future__ import unicode_literals
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import requests
+from requests.utils import get_encoding_from_headers
+
+from didel.courses import Course, CourseAssignment, CourseAssignments
+from didel.courses import CourseDocuments, CoursesMainPage
+from didel.parsers import Bs4Backend, LxmlBackend, Query, get_backend
+from didel.session import Session
+from didel.souputils import parse_homemade_dl
+from didel.student import Student, StudentCoursesRefs
+
+from helpers import documents_page
+from test_courses import tree
+
+BACKENDS = ('bs4', 'lxml')
+
+Q_P = Query('p', './/p')
+
+
+def response(body, content_type='text/html; charset=utf-8'):
+    r = requests.Response()
+    r.status_code = 200
+    r.headers['Content-Type'] = content_type
+    r.encoding = get_encoding_from_headers(r.headers)
+    if not isinstance(body, bytes):
+        body = body.encode(r.encoding or 'utf-8')
+    r._content = body
+    return r
+
+
+COURSE_PAGE = """<html><body>
+<div class="courseInfos"><h2><a href="#">Systèmes &amp; Réseaux</a></h2>
+<p>Enseignant :
+   Jeanne Dupont</p></div>
+<div class="portlet" id="portletAbout">
+  Ce cours parle de réseaux.
+</div>
+</body></html>"""
+
+ASSIGNMENTS_PAGE = """<div id="courseRightContent"><table class="claroTable">
+<thead><tr><th>Titre</th></tr></thead>
+<tbody>
+<tr><td><a href="user_work.php?assigId=1&amp;cidReq=C1">TP 1</a></td></tr>
+<tr><td><a href="user_work.php?assigId=2&amp;cidReq=C1">TP 2</a></td></tr>
+</tbody></table></div>"""
+
+ASSIGNMENT_PAGE = """<div id="courseRightContent"><h3>TP 1</h3>
+<p><small><b>Titre</b> : TP 1<br/>
+<b>Du</b> 01/02/2015 <b>au</b> 15/02/2015<br/>
+<b>Type de soumission</b> : Fichier<br/>
+<!-- hidden -->
+<b>Type de travail</b> <i>Individuel</i><br/>
+<b>Visibilité de la soumission</b> : Visible</small></p></div>"""
+
+MAIN_PAGE = """<dl>
+<dt><a href="/claroline/course/index.php?cid=ABC1&amp;cidReset=true">A</a></dt>
+<dt><a>no link</a></dt>
+<dt><a href="/claroline/course/index.php?foo=bar">no cid</a></dt>
+<dt><a href="/claroline/course/index.php?cid=DEF2">B</a></dt>
+</dl>"""
+
+PROFILE_PAGE = """<form>
+<input id="firstname" value="Jeanne"/><input id="lastname" value="Dupont"/>
+<input id="officialCode" value="2150042"/><input id="username" value="jd"/>
+<input id="email" value="jd@example.com"/><input id="phone" value=""/>
+<input id="skype" value="jd42"/><input id="uidToEdit" value="1234"/>
+</form>"""
+
+
+class TestBackends(unittest.TestCase):
+
+    def test_get_default_backend(self):
+        self.assertIsInstance(get_backend(), Bs4Backend)
+
+    def test_get_backend(self):
+        self.assertIsInstance(get_backend('bs4'), Bs4Backend)
+        self.assertIsInstance(get_backend('lxml'), LxmlBackend)
+
+    def test_get_unknown_backend(self):
+        self.assertRaises(ValueError, lambda: get_backend('foo'))
+
+    def test_session_parser(self):
+        self.assertIsInstance(Session().parser, Bs4Backend)
+        self.assertIsInstance(Session(parser='lxml').parser, LxmlBackend)
+
+    def test_lxml_parse_empty_page(self):
+        p = get_backend('lxml')
+        self.assertEquals('', p.text(p.parse_response(response(''))))
+
+
+class TestBackendsParity(unittest.TestCase):
+    """
+    Both backends must give the same attributes to the entities
+    """
+
+    def load_all(self, make, body, **kw):
+        """
+        Load a new entity from ``body`` with each backend and return the list
+        of entities
+        """
+        entities = []
+        for name in BACKENDS:
+            e = make()
+            self.assertTrue(e.load(response(body, **kw), Session(parser=name)))
+            entities.append(e)
+        return entities
+
+    def assertParity(self, make, body, attrs, expected=None, **kw):
+        results = [dict((a, getattr(e, a, None)) for a in attrs)
+                for e in self.load_all(make, body, **kw)]
+        for name, result in zip(BACKENDS[1:], results[1:]):
+            self.assertEquals(results[0], result, name)
+        if expected is not None:
+            self.assertEquals(expected, results[0])
+
+    def test_course(self):
+        self.assertParity(lambda: Course('C1'), COURSE_PAGE,
+                ('title', 'teacher', 'about'), {
+                    'title': 'Systèmes & Réseaux',
+                    'teacher': 'Jeanne Dupont',
+                    'about': 'Ce cours parle de réseaux.',
+                })
+
+    def test_course_latin1_without_charset(self):
+        self.assertParity(lambda: Course('C1'), COURSE_PAGE.encode('latin1'),
+                ('title', 'teacher', 'about'),
+                content_type='text/html')
+
+    def test_course_without_about(self):
+        page = COURSE_PAGE.replace('portletAbout', 'somethingElse')
+        self.assertParity(lambda: Course('C1'), page, ('title', 'about'), {
+            'title': 'Systèmes & Réseaux',
+            'about': None,
+        })
+
+    def test_course_assignments(self):
+        # iterating with list.__iter__ doesn't fetch the assignments
+        results = [[a.path for a in list.__iter__(e)] for e in
+                self.load_all(lambda: CourseAssignments('C1'),
+                    ASSIGNMENTS_PAGE)]
+        self.assertEquals([
+            '/claroline/work/user_work.php?assigId=1&cidReq=C1',
+            '/claroline/work/user_work.php?assigId=2&cidReq=C1',
+        ], results[0])
+        self.assertEquals(results[0], results[1])
+
+    def test_course_assignment(self):
+        path = '/claroline/work/user_work.php?assigId=1&cidReq=C1'
+        self.assertParity(lambda: CourseAssignment(path, 'C1'),
+                ASSIGNMENT_PAGE, ('title', 'begin', 'end', 'submission_type',
+                    'work_type', 'visibility', 'assig_id'), {
+                    'title': 'TP 1',
+                    'begin': '01/02/2015',
+                    'end': '15/02/2015',
+                    'submission_type': 'Fichier',
+                    'work_type': 'Individuel',
+                    'visibility': 'Visible',
+                    'assig_id': '1',
+                })
+
+    def test_courses_main_page(self):
+        results = [[c.ref for c in e] for e in
+                self.load_all(CoursesMainPage, MAIN_PAGE)]
+        self.assertEquals(['ABC1', 'DEF2'], results[0])
+        self.assertEquals(results[0], results[1])
+
+    def test_course_documents(self):
+        page = documents_page([
+            ('Cours 1.pdf', '/doc?f=1', '01.02.2015', False),
+            ('TD é', '/folder?d=2', '03.02.2015', True),
+            ('notes.txt', '/doc?f=3', '04.02.2015', False),
+        ])
+        entities = self.load_all(lambda: CourseDocuments('C1'), page)
+        self.assertEquals({
+            'Cours 1.pdf': ('/doc?f=1', '01.02.2015'),
+            'notes.txt': ('/doc?f=3', '04.02.2015'),
+            'TD é': {},
+        }, tree(entities[0]))
+        self.assertEquals(tree(entities[0]), tree(entities[1]))
+        for e in entities:
+            self.assertEquals(['/folder?d=2'], [f.path for f in e.folders])
+            self.assertEquals('1 Ko', e._resources['notes.txt'].size)
+
+    def test_student(self):
+        def make():
+            s = Student('jd', 'pwd', autofetch=False, login=False)
+            s.logged = True
+            return s
+        self.assertParity(make, PROFILE_PAGE, ('firstname', 'lastname',
+            'code', 'username', 'email', 'phone', 'skype', 'auth_id'), {
+                'firstname': 'Jeanne',
+                'lastname': 'Dupont',
+                'code': '2150042',
+                'username': 'jd',
+                'email': 'jd@example.com',
+                'phone': '',
+                'skype': 'jd42',
+                'auth_id': '1234',
+            })
+
+    def test_student_courses_refs(self):
+        page = MAIN_PAGE.replace('<dt><a>no link</a></dt>', '')
+        self.assertParity(StudentCoursesRefs, page, ('refs',), {
+            'refs': ['ABC1&cidReset', 'bar', 'DEF2']})
+
+    def test_parse_homemade_dl(self):
+        html = '<p>yo <b>Foo</b> : bar<br/><b>b</b> <i>2</i> <b>c:</b></p>'
+        results = []
+        for name in BACKENDS:
+            p = get_backend(name)
+            el = p.select(p.parse(html), Q_P)[0]
+            results.append(list(parse_homemade_dl(el, p).items()))
+        self.assertEquals([('foo', 'bar'), ('b', '2')], results[0])
+        self.assertEquals(results[0], results[1])
+
+    def test_login_data(self):
+        html = '<form><input type="hidden" name="lt" value="LT-1"/></form>'
+        for name in BACKENDS:
+            data = Session(parser=name).login_data(html, 'u', 'p')
+            self.assertEquals('LT-1', data['lt'])
+            self.assertEquals(None,
+                    Session(parser=name).login_data('<p/>', 'u', 'p'))
+
@@ -0,0 +1,297 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import json
+import os
+import shutil
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from os.path import join, isfile
+from tempfile import mkdtemp
+
+try:
+    from StringIO import StringIO
+except ImportError:  # Python 3
+    from io import StringIO
+
+from didel.cli import DidelCli
+from didel.config import DidelConfig
+
+from fakedidel import FakeDidel, make_courses, USERNAME, PASSWORD
+
+
+def make_config(path, server):
+    """
+    Return a config which uses the given fake server
+    """
+    config = DidelConfig(join(path, 'didel.conf'))
+    config.set_secret('username', USERNAME, False)
+    config.set_secret('password', PASSWORD, False)
+    config.set('session.root_url', server.url, False)
+    config.set('session.login_url', server.login_url, False)
+    config.set('session.backoff', '0')
+    return config
+
+
+class TestPull(unittest.TestCase):
+    """
+    End-to-end tests of ``didel pull`` against a local fake DidEL
+    """
+
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.dest = join(self.tmp, 'courses')
+        self.server = FakeDidel(make_courses(2, depth=2, folders=2, files=2,
+            file_size=3000)).start()
+        DidelConfig._default = make_config(self.tmp, self.server)
+
+    def tearDown(self):
+        DidelConfig._default = None
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def pull(self, *args):
+        argv = ['didel', '--no-cache', 'pull', self.dest] + list(args)
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            return DidelCli(argv).run()
+        finally:
+            sys.stdout, self.output = stdout, sys.stdout.getvalue()
+
+    def local_files(self):
+        for ref, course in self.server.courses.items():
+            for path, f in course.documents.walk():
+                yield join(self.dest, ref + path), f, ref + path
+
+    def test_pull_downloads_all_documents(self):
+        self.assertNotEquals(False, self.pull())
+        files = list(self.local_files())
+        self.assertEquals(2 * (2 + 2 * (2 + 2 * 2)), len(files))
+        for local, f, path in files:
+            self.assertTrue(isfile(local), local)
+            with open(local, 'rb') as fd:
+                self.assertEquals(f.content(path), fd.read())
+        self.assertEquals(len(files), self.server.stats['downloads'])
+
+    def test_pull_twice_downloads_nothing_the_second_time(self):
+        self.pull()
+        self.server.reset_stats()
+        self.assertNotEquals(False, self.pull())
+        self.assertEquals(0, self.server.stats['downloads'])
+        # the unchanged subfolders are not listed again
+        self.assertEquals(2, self.server.stats['listings'])
+
+    def test_pull_after_an_update(self):
+        self.pull()
+        self.server.reset_stats()
+        self.server.update_file('COURSE1', '/folder 1/document 0.pdf',
+                size=5000, date='02.02.2015')
+        self.assertNotEquals(False, self.pull())
+        self.assertEquals(1, self.server.stats['downloads'])
+        # the root folders and the updated one
+        self.assertEquals(3, self.server.stats['listings'])
+        local = join(self.dest, 'COURSE1/folder 1/document 0.pdf')
+        with open(local, 'rb') as fd:
+            self.assertEquals(5000, len(fd.read()))
+
+    def test_pull_after_a_same_day_nested_update(self):
+        today = time.strftime('%d.%m.%Y')
+        self.server.update_file('COURSE1', '/folder 1/document 0.pdf',
+                date=today)
+        self.pull()
+        self.server.reset_stats()
+        # the dates of the file and its folder don't change
+        self.server.update_file('COURSE1', '/folder 1/document 0.pdf',
+                size=5000)
+        self.assertNotEquals(False, self.pull())
+        self.assertEquals(1, self.server.stats['downloads'])
+        local = join(self.dest, 'COURSE1/folder 1/document 0.pdf')
+        with open(local, 'rb') as fd:
+            self.assertEquals(5000, len(fd.read()))
+
+    def test_pull_lists_unchanged_folders_periodically(self):
+        DidelConfig._default.set('courses.relist_every', '2')
+        self.pull()
+        # an update which doesn't change the date of its folder
+        self.server.update_file('COURSE1', '/folder 1/document 0.pdf',
+                size=5000)
+        self.server.reset_stats()
+        self.pull()
+        self.assertEquals(0, self.server.stats['downloads'])
+        self.pull()
+        self.assertEquals(1, self.server.stats['downloads'])
+
+    def test_pull_plan_downloads_nothing(self):
+        os.mkdir(self.dest)
+        self.assertNotEquals(False, self.pull('--plan'))
+        self.assertFalse(isfile(join(self.dest, '.didel-manifest.sqlite')))
+        self.assertEquals(0, self.server.stats['downloads'])
+        plan = json.loads(self.output)
+        count = len(list(self.local_files()))
+        self.assertEquals({'new': count, 'updated': 0, 'unchanged': 0,
+                           'stored': 0, 'bytes': count * 3000,
+                           'unknown_sizes': 0},
+                          plan['totals'])
+        self.assertEquals(['COURSE0', 'COURSE1'],
+                [c['course'] for c in plan['courses']])
+        self.assertEquals(count // 2, plan['courses'][0]['totals']['new'])
+        self.assertEquals([], plan['failed'])
+
+    def test_pull_plan_after_an_update(self):
+        self.pull()
+        self.server.update_file('COURSE1', '/folder 1/document 0.pdf',
+                size=5000, date='02.02.2015')
+        self.server.reset_stats()
+        manifest = join(self.dest, '.didel-manifest.sqlite')
+        with open(manifest, 'rb') as f:
+            saved = f.read()
+        self.assertNotEquals(False, self.pull('--plan'))
+        self.assertEquals(0, self.server.stats['downloads'])
+        with open(manifest, 'rb') as f:
+            self.assertTrue(saved == f.read())
+        plan = json.loads(self.output)
+        self.assertEquals(1, plan['totals']['updated'])
+        self.assertEquals(5000, plan['totals']['bytes'])
+        updated = [f for c in plan['courses'] for f in c['files']
+                   if f['status'] != 'unchanged']
+        self.assertEquals([('folder 1/document 0.pdf', 'updated', 5000)],
+                [(f['path'], f['status'], f['bytes']) for f in updated])
+        # the plan is right: the next pull downloads the same file
+        self.pull()
+        self.assertEquals(1, self.server.stats['downloads'])
+
+    def test_pull_with_a_shared_store(self):
+        DidelConfig._default.set('store.path', join(self.tmp, 'objects'))
+        self.assertNotEquals(False, self.pull())
+        first = list(self.local_files())
+        self.server.reset_stats()
+        self.dest = join(self.tmp, 'mirror')
+        self.assertNotEquals(False, self.pull())
+        # the documents are linked from the store instead of being downloaded
+        self.assertEquals(0, self.server.stats['downloads'])
+        self.assertTrue('(linked)' in self.output, self.output)
+        for (a, _, _), (b, f, _) in zip(first, self.local_files()):
+            self.assertTrue(os.path.samefile(a, b), b)
+            with open(b, 'rb') as fd:
+                self.assertEquals(f.size, len(fd.read()))
+
+    def test_pull_relogs_when_the_session_expired(self):
+        self.pull()
+        self.server.expire_sessions()
+        self.server.update_file('COURSE0', '/document 1.pdf',
+                date='02.02.2015')
+        self.server.reset_stats()
+        self.assertNotEquals(False, self.pull())
+        self.assertEquals(1, self.server.stats['downloads'])
+
+    def test_pull_retries_server_errors(self):
+        self.server.errors = 3
+        self.assertNotEquals(False, self.pull())
+        self.assertTrue('Retried requests: 3' in self.output, self.output)
+        self.assertEquals(len(list(self.local_files())),
+                self.server.stats['downloads'])
+
+    def test_pull_with_a_trace(self):
+        trace = join(self.tmp, 'trace.json')
+        argv = ['didel', '--no-cache', '--trace', trace, '--profile', 'pull',
+                self.dest]
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            self.assertNotEquals(False, DidelCli(argv).run())
+        finally:
+            sys.stdout, output = stdout, sys.stdout.getvalue()
+        self.assertTrue('Hot spots' in output, output)
+        # the work done by the worker threads is profiled too
+        self.assertTrue('(_download)' in output, output)
+        self.assertTrue('Trace saved in' in output, output)
+        with open(trace) as f:
+            events = json.load(f)['traceEvents']
+        cats = set(e.get('cat') for e in events)
+        for cat in ('http', 'parse', 'populate', 'download', 'fs'):
+            self.assertTrue(cat in cats, cat)
+        downloads = [e for e in events if e.get('cat') == 'download']
+        self.assertEquals(len(list(self.local_files())), len(downloads))
+        requests = [e for e in events if e.get('cat') == 'http']
+        self.assertTrue(all(e['args']['status'] for e in requests))
+
+    def test_pull_watch(self):
+        config = DidelConfig._default
+        config.set('watch.min_interval', '0.1')
+        config.set('watch.max_interval', '0.2')
+        files = len(list(self.local_files()))
+        done = threading.Event()
+        indexed = []
+
+        def wait_for_downloads(count):
+            deadline = time.time() + 10
+            while self.server.stats['downloads'] < count \
+                    and time.time() < deadline:
+                time.sleep(0.02)
+
+        def update_then_stop():
+            wait_for_downloads(files)
+            self.server.update_file('COURSE1', '/document 0.pdf',
+                    size=5000, date='02.02.2015')
+            wait_for_downloads(files + 1)
+            # let it poll the unchanged courses again
+            time.sleep(0.3)
+            # the manifest is committed after each round
+            db = sqlite3.connect(join(self.dest, '.didel-manifest.sqlite'))
+            try:
+                indexed.extend(db.execute("SELECT path FROM documents"))
+            finally:
+                db.close()
+            done.set()
+            # don't kill the tests if ``pull`` didn't start watching
+            if signal.getsignal(signal.SIGTERM) is not signal.SIG_DFL:
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        t = threading.Thread(target=update_then_stop)
+        t.start()
+        try:
+            self.assertNotEquals(False, self.pull('--watch'))
+        finally:
+            t.join()
+        self.assertTrue(done.is_set())
+        self.assertEquals(files, len(indexed))
+        self.assertEquals(files + 1, self.server.stats['downloads'])
+        with open(join(self.dest, 'COURSE1/document 0.pdf'), 'rb') as fd:
+            self.assertEquals(5000, len(fd.read()))
+        self.assertTrue('Stopping' in self.output, self.output)
+        self.assertTrue(signal.getsignal(signal.SIGTERM) is signal.SIG_DFL)
+
+    @unittest.skipIf(signal.getsignal(signal.SIGINT)
+            is not signal.default_int_handler, "SIGINT is handled elsewhere")
+    def test_second_signal_aborts_the_watch(self):
+        release = threading.Event()
+
+        class FakeCourse(object):
+            ref = 'COURSE0'
+
+        def pull(course):
+            os.kill(os.getpid(), signal.SIGINT)
+            time.sleep(0.1)
+            os.kill(os.getpid(), signal.SIGINT)
+            # a long pull
+            release.wait(10)
+
+        cli = DidelCli(['didel'])
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            self.assertRaises(KeyboardInterrupt, cli.watch_courses,
+                    [FakeCourse()], pull, 1)
+        finally:
+            release.set()
+            sys.stdout, output = stdout, sys.stdout.getvalue()
+        self.assertTrue('Stopping' in output, output)
+        self.assertTrue(signal.getsignal(signal.SIGINT)
+                is signal.default_int_handler)
@@ -0,0 +1,69 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+from didel.exceptions import DidelCircuitOpen
+from didel.retry import CircuitBreaker, RetryPolicy
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code=503, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_only_idempotent_methods_are_retried(self):
+        p = RetryPolicy(retries=2)
+        self.assertTrue(p.can_retry('GET', 0))
+        self.assertTrue(p.can_retry('head', 1))
+        self.assertFalse(p.can_retry('GET', 2))
+        self.assertFalse(p.can_retry('POST', 0))
+
+    def test_should_retry_on_server_errors(self):
+        p = RetryPolicy()
+        self.assertTrue(p.should_retry('GET', 0, FakeResponse(503)))
+        self.assertFalse(p.should_retry('GET', 0, FakeResponse(404)))
+        self.assertFalse(p.should_retry('GET', 0, FakeResponse(200)))
+
+    def test_exponential_delay_with_jitter(self):
+        p = RetryPolicy(backoff=1, max_backoff=5)
+        for attempt, delay in ((0, 1), (1, 2), (2, 4), (5, 5)):
+            for _ in range(20):
+                d = p.delay(attempt)
+                self.assertTrue(delay / 2.0 <= d <= delay, (attempt, d))
+
+    def test_delay_honors_retry_after(self):
+        p = RetryPolicy(backoff=0.1, max_backoff=5)
+        resp = FakeResponse(503, {'retry-after': '3'})
+        self.assertEquals(3, p.delay(0, resp))
+        resp = FakeResponse(503, {'retry-after': '300'})
+        self.assertEquals(5, p.delay(0, resp))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        b = CircuitBreaker(threshold=2, cooldown=60)
+        b.record(False)
+        b.record(True)
+        b.record(False)
+        b.before_request()
+        b.record(False)
+        self.assertTrue(b.is_open())
+        self.assertRaises(DidelCircuitOpen, b.before_request)
+        self.assertEquals(1, b.trips)
+
+    def test_lets_one_request_through_after_the_cooldown(self):
+        b = CircuitBreaker(threshold=1, cooldown=0)
+        b.record(False)
+        b.before_request()
+        b.record(True)
+        self.assertFalse(b.is_open())
@@ -7,11 +7,22 @@ if platform.python_version() < '2.7':
 else:
     import unittest
 
+import json
+import shutil
+import stat
+import threading
+from os import stat as os_stat
+from tempfile import mkdtemp
+from time import sleep
+
 import requests
 import responses
 
-from didel.exceptions import DidelServerError
-from didel.session import Session, ROOT_URL
+from didel.exceptions import DidelCircuitOpen, DidelServerError
+from didel.retry import CircuitBreaker, RetryPolicy
+from didel.session import Session, ROOT_URL, URLS
+
+LOGIN_FORM = '<form><input name="lt" value="LT-42"/></form>'
 
 class TestSession(unittest.TestCase):
 
@@ -63,7 +74,139 @@ class TestSession(unittest.TestCase):
         self.assertEquals(1, len(responses.calls))
         self.assertIsInstance(resp, requests.Response)
 
-    # TODO: login
+    # .set_max_requests
+
+    @responses.activate
+    def test_max_requests_limits_parallel_requests(self):
+        url = 'http://www.example.com/foo'
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def callback(req):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return (200, {}, 'ok')
+
+        responses.add_callback(responses.GET, url, callback=callback)
+        s = Session(max_requests=2)
+        threads = [threading.Thread(target=s.get, args=(url,))
+                for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEquals(8, len(responses.calls))
+        self.assertEquals(2, peak[0])
+
+    @responses.activate
+    def test_requests_in_slot_dont_take_another_one(self):
+        url = 'http://www.example.com/foo'
+        responses.add(responses.GET, url, body='ok', status=200)
+        s = Session(max_requests=1)
+        with s.slot():
+            s.get(url)
+            s.get(url)
+        self.assertEquals(2, len(responses.calls))
+
+    # .login
+
+    def add_login_responses(self):
+        responses.add(responses.GET, URLS['login'], body=LOGIN_FORM,
+                status=200)
+        responses.add(responses.POST, URLS['login'], body='<a>Quitter</a>',
+                status=200, adding_headers={'Set-Cookie': 'CASTGC=TGT-1'})
+
+    @responses.activate
+    def test_login(self):
+        self.add_login_responses()
+        s = Session()
+        self.assertTrue(s.login('foo', 'bar'))
+        self.assertEquals(2, len(responses.calls))
+        self.assertIn('lt=LT-42', responses.calls[1].request.body)
+
+    @responses.activate
+    def test_login_without_form(self):
+        responses.add(responses.GET, URLS['login'], body='nope', status=200)
+        self.assertFalse(Session().login('foo', 'bar'))
+
+    # cookies
+
+    def cookies_file(self):
+        path = mkdtemp()
+        self.addCleanup(shutil.rmtree, path, True)
+        return '%s/cookies' % path
+
+    @responses.activate
+    def test_login_saves_cookies(self):
+        self.add_login_responses()
+        filename = self.cookies_file()
+        Session(cookies_file=filename).login('foo', 'bar')
+        self.assertEquals(stat.S_IRUSR | stat.S_IWUSR,
+                stat.S_IMODE(os_stat(filename).st_mode))
+        with open(filename) as f:
+            data = json.load(f)
+        self.assertEquals('foo', data['username'])
+        self.assertEquals(['CASTGC'], [c['name'] for c in data['cookies']])
+
+    @responses.activate
+    def test_resume_reuses_saved_cookies(self):
+        self.add_login_responses()
+        filename = self.cookies_file()
+        Session(cookies_file=filename).login('foo', 'bar')
+        s = Session(cookies_file=filename)
+        self.assertEquals('TGT-1', s.cookies.get('CASTGC'))
+        self.assertTrue(s.resume('foo', 'bar'))
+        self.assertEquals(2, len(responses.calls))
+
+    @responses.activate
+    def test_resume_other_user_logs_in(self):
+        self.add_login_responses()
+        filename = self.cookies_file()
+        Session(cookies_file=filename).login('foo', 'bar')
+        self.assertTrue(Session(cookies_file=filename).resume('qux', 'bar'))
+        self.assertEquals(4, len(responses.calls))
+
+    @responses.activate
+    def test_expired_cookies_are_not_loaded(self):
+        filename = self.cookies_file()
+        with open(filename, 'w') as f:
+            json.dump({'username': 'foo', 'cookies': [
+                {'name': 'a', 'value': '1', 'expires': 1},
+                {'name': 'b', 'value': '2', 'expires': None}]}, f)
+        s = Session(cookies_file=filename)
+        self.assertEquals(['b'], [c.name for c in s.cookies])
+
+    @responses.activate
+    def test_relogin_when_redirected_to_login_page(self):
+        url = '%s/foo' % ROOT_URL
+        responses.add(responses.GET, url, status=302,
+                adding_headers={'Location': URLS['login']})
+        responses.add(responses.GET, url, body='ok', status=200)
+        self.add_login_responses()
+        s = Session()
+        s.resume('foo', 'bar')
+        # the first login
+        self.assertEquals(2, len(responses.calls))
+        resp = s.get(url)
+        self.assertEquals('ok', resp.text)
+        # redirection + login form + login + retry
+        self.assertEquals(7, len(responses.calls))
+
+    @responses.activate
+    def test_no_relogin_without_credentials(self):
+        url = '%s/foo' % ROOT_URL
+        responses.add(responses.GET, url, status=302,
+                adding_headers={'Location': URLS['login']})
+        responses.add(responses.GET, URLS['login'], body=LOGIN_FORM,
+                status=200)
+        resp = Session().get(url)
+        self.assertTrue(resp.url.startswith(URLS['login']))
+        self.assertEquals(2, len(responses.calls))
 
     @responses.activate
     def test_get_ensure_text_raise_on_error(self):
@@ -101,3 +244,69 @@ class TestSession(unittest.TestCase):
         s = Session()
         self.assertTrue(s.get_ensure_text(path, ok))
         self.assertEquals(1, len(responses.calls))
+
+
+class TestSessionRetries(unittest.TestCase):
+
+    url = '%s/foo' % ROOT_URL
+
+    def session(self, retries=3, breaker=None):
+        return Session(retry=RetryPolicy(retries, backoff=0), breaker=breaker)
+
+    @responses.activate
+    def test_retry_server_errors(self):
+        responses.add(responses.GET, self.url, body='oops', status=503)
+        responses.add(responses.GET, self.url, body='oops', status=502)
+        responses.add(responses.GET, self.url, body='ok', status=200)
+        s = self.session()
+        self.assertEquals('ok', s.get(self.url).text)
+        self.assertEquals(3, len(responses.calls))
+        self.assertEquals(2, s.retry_count)
+
+    @responses.activate
+    def test_give_up_after_the_last_retry(self):
+        responses.add(responses.GET, self.url, body='oops', status=500)
+        s = self.session(retries=2)
+        self.assertEquals(500, s.get(self.url).status_code)
+        self.assertEquals(3, len(responses.calls))
+
+    @responses.activate
+    def test_retry_connection_errors(self):
+        responses.add(responses.GET, self.url,
+                body=requests.exceptions.ConnectionError('nope'))
+        responses.add(responses.GET, self.url, body='ok', status=200)
+        s = self.session()
+        self.assertEquals('ok', s.get(self.url).text)
+        self.assertEquals(1, s.retry_count)
+
+    @responses.activate
+    def test_dont_retry_posts(self):
+        responses.add(responses.POST, self.url, body='oops', status=503)
+        s = self.session()
+        self.assertEquals(503, s.post(self.url, data={'a': 1}).status_code)
+        self.assertEquals(1, len(responses.calls))
+        self.assertEquals(0, s.retry_count)
+
+    @responses.activate
+    def test_dont_retry_client_errors(self):
+        responses.add(responses.GET, self.url, body='oops', status=404)
+        s = self.session()
+        self.assertEquals(404, s.get(self.url).status_code)
+        self.assertEquals(1, len(responses.calls))
+
+    @responses.activate
+    def test_circuit_breaker(self):
+        responses.add(responses.GET, self.url, body='oops', status=500)
+        breaker = CircuitBreaker(threshold=3, cooldown=60)
+        s = self.session(retries=5, breaker=breaker)
+        self.assertRaises(DidelCircuitOpen, lambda: s.get(self.url))
+        self.assertEquals(3, len(responses.calls))
+        self.assertRaises(DidelCircuitOpen, lambda: s.get(self.url))
+        self.assertEquals(3, len(responses.calls))
+        self.assertEquals(1, breaker.trips)
+
+    def test_adapters_pool_size(self):
+        s = Session(max_requests=32)
+        self.assertEquals(32, s.get_adapter(ROOT_URL)._pool_maxsize)
+        s.set_max_requests(2)
+        self.assertEquals(10, s.get_adapter(ROOT_URL)._pool_maxsize)
@@ -0,0 +1,77 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import os
+import shutil
+import subprocess
+import sys
+from os.path import abspath, dirname
+from tempfile import mkdtemp
+
+ROOT = abspath('%s/..' % dirname(__file__))
+
+# Maximum cumulative import time of didel.cli, in microseconds. It's about
+# 15ms on a laptop; importing the scraping stack takes more than 100ms.
+IMPORT_BUDGET = 60000
+
+# Modules that commands which don't use the network must never import
+HEAVY_MODULES = ('bs4', 'lxml', 'requests', 'sqlite3')
+
+RUN_CLI = "import sys; sys.argv[0] = 'didel'; " \
+          "from didel.cli import run; run()"
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "-X importtime requires 3.7+")
+class TestStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.home = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def importtime(self, *args):
+        """
+        Run the CLI with the given arguments and return a ``dict`` of the
+        cumulative import time of each imported module, in microseconds.
+        """
+        env = dict(os.environ, HOME=self.home, PYTHONPATH=ROOT)
+        p = subprocess.Popen([sys.executable, '-X', 'importtime', '-c',
+            RUN_CLI] + list(args), env=env, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        _, err = p.communicate()
+        times = {}
+        for line in err.decode('utf-8').splitlines():
+            if not line.startswith('import time:'):
+                continue
+            parts = line[len('import time:'):].split('|')
+            try:
+                times[parts[2].strip()] = int(parts[1])
+            except ValueError:  # header
+                continue
+        return times
+
+    def assertFastStartup(self, *args):
+        times = self.importtime(*args)
+        self.assertIn('didel.cli', times)
+        for name in HEAVY_MODULES:
+            self.assertNotIn(name, times)
+        self.assertLess(times['didel.cli'], IMPORT_BUDGET)
+
+    def test_version(self):
+        self.assertFastStartup('--version')
+
+    def test_config_get(self):
+        self.assertFastStartup('config:get', 'foo')
+
+    def test_config_set(self):
+        self.assertFastStartup('config:set', 'foo', 'bar')
+
+    def test_courses_alias(self):
+        self.assertFastStartup('courses:alias', 'foo', 'bar')
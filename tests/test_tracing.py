@@ -0,0 +1,102 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import json
+import shutil
+import threading
+from os.path import join
+from tempfile import mkdtemp
+
+from didel import tracing
+from didel.tracing import ThreadsProfile, Tracer, span
+
+
+class TestTracing(unittest.TestCase):
+
+    def tearDown(self):
+        tracing.disable()
+
+    def test_spans_are_ignored_when_disabled(self):
+        with span('foo', 'test', a=1) as args:
+            args['b'] = 2
+        self.assertEquals({'a': 1, 'b': 2}, args)
+        self.assertEquals(None, tracing.disable())
+
+    def test_spans_are_recorded(self):
+        tracer = tracing.enable()
+        with span('foo', 'test', a=1) as args:
+            args['b'] = 2
+        self.assertRaises(ValueError, self.failing_span)
+        self.assertTrue(tracer is tracing.disable())
+        with span('bar', 'test'):
+            pass
+        self.assertEquals(['foo', 'fail'], [e['name'] for e in tracer.events])
+        event = tracer.events[0]
+        self.assertEquals('X', event['ph'])
+        self.assertEquals('test', event['cat'])
+        self.assertEquals({'a': 1, 'b': 2}, event['args'])
+        self.assertTrue(event['dur'] >= 0)
+
+    def failing_span(self):
+        with span('fail', 'test'):
+            raise ValueError()
+
+    def test_spans_from_several_threads(self):
+        tracer = tracing.enable()
+        def record():
+            with span('thread', 'test'):
+                pass
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEquals(4, len(tracer.events))
+        meta = [e for e in tracer.to_json()['traceEvents'] if e['ph'] == 'M']
+        self.assertEquals(len(set(e['tid'] for e in tracer.events)),
+                len(meta))
+
+    def test_save_and_summary(self):
+        tracer = Tracer()
+        tracer.add('GET', 'http', tracer.start, tracer.start + 0.5, {})
+        tracer.add('GET', 'http', tracer.start, tracer.start + 0.5, {})
+        tracer.add('parse', 'parse', tracer.start, tracer.start + 2, {})
+        self.assertEquals([('parse', 1, 2.0), ('http', 2, 1.0)],
+                tracer.summary())
+        tmp = mkdtemp()
+        try:
+            tracer.save(join(tmp, 'trace.json'))
+            with open(join(tmp, 'trace.json')) as f:
+                data = json.load(f)
+        finally:
+            shutil.rmtree(tmp)
+        events = data['traceEvents']
+        self.assertEquals(4, len(events))
+        self.assertEquals('M', events[0]['ph'])
+        self.assertEquals([500000, 500000, 2000000],
+                [e['dur'] for e in events[1:]])
+
+
+def work_in_a_thread():
+    return sum(range(1000))
+
+
+class TestThreadsProfile(unittest.TestCase):
+
+    def test_threads_are_profiled(self):
+        profile = ThreadsProfile()
+        profile.enable()
+        try:
+            t = threading.Thread(target=work_in_a_thread)
+            t.start()
+            t.join()
+        finally:
+            profile.disable()
+        functions = [f[2] for f in profile.stats().stats]
+        self.assertTrue('work_in_a_thread' in functions, functions)
@@ -0,0 +1,40 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import shutil
+from os.path import join
+from tempfile import mkdtemp
+from time import sleep
+
+from didel.ttlcache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        self.cache = TTLCache(join(self.path, 'data'), 0.2)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_get_missing_key(self):
+        self.assertEquals(None, self.cache.get('foo'))
+        self.assertEquals(42, self.cache.get('foo', 42))
+
+    def test_set_and_get(self):
+        self.cache.set('foo', [{'a': 1}])
+        self.assertEquals([{'a': 1}], self.cache.get('foo'))
+        other = TTLCache(join(self.path, 'data'), 10)
+        self.assertEquals([{'a': 1}], other.get('foo'))
+
+    def test_values_expire(self):
+        self.cache.set('foo', 'bar')
+        sleep(0.3)
+        self.assertEquals(None, self.cache.get('foo'))
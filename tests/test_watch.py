@@ -0,0 +1,102 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import threading
+
+from didel.watch import AdaptiveSchedule, watch
+
+
+class TestAdaptiveSchedule(unittest.TestCase):
+
+    def test_all_keys_are_due_at_first(self):
+        s = AdaptiveSchedule(['a', 'b'], 10, 100)
+        self.assertEquals(['a', 'b'], s.due(0))
+        self.assertEquals(0, s.next_due())
+
+    def test_interval_grows_when_nothing_changes(self):
+        s = AdaptiveSchedule(['a'], 10, 100)
+        for interval in (20, 40, 80, 100, 100):
+            s.update('a', False, 0)
+            self.assertEquals(interval, s.interval('a'))
+        self.assertEquals(100, s.next_due())
+        self.assertEquals([], s.due(99))
+        self.assertEquals(['a'], s.due(100))
+
+    def test_interval_is_reset_on_changes(self):
+        s = AdaptiveSchedule(['a', 'b'], 10, 100)
+        s.update('a', False, 0)
+        s.update('a', False, 0)
+        s.update('a', True, 5)
+        s.update('b', False, 0)
+        self.assertEquals(10, s.interval('a'))
+        self.assertEquals(15, s.next_due())
+        self.assertEquals(['a', 'b'], s.due(20))
+
+
+class TestWatch(unittest.TestCase):
+
+    def test_dormant_keys_are_synced_less_often(self):
+        clock = [0]
+        calls = []
+        stop = threading.Event()
+
+        def sync(key):
+            calls.append((clock[0], key))
+            if clock[0] >= 100:
+                stop.set()
+            return key == 'busy'
+
+        class FakeStop(object):
+            def is_set(self):
+                return stop.is_set()
+            def wait(self, timeout):
+                clock[0] += timeout
+
+        schedule = AdaptiveSchedule(['busy', 'dormant'], 10, 1000)
+        watch(schedule, sync, FakeStop(), jobs=2, clock=lambda: clock[0])
+        busy = [t for t, key in calls if key == 'busy']
+        dormant = [t for t, key in calls if key == 'dormant']
+        self.assertEquals(list(range(0, 101, 10)), busy)
+        self.assertEquals([0, 20, 60], dormant)
+
+    def test_failures_are_ignored(self):
+        stop = threading.Event()
+        calls = []
+
+        def sync(key):
+            calls.append(key)
+            if len(calls) == 3:
+                stop.set()
+            raise ValueError(key)
+
+        watch(AdaptiveSchedule(['a'], 0, 0), sync, stop)
+        self.assertEquals(['a', 'a', 'a'], calls)
+
+    def test_after_round(self):
+        stop = threading.Event()
+        calls = []
+
+        def sync(key):
+            calls.append(key)
+
+        def after_round():
+            calls.append('done')
+            if len(calls) == 6:
+                stop.set()
+
+        watch(AdaptiveSchedule(['a', 'b'], 0, 0), sync, stop,
+                after_round=after_round)
+        self.assertEquals(['done'] * 2, calls[2::3])
+
+    def test_stops_immediately_if_stop_is_set(self):
+        stop = threading.Event()
+        stop.set()
+        calls = []
+        watch(AdaptiveSchedule(['a'], 0, 0), calls.append, stop)
+        self.assertEquals([], calls)
@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+
+import platform
+
+if platform.python_version() < '2.7':
+    import unittest2 as unittest
+else:
+    import unittest
+
+import threading
+from time import sleep
+
+from didel.workers import WorkerPool, prefetch
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def test_size_is_at_least_one(self):
+        self.assertEquals(1, WorkerPool(0).size)
+        self.assertEquals(1, WorkerPool(-3).size)
+
+    def test_runs_all_tasks(self):
+        results = []
+        pool = WorkerPool(3)
+        for i in range(20):
+            pool.submit(results.append, i)
+        pool.join()
+        self.assertEquals(list(range(20)), sorted(results))
+
+    def test_tasks_can_submit_tasks(self):
+        results = []
+        pool = WorkerPool(2)
+
+        def task(n):
+            results.append(n)
+            if n > 0:
+                pool.submit(task, n - 1)
+                pool.submit(task, n - 1)
+
+        pool.submit(task, 3)
+        pool.join()
+        self.assertEquals(15, len(results))
+
+    def test_never_runs_more_tasks_than_its_size(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def task():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        pool = WorkerPool(3)
+        for _ in range(12):
+            pool.submit(task)
+        pool.join()
+        self.assertEquals(3, peak[0])
+
+    def test_join_reraises_errors(self):
+        def fail():
+            raise ValueError("oops")
+
+        pool = WorkerPool(2)
+        pool.submit(fail)
+        self.assertRaises(ValueError, pool.join)
+        # errors are reported only once
+        pool.join()
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_yields_items_in_order(self):
+        done = []
+
+        def fun(n):
+            sleep(0.001 * (10 - n))
+            done.append(n)
+
+        for n in prefetch(range(10), fun, 4):
+            self.assertTrue(n in done)
+        self.assertEquals(list(range(10)), sorted(done))
+
+    def test_calls_fun_ahead_in_parallel(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def fun(n):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        self.assertEquals(list(range(12)), list(prefetch(range(12), fun, 3)))
+        self.assertEquals(3, peak[0])
+
+    def test_raises_errors_when_their_item_is_reached(self):
+        def fun(n):
+            if n == 2:
+                raise ValueError("oops")
+
+        it = prefetch(range(5), fun)
+        self.assertEquals([0, 1], [next(it), next(it)])
+        self.assertRaises(ValueError, lambda: next(it))
+
+    def test_stops_when_closed(self):
+        called = []
+        it = prefetch(range(100), called.append, 2)
+        next(it)
+        it.close()
+        self.assertTrue(len(called) <= 3)